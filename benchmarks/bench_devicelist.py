@@ -0,0 +1,130 @@
+"""
+Benchmark of adding SSDP devices to RevealerDeviceList against the algorithm revealer used before.
+
+Usage:
+    python benchmarks/bench_devicelist.py [number of devices, ...]
+
+The old algorithm rebuilt and sorted the dicts of our and other devices on every insertion and inserted the device
+into the plain list, so it is quadratic and takes tens of seconds for 10000 devices.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from revealerdevice import RevealerDeviceList, RevealerDeviceRow, RevealerDeviceType, RevealerDeviceTag  # noqa: E402
+
+DEFAULT_SIZES = (100, 1000, 10000)
+
+
+class LegacyDeviceList:
+    """
+    Copy of the sorting of SSDP devices revealer used before.
+    """
+
+    def __init__(self):
+        self.ssdp_devices = []
+        self.ssdp_dict = {}
+        self.ip_dict_whole = {}
+
+    def add_device(self, device_row):
+        row = self.add_device_to_ssdp_dict(device_row)
+        if row is not None:
+            device_row.set_row(row=row)
+            self.ssdp_devices.insert(row - 1, device_row)
+
+    def add_device_to_ssdp_dict(self, device_row):
+        our_dict = {}
+        other_dict = {}
+
+        device_info = {"name": device_row.name, "type": device_row.type, "link": device_row.link,
+                       "ip_address": device_row.ip_address, "uuid": device_row.uuid}
+
+        device = device_info["name"] + device_info["link"]
+        device_type = device_info["type"]
+
+        uuid = device_info["uuid"]
+        if uuid is None:
+            uuid = ""
+
+        if device_info["ip_address"] + uuid in self.ip_dict_whole:
+            return None
+        self.ip_dict_whole[device_info["ip_address"] + uuid] = device_info["name"]
+
+        if device in self.ssdp_dict:
+            return None
+
+        for ex_device in self.ssdp_dict:
+            if self.ssdp_dict[ex_device]["type"] == RevealerDeviceType.OUR:
+                our_dict[ex_device] = self.ssdp_dict[ex_device]
+            else:
+                other_dict[ex_device] = self.ssdp_dict[ex_device]
+
+        if device_type == RevealerDeviceType.OUR:
+            our_dict[device] = {"type": device_type}
+            sorted_list = sorted(our_dict, key=lambda v: v.upper())
+            alpha_row = sorted_list.index(device) + 1
+        else:
+            other_dict[device] = {"type": device_type}
+            sorted_list = sorted(other_dict, key=lambda v: v.upper())
+            alpha_row = sorted_list.index(device) + 1 + len(our_dict)
+
+        self.ssdp_dict[device] = {"type": device_type}
+
+        return alpha_row
+
+
+def make_devices(number):
+    """
+    Devices in random order: every tenth one is ours.
+    """
+
+    rng = random.Random(number)
+    devices = []
+    for i in range(number):
+        ip_address = f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+        device_type = RevealerDeviceType.OUR if i % 10 == 0 else RevealerDeviceType.OTHER
+        name = rng.choice(["8SMC5-USB", "Router", "Media Server", "printer", "TV"]) + f" {rng.randrange(number)}"
+        devices.append(dict(device_name=name, device_type=device_type, device_info={},
+                            device_link=f"http://{ip_address}", device_ip_address=ip_address,
+                            device_uuid=f"uuid-{i}", device_tag=RevealerDeviceTag.LOCAL))
+    return devices
+
+
+def bench_legacy(devices):
+    device_list = LegacyDeviceList()
+    start = time.perf_counter()
+    for device in devices:
+        device_list.add_device(RevealerDeviceRow(**device))
+    return time.perf_counter() - start, [row.name + row.link for row in device_list.ssdp_devices]
+
+
+def bench_new(devices):
+    device_list = RevealerDeviceList()
+    start = time.perf_counter()
+    for device in devices:
+        device_list.add_device(name=device["device_name"], device_type=device["device_type"],
+                               link=device["device_link"], ip_address=device["device_ip_address"],
+                               other_data=device["device_info"], uuid=device["device_uuid"],
+                               tag=device["device_tag"], legacy=False)
+    return time.perf_counter() - start, [row.name + row.link for row in device_list.ssdp_devices]
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(f"{'devices':>8} {'legacy, s':>10} {'new, s':>10} {'speedup':>8}")
+    for number in sizes:
+        devices = make_devices(number)
+        legacy_time, legacy_order = bench_legacy(devices)
+        new_time, new_order = bench_new(devices)
+        # the old sorting didn't compare names differing only in case, so compare case-insensitive order only
+        assert [v.upper() for v in legacy_order] == [v.upper() for v in new_order]
+        print(f"{number:>8} {legacy_time:>10.3f} {new_time:>10.3f} {legacy_time / new_time:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Memory taken by the device records: RevealerDeviceRow with DeviceProperties against the row with instance dict and
+properties dict revealer used before.
+
+Usage:
+    python benchmarks/bench_devicememory.py [number of devices, ...]
+
+Memory is measured with tracemalloc and includes the strings of every device, which are the same for both records.
+"""
+
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from revealerdevice import DeviceProperties, RevealerDeviceRow, RevealerDeviceType, RevealerDeviceTag  # noqa: E402
+
+DEFAULT_SIZES = (1000, 10000)
+
+
+class LegacyDeviceRow:
+    """
+    Copy of the device row revealer used before.
+    """
+
+    def __init__(self, device_name, device_type, device_info, device_link, device_ip_address, device_uuid, device_tag,
+                 device_legacy=False, device_mipas=False):
+        self.name = device_name
+        self.type = device_type
+        self.other_data = device_info
+        self.link = device_link
+        self.ip_address = device_ip_address
+        self.uuid = device_uuid
+        self.tag = device_tag
+        self.legacy = device_legacy
+        self.mipas = device_mipas
+
+        self.row = 0
+
+
+def make_properties(i):
+    """
+    Properties of the device like revealer makes them from SSDP answer and description of other manufacturer's device.
+    """
+
+    ip_address = f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+    uuid = f"4e3a1c2b-0000-1000-8000-{i:012x}"
+    return {
+        "friendlyName": f"Media Server {i}", "manufacturer": "Vendor Inc.", "manufacturerURL": "Not provided",
+        "modelDescription": "Not provided", "modelName": "MS-100", "modelNumber": "Not provided",
+        "modelURL": "Not provided", "serialNumber": "Not provided", "UDN": "uuid:" + uuid, "presentationURL": "-",
+        "server": "MediaServer", "version": "1.0", "location": f"http://{ip_address}:8080/description.xml",
+        "ssdp_url": ip_address, "uuid": uuid, "location_url": f"http://{ip_address}:8080", "os": "Linux",
+        "os_version": "4.9", "mipas": "Not provided", "max_age": "1800", "bootid": "Not provided",
+        "configid": "Not provided", "ssdp_server": "MediaServer",
+    }
+
+
+def measure(number, make_row):
+    tracemalloc.start()
+    rows = [make_row(i, make_properties(i)) for i in range(number)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return size
+
+
+def legacy_row(i, properties):
+    return LegacyDeviceRow(properties["friendlyName"], RevealerDeviceType.OTHER, properties,
+                           properties["location_url"], properties["ssdp_url"], None, RevealerDeviceTag.LOCAL)
+
+
+def new_row(i, properties):
+    return RevealerDeviceRow(properties["friendlyName"], RevealerDeviceType.OTHER, DeviceProperties(properties),
+                             properties["location_url"], properties["ssdp_url"], None, RevealerDeviceTag.LOCAL)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    print(f"{'devices':>8} {'legacy, B/device':>17} {'new, B/device':>14} {'saved':>6}")
+    for number in sizes:
+        legacy_size = measure(number, legacy_row)
+        new_size = measure(number, new_row)
+        print(f"{number:>8} {legacy_size / number:>17.0f} {new_size / number:>14.0f} "
+              f"{1 - new_size / legacy_size:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Time of making the rows of the device table with the shared GUI resources against making them like revealer did
+before: every row decoded both button images from the files and probed the pointer cursor with a test label.
+
+Usage:
+    python benchmarks/bench_rowcreation.py [--min-saved FRACTION] [number of rows, ...]
+
+Needs a display (use xvfb-run on a headless machine), without it the benchmark is skipped with exit code 77. It exits
+with code 1 if the new rows save less than the minimum share of the time of the old ones (MIN_SAVED by default).
+"""
+
+import argparse
+import os
+import sys
+import time
+from tkinter import Tk, Frame, Label, Button, PhotoImage, TclError
+from idlelib.tooltip import Hovertip
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from guiresources import CURSOR_POINTER, CURSOR_POINTER_MACOS  # noqa: E402
+from revealerdevice import RevealerDeviceTag, RevealerDeviceType  # noqa: E402
+from revealertable import ButtonSettings, DEFAULT_BG_COLOR, DEFAULT_TEXT_COLOR, RevealerTableRow  # noqa: E402
+
+DEFAULT_SIZES = (10, 100, 500)
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+EXIT_REGRESSION = 1
+# exit code of the skipped test used by automake and meson
+EXIT_SKIPPED = 77
+
+# the old rows decode two images and make a test label per row, so the new ones must be faster at least by this share
+MIN_SAVED = 0.1
+
+
+class LegacyButtonSettings(ButtonSettings):
+    """
+    Copy of the settings buttons of the row revealer made before (only making of them, the rest is not measured).
+    """
+
+    def __init__(self, master, col, row, command_change, command_view, os_main_root,
+                 bg_color=DEFAULT_BG_COLOR, width=21,
+                 tag=RevealerDeviceTag.LOCAL, state="normal", type=RevealerDeviceType.OUR):
+        self.frame = Frame(master, background=bg_color, width=width, height=10)
+        self.frame.grid(column=col, row=row, sticky="news")
+        self.frame.propagate(False)
+        self.frame.tag = tag
+
+        self.frame.button = self
+        self.bg_color = bg_color
+
+        self.os_main_root = os_main_root
+
+        photo = PhotoImage(file=os.path.join(self.os_main_root, "resources/settings2.png"))
+
+        text_settings = "Change network settings..."
+
+        # try to use mac os specific cursor - if exception is raised we are not on mac os and should use default
+        self.pointer_cursor = CURSOR_POINTER_MACOS
+        try:
+            test_label = Label(master, text="", cursor=self.pointer_cursor)
+            test_label.destroy()
+        except TclError:
+            self.pointer_cursor = CURSOR_POINTER
+
+        cursor = self.pointer_cursor
+        self.frame.button_flag = True
+
+        button = Button(self.frame, image=photo, command=command_change, relief="flat", bg=bg_color, cursor=cursor,
+                        highlightbackground=bg_color)
+        button.grid(column=1, row=0, ipadx=0, ipady=0, padx=0, pady=0)
+        button.image = photo
+        button.bg_default = bg_color
+        button["state"] = state
+
+        button["activebackground"] = self.ACTIVE_COLOR
+
+        self._change_hovertip = Hovertip(button, text=text_settings, hover_delay=1000)
+
+        button.bind("<Leave>", self._on_leave, add="+")
+        button.bind("<Enter>", self._on_enter, add="+")
+
+        self._button_change = button
+
+        photo = PhotoImage(file=os.path.join(self.os_main_root, "resources/properties.png"))
+
+        button = Button(self.frame, image=photo, command=command_view, relief="flat", bg=bg_color,
+                        cursor=self.pointer_cursor, highlightbackground=bg_color)
+        button.grid(column=0, row=0, ipadx=0, ipady=0, padx=0, pady=0)
+        button.image = photo
+        button.bg_default = bg_color
+
+        button["activebackground"] = self.ACTIVE_COLOR
+
+        button.bind("<Leave>", self._on_leave)
+        button.bind("<Enter>", self._on_enter)
+
+        Hovertip(button, text="Device information", hover_delay=1000)
+
+        button.bind("<Leave>", self._on_leave, add="+")
+        button.bind("<Enter>", self._on_enter, add="+")
+
+        self._button_view = button
+
+        self._shown = True
+        self._change_shown = True
+        self._change_state = state
+
+
+class LegacyTableRow(RevealerTableRow):
+    """
+    Copy of the table row revealer made before with its own images and cursor probe in the buttons.
+    """
+
+    def __init__(self, master, grid_row, os_main_root, left_click_func=None, right_click_func=None):
+        self.grid_row = grid_row
+
+        self.device = Label(master, text="", anchor="w", background=DEFAULT_BG_COLOR, fg=DEFAULT_TEXT_COLOR)
+        self.device.grid(row=grid_row, column=0, sticky="ew")
+
+        self.middle_1 = Frame(master, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
+        self.middle_1.grid(row=grid_row, column=1, sticky="news")
+
+        self.link = Label(master, text="", anchor="w", background=DEFAULT_BG_COLOR, fg=DEFAULT_TEXT_COLOR)
+        self.link.grid(row=grid_row, column=2, sticky="ew")
+
+        self.middle_3 = Frame(master, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
+        self.middle_3.grid(row=grid_row, column=3, sticky="news")
+
+        self.buttons = LegacyButtonSettings(master, col=4, row=grid_row, command_change=None, command_view=None,
+                                            os_main_root=os_main_root, width=1, type=RevealerDeviceType.OUR)
+
+        for label in (self.device, self.link):
+            label.tag = None
+            label.link = None
+            label.uuid = None
+            label.other_data = None
+
+        self._applied = {}
+        self.bound_key = None
+
+        self.link.bind("<Button-1>", left_click_func)
+        self.link.bind("<Button-3>", right_click_func)
+        self.device.bind("<Button-3>", right_click_func)
+
+        self.hidden = False
+
+
+def measure(root, number, row_class):
+    frame = Frame(root)
+    frame.grid()
+    root.update()
+
+    start = time.perf_counter()
+    rows = []
+    for i in range(number):
+        rows.append(row_class(frame, i + 1, ROOT_DIR, left_click_func=None, right_click_func=None))
+    root.update_idletasks()
+    elapsed = time.perf_counter() - start
+
+    frame.destroy()
+    root.update()
+    return elapsed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time of making the rows of the device table.")
+    parser.add_argument("sizes", type=int, nargs="*", default=DEFAULT_SIZES, help="numbers of rows")
+    parser.add_argument("--min-saved", type=float, default=MIN_SAVED,
+                        help="fail if the new rows save less than this share of the time of the old ones")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    try:
+        root = Tk()
+    except TclError as err:
+        print(f"Skipped: no display ({err}).")
+        return EXIT_SKIPPED
+
+    # resources of the new rows are made by the first row and are not counted
+    measure(root, 1, RevealerTableRow)
+
+    failures = []
+    print(f"{'rows':>6} {'before, ms/row':>15} {'after, ms/row':>14} {'saved':>6}")
+    for number in args.sizes:
+        legacy_time = measure(root, number, LegacyTableRow)
+        new_time = measure(root, number, RevealerTableRow)
+        saved = 1 - new_time / legacy_time
+        print(f"{number:>6} {legacy_time * 1000 / number:>15.3f} {new_time * 1000 / number:>14.3f} {saved:>6.0%}")
+
+        if saved < args.min_saved:
+            failures.append(f"{number} rows: saved {saved:.0%} < {args.min_saved:.0%}")
+
+    root.destroy()
+
+    for failure in failures:
+        print("Regression: " + failure)
+    return EXIT_REGRESSION if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
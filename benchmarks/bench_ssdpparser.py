@@ -0,0 +1,212 @@
+"""
+Microbenchmark of the SSDP parser against the string-splitting parser revealer used before.
+
+Usage:
+    python benchmarks/bench_ssdpparser.py [number of loops]
+
+Every message of the corpus is parsed by both parsers, results are compared and then the time per message is printed
+for each of them.
+"""
+
+import logging as log
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ssdpparser import parse_ssdp_packet  # noqa: E402
+
+ADDR = ("172.16.130.67", 1900)
+
+CORPUS = [
+    # our device
+    b"HTTP/1.1 200 OK\r\n"
+    b"CACHE-CONTROL: max-age=1800\r\n"
+    b"EXT:\r\n"
+    b"LOCATION: http://172.16.130.67:80/Basic_info.xml\r\n"
+    b"SERVER: lwIP/1.4.1 UPnP/2.0 8SMC5-USB/4.7.7\r\n"
+    b"ST: upnp:rootdevice\r\n"
+    b"USN: uuid:40001d0a-0000-0000-8e31-4010900b00c8::upnp:rootdevice\r\n"
+    b"BOOTID.UPNP.ORG: 1\r\n"
+    b"CONFIGID.UPNP.ORG: 1\r\n"
+    b"MIPAS: \r\n"
+    b"\r\n",
+    # router
+    b"HTTP/1.1 200 OK\r\n"
+    b"CACHE-CONTROL: max-age=120\r\n"
+    b"ST: urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+    b"USN: uuid:a1b2c3d4-0000-1000-8000-001122334455::urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+    b"EXT:\r\n"
+    b"SERVER: Linux/3.14 UPnP/1.1 MiniUPnPd/2.1\r\n"
+    b"LOCATION: http://172.16.130.67:5000/rootDesc.xml\r\n"
+    b'OPT: "http://schemas.upnp.org/upnp/1/0/"; ns=01\r\n'
+    b"01-NLS: 1619518218\r\n"
+    b"BOOTID.UPNP.ORG: 1619518218\r\n"
+    b"CONFIGID.UPNP.ORG: 1337\r\n"
+    b"\r\n",
+    # media server with whitespaces in the product tokens
+    b"HTTP/1.1 200 OK\r\n"
+    b"Cache-Control: max-age = 900\r\n"
+    b"Date: Mon, 12 Oct 2026 10:00:00 GMT\r\n"
+    b"Ext: \r\n"
+    b"Location: http://172.16.130.67:2869/upnphost/udhisapi.dll?content=uuid:0b1c3a2e-5d6f-4b7a-9c8d-0e1f2a3b4c5d\r\n"
+    b"Server: Microsoft-Windows/10.0 UPnP/1.0 UPnP-Device-Host/1.0\r\n"
+    b"ST: urn:schemas-upnp-org:device:MediaServer:1\r\n"
+    b"USN: uuid:0b1c3a2e-5d6f-4b7a-9c8d-0e1f2a3b4c5d::urn:schemas-upnp-org:device:MediaServer:1\r\n"
+    b"Content-Length: 0\r\n"
+    b"\r\n",
+    # printer with LOCATION without port
+    b"HTTP/1.1 200 OK\r\n"
+    b"CACHE-CONTROL: max-age=1800\r\n"
+    b"LOCATION: http://172.16.130.67/DevDesc.xml\r\n"
+    b"SERVER: Network Printer Server UPnP/1.0 OS 1.29.00.44 June-17-2016\r\n"
+    b"ST: upnp:rootdevice\r\n"
+    b"USN: uuid:16a65700-007c-1000-bb49-001122334455::upnp:rootdevice\r\n"
+    b"EXT:\r\n"
+    b"\r\n",
+    # NOTIFY message
+    b"NOTIFY * HTTP/1.1\r\n"
+    b"HOST: 239.255.255.250:1900\r\n"
+    b"CACHE-CONTROL: max-age=1800\r\n"
+    b"LOCATION: http://172.16.130.67:80/Basic_info.xml\r\n"
+    b"NT: upnp:rootdevice\r\n"
+    b"NTS: ssdp:alive\r\n"
+    b"SERVER: lwIP/1.4.1 UPnP/2.0 8SMC5-USB/4.7.7\r\n"
+    b"USN: uuid:40001d0a-0000-0000-8e31-4010900b00c8::upnp:rootdevice\r\n"
+    b"BOOTID.UPNP.ORG: 1\r\n"
+    b"CONFIGID.UPNP.ORG: 1\r\n"
+    b"MIPAS: Accepted\r\n"
+    b"\r\n",
+]
+
+URL_REGEX_PORT = "https?:\\/\\/((25[0-5]|(2[0-4]|1\\d|[1-9]|)\\d)\\.?\\b){4}:\\d{1,5}"
+URL_REGEX_WITHOUT_PORT = "https?:\\/\\/((25[0-5]|(2[0-4]|1\\d|[1-9]|)\\d)\\.?\\b){4}"
+IP_ADDRES_REGEX = "((25[0-5]|(2[0-4]|1\\d|[1-9]|)\\d)\\.?\\b){4}"
+PORT_REGEX = ":\\d{1,5}"
+
+
+def legacy_parse_server(string, ssdp_dict):
+    words_string = string.split(" ")
+    if len(words_string) != 3:
+        index_upnp = string.index("UPnP/")
+        os_version_words = string[0:index_upnp].split("/")
+        server_version_words = string[index_upnp + 1 + string[index_upnp:].index(" "):].split("/")
+    else:
+        os_version_words = words_string[0].split("/")
+        server_version_words = words_string[len(words_string) - 1].split("/")
+
+    for field, words, index in (("server", server_version_words, 0), ("version", server_version_words, 1),
+                                ("os", os_version_words, 0), ("os_version", os_version_words, 1)):
+        try:
+            ssdp_dict[field] = words[index]
+        except IndexError:
+            ssdp_dict[field] = "Not provided"
+
+
+def legacy_parse_location_url(string):
+    m = re.search(URL_REGEX_PORT, string)
+    try:
+        url_raw = m.group()
+        return re.search(IP_ADDRES_REGEX, url_raw).group(), re.search(PORT_REGEX, url_raw).group()[1:], \
+            string[len(url_raw):]
+    except AttributeError:
+        m = re.search(URL_REGEX_WITHOUT_PORT, string)
+        try:
+            url_raw = m.group()
+            return re.search(IP_ADDRES_REGEX, url_raw).group(), None, string[len(url_raw):]
+        except AttributeError:
+            return None, None, string
+
+
+def legacy_parse_location(string, ssdp_dict, addr):
+    value_string = string[len(re.match("location:\\s*", string.lower()).group()):]
+    ip_address, port, xml_raw = legacy_parse_location_url(value_string)
+    if ip_address is not None and port is not None:
+        ssdp_dict["location"] = value_string
+    elif ip_address is not None:
+        ssdp_dict["location"] = "http://" + ip_address + ":80" + xml_raw
+    else:
+        ssdp_dict["location"] = "http://" + addr[0] + ":80" + xml_raw
+        ip_address = addr[0]
+    ssdp_dict["ssdp_url"] = ip_address
+    ssdp_dict["location_url"] = re.match(URL_REGEX_PORT, value_string.lower()).group()
+
+
+def legacy_parse_ssdp_data(ssdp_data, addr):  # noqa: C901 - kept as it was in revealer
+    """
+    Copy of the parser revealer used before: the datagram is decoded and split into lines, every line is split into
+    words and the location is matched against several regular expressions compiled on every call.
+    """
+
+    ssdp_dict = {"server": "Not provided", "version": "Not provided", "location": "Not provided",
+                 "ssdp_url": "Not provided", "uuid": "Not provided", "location_url": "Not provided",
+                 "os": "Not provided", "os_version": "Not provided", "mipas": "Not provided",
+                 "max_age": "Not provided", "bootid": "Not provided", "configid": "Not provided"}
+
+    try:
+        for string in ssdp_data.decode("utf-8").split("\r\n"):
+            if string[0:3].lower() != "http":
+                words_string = string.split(":")
+                header = words_string[0].lower()
+                if header == "server":
+                    string = string[len("server") + 1:]
+                    if len(string) > 0 and string[0] == " ":
+                        string = string[1:]
+                    if len(string) > 0:
+                        legacy_parse_server(string, ssdp_dict)
+                elif header == "location":
+                    legacy_parse_location(string, ssdp_dict, addr)
+                elif header == "usn":
+                    ssdp_dict["uuid"] = words_string[2]
+                elif header == "mipas":
+                    ssdp_dict["mipas"] = words_string[1].replace(" ", "")
+                elif header == "cache-control":
+                    m = re.search("max-age\\s*=\\s*(\\d+)", string.lower())
+                    if m is not None:
+                        ssdp_dict["max_age"] = m.group(1)
+                elif header == "bootid.upnp.org":
+                    ssdp_dict["bootid"] = string[string.index(":") + 1:].strip()
+                elif header == "configid.upnp.org":
+                    ssdp_dict["configid"] = string[string.index(":") + 1:].strip()
+    except Exception:
+        pass
+
+    return ssdp_dict
+
+
+def new_parse_ssdp_data(ssdp_data, addr):
+    return parse_ssdp_packet(ssdp_data, addr).to_dict()
+
+
+def compare():
+    """
+    Print fields of the corpus messages where parsers disagree.
+    """
+
+    for data in CORPUS:
+        legacy = legacy_parse_ssdp_data(data, ADDR)
+        new = new_parse_ssdp_data(data, ADDR)
+        for key in legacy:
+            if legacy[key] != new[key]:
+                print(f"  {data.splitlines()[0].decode()} / {key}: legacy {legacy[key]!r}, new {new[key]!r}")
+
+
+def main():
+    loops = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    # warnings about malformed SERVER headers of the corpus would be measured as well
+    log.disable(log.WARNING)
+
+    print("Differences between parsers:")
+    compare()
+
+    print(f"Time per message, {loops} loops over {len(CORPUS)} messages:")
+    for name, parser in (("legacy", legacy_parse_ssdp_data), ("bytes", new_parse_ssdp_data),
+                         ("bytes (record only)", parse_ssdp_packet)):
+        seconds = min(timeit.repeat(lambda: [parser(data, ADDR) for data in CORPUS], number=loops, repeat=3))
+        print(f"  {name:>20}: {seconds / loops / len(CORPUS) * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
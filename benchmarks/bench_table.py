@@ -0,0 +1,339 @@
+"""
+Rendering benchmark of RevealerTable: devices are added to the table by batches like the search adds them and the
+table is updated after every batch.
+
+Usage:
+    python benchmarks/bench_table.py [--sizes 10 100 1000 5000] [--batch 50] [--max-turn-ms MS] [--max-widgets N]
+                                     [--max-rss-mb MB] [--max-total-ms MS] [--no-limits] [--save-limits]
+
+For every number of devices it reports:
+    * update: mean and maximum time of update_with_rewriting() after a batch, ms;
+    * turn: maximum time of one turn of the main loop (the update or one event handled after it), ms - this is the
+      longest time the window doesn't react to the user;
+    * total: time from the first added device till the table shows all of them, ms;
+    * scroll: time to show the middle of the table after scrolling to it, ms;
+    * widgets: number of widgets of the window;
+    * RSS: resident memory of the process after the table is drawn, MB.
+
+If DISPLAY is not set, the benchmark starts Xvfb (virtual X server) for itself. Without display and Xvfb it is skipped
+with exit code 77, so the skip is not taken for a pass.
+
+The benchmark exits with code 1 if any size exceeds the limits. The limits are read from LIMITS_FILE recorded by the
+measured run with --save-limits: the maximum of every value over all sizes with the headroom of LIMITS_HEADROOM. Without
+the file the estimated limits of DEFAULT_LIMITS are used: the table must keep the main loop responsive and the number of
+widgets must not depend on the number of devices. The limits can be changed by the options or switched off with
+--no-limits.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+import _tkinter
+from tkinter import Tk, TclError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from revealerdevice import RevealerDeviceTag  # noqa: E402
+from revealertable import RevealerTable  # noqa: E402
+
+DEFAULT_SIZES = (10, 100, 1000, 5000)
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# every tenth device answers only to the legacy protocol
+LEGACY_SHARE = 10
+
+XVFB_START_TIMEOUT_SEC = 5
+
+EXIT_REGRESSION = 1
+# exit code of the skipped test used by automake and meson
+EXIT_SKIPPED = 77
+
+# estimated limits for any number of devices used till LIMITS_FILE is recorded: one turn of the main loop takes the
+# render budget of the table with a margin for slow machines and the fixed pool of rows of 800x600 window has 7 widgets
+# per visible row (about 150 widgets, while the table without the pool had 7 widgets per device). Total time and memory
+# depend on the machine too much, so they are not limited by default
+DEFAULT_LIMITS = {
+    "turn_max_ms": 50,
+    "widgets": 500,
+    "rss_mb": None,
+    "total_ms": None,
+}
+
+# limits recorded by the measured run with --save-limits
+LIMITS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_table_limits.json")
+# recorded limit is the measured maximum multiplied by this: times vary between the runs much more than the widgets
+LIMITS_HEADROOM = {
+    "turn_max_ms": 2.0,
+    "widgets": 1.1,
+    "rss_mb": 1.5,
+    "total_ms": 2.0,
+}
+
+
+def start_xvfb():
+    """
+    Start Xvfb on the first free display number and set DISPLAY to it.
+
+    :return: process of Xvfb or None if it can't be started.
+    """
+
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None
+
+    display = 99
+    while os.path.exists(f"/tmp/.X{display}-lock"):
+        display += 1
+
+    process = subprocess.Popen([xvfb, f":{display}", "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + XVFB_START_TIMEOUT_SEC
+    while not os.path.exists(f"/tmp/.X11-unix/X{display}"):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            return None
+        time.sleep(0.05)
+
+    os.environ["DISPLAY"] = f":{display}"
+    return process
+
+
+def rss_mb() -> float:
+    """
+    :return: current resident memory of the process (maximum one if /proc is not available, nan on windows), MB.
+    """
+
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        # resource module is not available on windows
+        return float("nan")
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on mac os, kilobytes on linux
+    return max_rss / 1024 / 1024 if sys.platform == "darwin" else max_rss / 1024
+
+
+def load_limits():
+    """
+    :return: limits recorded in LIMITS_FILE or DEFAULT_LIMITS if it is not recorded yet.
+    """
+
+    limits = dict(DEFAULT_LIMITS)
+    try:
+        with open(LIMITS_FILE) as limits_file:
+            limits.update(json.load(limits_file)["limits"])
+    except FileNotFoundError:
+        pass
+    return limits
+
+
+def save_limits(results, batch):
+    """
+    Record the maximum of every limited value over all measured sizes with the headroom to LIMITS_FILE.
+    """
+
+    limits = {}
+    for name, headroom in LIMITS_HEADROOM.items():
+        value = max(result[name] for result in results.values()) * headroom
+        limits[name] = round(value) if name == "widgets" else round(value, 1)
+
+    record = {"limits": limits, "headroom": LIMITS_HEADROOM, "batch": batch, "measured": results}
+    with open(LIMITS_FILE, "w") as limits_file:
+        json.dump(record, limits_file, indent=4, sort_keys=True)
+        limits_file.write("\n")
+    print(f"Limits are saved to {LIMITS_FILE}: {limits}")
+
+
+def widget_count(widget) -> int:
+    return 1 + sum(widget_count(child) for child in widget.winfo_children())
+
+
+def make_devices(number, seed=0):
+    """
+    :return: list of (legacy, name, ip address, properties) in random order.
+    """
+
+    devices = []
+    for i in range(number):
+        ip_address = f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"
+        if i % LEGACY_SHARE == LEGACY_SHARE - 1:
+            devices.append((True, ip_address, ip_address, None))
+            continue
+
+        properties = {
+            "friendlyName": f"Device {i:05}", "mipas": "Not provided", "ssdp_url": ip_address,
+            "presentationURL": "-", "server": "Server", "location_url": f"http://{ip_address}",
+        }
+        # every third device is ours
+        if i % 3 == 0:
+            properties["mipas"] = "OK"
+        devices.append((False, properties["friendlyName"], ip_address, properties))
+
+    random.Random(seed).shuffle(devices)
+    return devices
+
+
+def handle_events(root, turn_times):
+    """
+    Handle all pending events of the main loop one by one (like the main loop does) and remember the time of each.
+    """
+
+    while True:
+        start = time.perf_counter()
+        if not root.tk.dooneevent(_tkinter.DONT_WAIT):
+            return
+        turn_times.append(time.perf_counter() - start)
+
+
+def render(root, table, turn_times):
+    """
+    Update the table and handle events till all visible rows are bound.
+
+    :return: time of update_with_rewriting().
+    """
+
+    start = time.perf_counter()
+    table.update_with_rewriting()
+    update_time = time.perf_counter() - start
+    turn_times.append(update_time)
+
+    handle_events(root, turn_times)
+    while table.render_pending():
+        handle_events(root, turn_times)
+
+    return update_time
+
+
+def run(number, batch):
+    root = Tk()
+    root.geometry("800x600")
+    root.grid_rowconfigure(0, weight=1)
+    root.grid_columnconfigure(0, weight=1)
+
+    table = RevealerTable(master=root, col=0, row=0, height=560, os_main_root=ROOT_DIR, font_name="TkDefaultFont")
+    root.update()
+
+    devices = make_devices(number)
+    update_times = []
+    turn_times = []
+
+    start = time.perf_counter()
+    for first in range(0, number, batch):
+        for legacy, name, ip_address, properties in devices[first:first + batch]:
+            if legacy:
+                table.add_row_old_item(name, "http://" + ip_address, tag=RevealerDeviceTag.OLD_LOCAL)
+            else:
+                table.add_row_ssdp_item(name, properties["location_url"], ip_address, None, properties,
+                                        tag=RevealerDeviceTag.LOCAL)
+        update_times.append(render(root, table, turn_times))
+    total_time = time.perf_counter() - start
+
+    assert table.shown_rows() == number, f"{table.shown_rows()} rows shown instead of {number}"
+
+    start = time.perf_counter()
+    # the same call as dragging the scrollbar
+    table.great_table._yview("moveto", 0.5)
+    handle_events(root, turn_times)
+    while table.render_pending():
+        handle_events(root, turn_times)
+    scroll_time = time.perf_counter() - start
+
+    result = {
+        "update_mean_ms": sum(update_times) / len(update_times) * 1000,
+        "update_max_ms": max(update_times) * 1000,
+        "turn_max_ms": max(turn_times) * 1000,
+        "total_ms": total_time * 1000,
+        "scroll_ms": scroll_time * 1000,
+        "widgets": widget_count(root),
+        "rss_mb": rss_mb(),
+    }
+
+    root.destroy()
+    return result
+
+
+def parse_args():
+    limits = load_limits()
+
+    parser = argparse.ArgumentParser(description="Rendering benchmark of RevealerTable.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of devices")
+    parser.add_argument("--batch", type=int, default=50, help="devices added between the updates of the table")
+    parser.add_argument("--max-turn-ms", type=float, default=limits["turn_max_ms"],
+                        help="fail if one turn of the main loop takes longer")
+    parser.add_argument("--max-widgets", type=int, default=limits["widgets"],
+                        help="fail if the window has more widgets")
+    parser.add_argument("--max-rss-mb", type=float, default=limits["rss_mb"],
+                        help="fail if the process takes more memory")
+    parser.add_argument("--max-total-ms", type=float, default=limits["total_ms"],
+                        help="fail if showing all devices takes longer")
+    parser.add_argument("--no-limits", action="store_true", help="only print the results")
+    parser.add_argument("--save-limits", action="store_true",
+                        help=f"record the limits from the results of this run to {os.path.basename(LIMITS_FILE)}")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    xvfb = None
+    if not os.environ.get("DISPLAY"):
+        xvfb = start_xvfb()
+        if xvfb is None:
+            print("Skipped: no display and Xvfb can't be started.")
+            return EXIT_SKIPPED
+
+    # the run recording the limits is not checked against the old ones
+    thresholds = ()
+    if not args.no_limits and not args.save_limits:
+        thresholds = (("turn_max_ms", args.max_turn_ms), ("widgets", args.max_widgets), ("rss_mb", args.max_rss_mb),
+                      ("total_ms", args.max_total_ms))
+    failures = []
+    results = {}
+
+    try:
+        print(f"{'devices':>8} {'update mean/max, ms':>20} {'turn max, ms':>13} {'total, ms':>10} "
+              f"{'scroll, ms':>11} {'widgets':>8} {'RSS, MB':>8}")
+        for number in args.sizes:
+            try:
+                result = run(number, args.batch)
+            except TclError as err:
+                print(f"Skipped: Tk can't be started ({err}).")
+                return EXIT_SKIPPED
+            results[number] = result
+
+            print(f"{number:>8} {result['update_mean_ms']:>10.2f}/{result['update_max_ms']:<9.2f} "
+                  f"{result['turn_max_ms']:>13.2f} {result['total_ms']:>10.1f} {result['scroll_ms']:>11.2f} "
+                  f"{result['widgets']:>8} {result['rss_mb']:>8.1f}")
+
+            for name, limit in thresholds:
+                if limit is not None and result[name] > limit:
+                    failures.append(f"{number} devices: {name} = {result[name]:.2f} > {limit}")
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    if args.save_limits:
+        save_limits(results, args.batch)
+
+    for failure in failures:
+        print("Regression: " + failure)
+    return EXIT_REGRESSION if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
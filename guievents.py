@@ -0,0 +1,175 @@
+"""
+Events posted by the worker threads to the GUI thread.
+"""
+
+import logging as log
+import threading
+import traceback
+from collections import deque
+from tkinter import TclError
+
+
+class GuiEventKind:
+    # rows of the device list were added or changed
+    DEVICES_CHANGED = "devices_changed"
+    # search or settings change was started or finished
+    PHASE_CHANGED = "phase_changed"
+    # result of the network settings change (MIPAS)
+    MIPAS_RESULT = "mipas_result"
+    # text of the errors to show to the user
+    ERROR = "error"
+
+
+class GuiEvent:
+    """
+    Class of one event posted to the GUI thread.
+    """
+
+    __slots__ = ("kind", "data")
+
+    def __init__(self, kind, data=None):
+        self.kind = kind
+        self.data = data
+
+
+def tcl_is_threaded(root) -> bool:
+    """
+    Check that Tcl is built with threads, so tkinter can be called from any thread (calls are passed to the thread of
+    the main loop).
+
+    :param root: Tk
+    :return:
+    """
+
+    return bool(root.tk.getboolean(root.tk.eval("info exists tcl_platform(threaded)")))
+
+
+class GuiEventQueue:
+    """
+    Class of the queue of events from the worker threads to the GUI thread.
+
+    Workers post events from any thread. If Tcl is threaded the first event posted after the last handling schedules
+    one after_idle() call, so the GUI thread handles events with almost no latency and does nothing while there are no
+    events. Otherwise tkinter can't be called from the workers and the GUI thread polls the queue while there is some
+    work in progress.
+    """
+
+    def __init__(self, root, handler, is_idle, poll_time_ms=100):
+        """
+        :param root: Tk
+        :param handler: callable
+            Function handling the list of the events in the GUI thread. It is called with empty list too when the queue
+            is polled or woken up by the GUI thread.
+        :param is_idle: callable
+            Function returning True if no worker can post events till the GUI thread starts some new work. Polling
+            stops when it is True.
+        :param poll_time_ms: int
+            Time between polls of the queue if Tcl is not threaded.
+        """
+
+        self._root = root
+        self._handler = handler
+        self._is_idle = is_idle
+        self.poll_time_ms = poll_time_ms
+        self.threaded = tcl_is_threaded(root)
+
+        self._lock = threading.Lock()
+        self._events = deque()
+        # flag that handling of the events is already scheduled - other events are handled together with them
+        self._wakeup_pending = False
+        self._closed = False
+        # id of the scheduled after call of the GUI thread
+        self._after_id = None
+
+        if not self.threaded:
+            log.info(f"Tcl is not threaded, GUI polls the events every {poll_time_ms} ms while working.")
+
+    def post(self, kind, data=None) -> None:
+        """
+        Post event to the GUI thread. Can be called from any thread.
+
+        :param kind: str
+            One of the GuiEventKind.
+        :param data:
+            Data of the event.
+        :return:
+        """
+
+        with self._lock:
+            if self._closed:
+                return
+            self._events.append(GuiEvent(kind, data))
+            if self._wakeup_pending or not self.threaded:
+                return
+            self._wakeup_pending = True
+
+        try:
+            # the call is passed to the main loop thread by tkinter
+            self._root.after_idle(self._drain)
+        except (RuntimeError, TclError):
+            # main loop is not running anymore - application is closing
+            log.debug(f"Event {kind} is not posted: GUI is not running.")
+
+    def wake(self) -> None:
+        """
+        Handle the events as soon as possible and, if Tcl is not threaded, start polling. Must be called in the GUI
+        thread after it has started the work of the workers.
+
+        :return:
+        """
+
+        if self._closed:
+            return
+
+        if self.threaded:
+            with self._lock:
+                if self._wakeup_pending:
+                    return
+                self._wakeup_pending = True
+            self._after_id = self._root.after_idle(self._drain)
+        elif self._after_id is None:
+            self._after_id = self._root.after_idle(self._poll)
+
+    def _take_events(self):
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            # events posted from now on schedule the next handling
+            self._wakeup_pending = False
+        return events
+
+    def _handle(self, events):
+        try:
+            self._handler(events)
+        except Exception:
+            log.error(f"Error while handling GUI events:\n{traceback.format_exc()}")
+
+    def _drain(self):
+        self._after_id = None
+        if self._closed:
+            return
+        self._handle(self._take_events())
+
+    def _poll(self):
+        self._after_id = None
+        if self._closed:
+            return
+        self._handle(self._take_events())
+        # idleness is checked after the handling, so events posted by the last tasks are not missed
+        if not self._is_idle() or self._events:
+            self._after_id = self._root.after(self.poll_time_ms, self._poll)
+
+    def close(self) -> None:
+        """
+        Stop handling events: events posted after it are dropped. Must be called in the GUI thread.
+
+        :return:
+        """
+
+        with self._lock:
+            self._closed = True
+            self._events.clear()
+
+        if self._after_id is not None:
+            self._root.after_cancel(self._after_id)
+            self._after_id = None
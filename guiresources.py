@@ -0,0 +1,84 @@
+"""
+Resources of the GUI shared by all widgets: images, pointer cursor and font tuples.
+"""
+
+import os
+from tkinter import Label, PhotoImage, TclError, font
+
+CURSOR_POINTER = "hand2"
+CURSOR_POINTER_MACOS = "pointinghand"
+
+
+class GuiResources:
+    """
+    Class of the resources made once for the Tk root: images are decoded from the files once, the pointer cursor is
+    probed once and font tuples are made once. Widgets get them with get_resources().
+    """
+
+    def __init__(self, root):
+        self._root = root
+        self._images = {}
+        self._fonts = {}
+        self._font_sizes = {}
+
+        # try to use mac os specific cursor - if exception is raised we are not on mac os and should use default
+        self.pointer_cursor = CURSOR_POINTER_MACOS
+        try:
+            test_label = Label(root, text="", cursor=self.pointer_cursor)
+            test_label.destroy()
+            self.macos_cursor = True
+        except TclError:
+            self.pointer_cursor = CURSOR_POINTER
+            self.macos_cursor = False
+
+    def image(self, path) -> PhotoImage:
+        """
+        :param path: str
+            Path of the image file.
+        :return: image decoded from the file when it was asked for the first time.
+        """
+
+        path = os.path.abspath(path)
+        image = self._images.get(path)
+        if image is None:
+            image = PhotoImage(master=self._root, file=path)
+            self._images[path] = image
+        return image
+
+    def font(self, name, style=""):
+        """
+        :param name: str
+            Name of the named font (TkDefaultFont for example).
+        :param style: str
+            Style of the font: '', 'bold', 'italic', 'underline'.
+        :return: font tuple with the family and size of the named font.
+        """
+
+        key = (name, style)
+        font_tuple = self._fonts.get(key)
+        if font_tuple is None:
+            size = self._font_sizes.get(name)
+            if size is None:
+                size = font.Font(root=self._root, name=name, exists=True).actual()["size"]
+                self._font_sizes[name] = size
+            font_tuple = (name, size, style)
+            self._fonts[key] = font_tuple
+        return font_tuple
+
+
+def get_resources(widget) -> GuiResources:
+    """
+    Get resources of the Tk root of the widget. They are made by the first call and live as long as the root.
+
+    Must be called in the GUI thread.
+
+    :param widget: any tkinter widget
+    :return:
+    """
+
+    root = widget._root()
+    resources = getattr(root, "_gui_resources", None)
+    if resources is None:
+        resources = GuiResources(root)
+        root._gui_resources = resources
+    return resources
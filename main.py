@@ -2,11 +2,10 @@ import os
 import re
 import logging as log
 
-import time
-
 from tkinter import Tk, Frame, Label, PhotoImage, LabelFrame, TclError, LEFT, Entry, \
-    Checkbutton, Button, ACTIVE, IntVar, Toplevel
+    Checkbutton, Button, ACTIVE, IntVar
 from tkinter import ttk, font
+from idlelib.tooltip import Hovertip
 import tkinter.messagebox as mb
 import tkinter.simpledialog as sd
 
@@ -14,32 +13,29 @@ import socket
 import ifaddr
 import webbrowser as wb
 
-import xml.etree.ElementTree as ET
-import urllib.request
-
 import ast
 import threading
-from thread import ProcessThread, SSDPSearchThread, ParseDevicesThread
+import time
+from thread import TaskExecutor, CancellationToken, shutdown_socket
 import traceback
 
 from version import Version
 from revealertable import RevealerTable
-from revealerdevice import RevealerDeviceTag
+from revealerdevice import RevealerDeviceTag, DeviceIdentityIndex, NOT_PROVIDED
+from ssdpsearch import SSDPSearchEngine
+from upnpdescription import DescriptionFetcher, InFlightFetches
+from ssdpparser import parse_ssdp_packet, SSDPRecord
+from workledger import WorkLedger
+from guievents import GuiEventQueue, GuiEventKind
+from guiresources import get_resources
 
 RESULT_OK = 0
 RESULT_ERROR = 1
 RESULT_UNKNOWN = 2  # code to indicate unknown result of the action - setting settings via multicast for example
 
 DEFAULT_TEXT_COLOR = "black"
-CURSOR_POINTER = "hand2"
-CURSOR_POINTER_MACOS = "pointinghand"
 DEFAULT_BG_COLOR = "white"
 
-URL_REGEX_PORT = "https?:\\/\\/((25[0-5]|(2[0-4]|1\\d|[1-9]|)\\d)\\.?\\b){4}:\\d{1,5}"
-URL_REGEX_WITHOUT_PORT = "https?:\\/\\/((25[0-5]|(2[0-4]|1\\d|[1-9]|)\\d)\\.?\\b){4}"
-IP_ADDRES_REGEX = "((25[0-5]|(2[0-4]|1\\d|[1-9]|)\\d)\\.?\\b){4}"
-PORT_REGEX = ":\\d{1,5}"
-
 # name of the font for tkinter to use in all widgets
 # This may not be the solution for the fontconfig error on the newer Linux systems but it should stop tkinter
 # from trying to use some other fonts.
@@ -86,27 +82,70 @@ def center(win):
 
 
 class SSDPEnhancedDevice:
-    def __init__(self, ssdp_device_name, enhanced_ssdp_support_min_fw, enhanced_ssdp_version):
+    def __init__(self, ssdp_device_name, enhanced_ssdp_support_min_fw, enhanced_ssdp_version, search_target=None):
         self.ssdp_device_name = ssdp_device_name
         self.enhanced_ssdp_support_min_fw = enhanced_ssdp_support_min_fw
         self.enhanced_ssdp_version = enhanced_ssdp_version
+        # ST of the M-SEARCH request only this device type answers to: the device type the firmware advertises in
+        # the NT/ST headers of its SSDP messages (urn:<vendor domain>:device:<type>:<version>). None if it is not known
+        # - then the device is found by the upnp:rootdevice request only.
+        self.search_target = search_target
 
 
-class Revealer2:
-    SSDP_HEADER_HTTP = "http"
-    SSDP_HEADER_SERVER = "server"
-    SSDP_HEADER_LOCATION = "location"
-    SSDP_HEADER_USN = "usn"
-    SSDP_HEADER_MIPAS = "mipas"
+def targeted_search_targets(devices):
+    """
+    :param devices: list of SSDPEnhancedDevice
+    :return: ST values of the devices which advertise their own device type.
+    """
+
+    return [device.search_target for device in devices if device.search_target is not None]
+
+
+class SSDPSearchProfile:
+    def __init__(self, name, search_targets, enhanced_only=False):
+        self.name = name
+        # ST values of the M-SEARCH requests sent on the search
+        self.search_targets = search_targets
+        # flag to indicate that answers and NOTIFY messages from other devices should be ignored
+        self.enhanced_only = enhanced_only
+
+
+def ssdp_search_profiles(root_search_target, devices):
+    """
+    :param root_search_target: str
+        ST of the search of all devices.
+    :param devices: list of SSDPEnhancedDevice
+    :return: list of SSDPSearchProfile to choose from, the targeted search is offered only if some of the devices
+        have search_target set.
+    """
+
+    targets = targeted_search_targets(devices)
 
+    profiles = [SSDPSearchProfile(name="All devices", search_targets=[root_search_target])]
+    if len(targets) > 0:
+        profiles.append(SSDPSearchProfile(name="All devices + targeted", search_targets=[root_search_target] + targets))
+    profiles.append(SSDPSearchProfile(name="Enhanced devices only", search_targets=targets or [root_search_target],
+                                      enhanced_only=True))
+    return profiles
+
+
+class Revealer2:
     SSDP_MIPAS_RESULT_OK = "Accepted"
     SSDP_MIPAS_RESULT_ERROR = "Rejected"
 
     MULTICAST_SSDP_PORT = 1900
 
-    # time for redrawing all widgets in milliseconds
+    # time between the updates of the window while working if Tcl is not threaded and workers can't wake up the GUI
     UPDATE_TIME_MS = 100
 
+    # number of threads downloading device descriptions and maximum number of descriptions waiting for them
+    FETCH_WORKERS = 8
+    FETCH_QUEUE_SIZE = 1024
+
+    # maximum time to wait for the threads to finish their tasks while closing: tasks are cancelled and their sockets
+    # are shut down, so they stop at once, and the threads which don't (still connecting to some host) are daemons
+    CLOSING_TIMEOUT_SEC = 0.1
+
     # To add support of our new device add it in ths dictionary
     #
     # Format: "Name of its SSDP-server": "version of the firmware from which setting IP via multicast is supported"
@@ -114,6 +153,10 @@ class Revealer2:
     #
     # Take note that "Name of its SSDP-server" must be equal to the name in the SERVER string which this device is
     # sending to the SSDP M_SEARCH.
+    #
+    # search_target may be set to the device type the firmware advertises in NT/ST (urn:<vendor domain>:device:...)
+    # to find this device by the targeted search. Set it only after checking the NOTIFY messages of the firmware:
+    # device doesn't answer to other device types.
     # OUR_DEVICE_DICT = {"8SMC5-USB": "4.7.8", "Eth232-4P": "1.0.13", "mDrive": "6.0.1"}
 
     SSDP_ENHANCED_DEVICES = [
@@ -134,6 +177,16 @@ class Revealer2:
         )
     ]
 
+    SSDP_ROOT_DEVICE_SEARCH_TARGET = "upnp:rootdevice"
+
+    # Search profiles to choose from in the main window. The first one is used by default.
+    #
+    # Targeted search sends M-SEARCH requests with the ST of our enhanced devices so other devices in the network
+    # (TVs, printers, routers) don't answer and revealer doesn't download their descriptions. It is offered only when
+    # some of the devices have search_target set. "Enhanced devices only" sends upnp:rootdevice if none of them has it
+    # and drops the answers of other devices before their descriptions are downloaded.
+    SSDP_SEARCH_PROFILES = ssdp_search_profiles(SSDP_ROOT_DEVICE_SEARCH_TARGET, SSDP_ENHANCED_DEVICES)
+
     def __init__(self):
 
         # some search initial objects
@@ -164,13 +217,9 @@ class Revealer2:
         s = ttk.Style()
         s.configure('.', font=self.main_font)
 
-        # try to use mac os specific cursor - if exception is raised we are not on mac os and should use default
-        self.pointer_cursor = CURSOR_POINTER_MACOS
-        try:
-            test_label = Label(self.root, text='', cursor=self.pointer_cursor)
-            test_label.destroy()
-        except TclError:
-            self.pointer_cursor = CURSOR_POINTER
+        # images, cursor and fonts shared by all windows
+        self.resources = get_resources(self.root)
+        self.pointer_cursor = self.resources.pointer_cursor
 
         # add revealer icon
         try:
@@ -185,10 +234,21 @@ class Revealer2:
         mainframe.grid_columnconfigure(0, weight=1)
         mainframe.propagate(False)
 
+        search_frame = ttk.Frame(mainframe)
+        search_frame.grid(column=0, row=0, sticky='new')
+        search_frame.grid_columnconfigure(0, weight=1)
+
         # add Search-button
-        self.button = ttk.Button(mainframe, text="Search", command=self.start_thread_search, cursor=self.pointer_cursor)
+        self.button = ttk.Button(search_frame, text="Search", command=self.start_thread_search,
+                                 cursor=self.pointer_cursor)
         self.button.grid(column=0, row=0, sticky='new')
 
+        # add search profile selection
+        self.profile_box = ttk.Combobox(search_frame, state="readonly",
+                                        values=[profile.name for profile in self.SSDP_SEARCH_PROFILES])
+        self.profile_box.current(0)
+        self.profile_box.grid(column=1, row=0, sticky='ne', padx=(5, 0))
+
         # add main revealer table
         self.main_table = RevealerTable(mainframe, col=0, row=1, height=300, left_click_url_func=self.open_link,
                                         settings_func=self.change_ip_click,
@@ -196,6 +256,20 @@ class Revealer2:
                                         os_main_root=os.path.dirname(__file__),
                                         font_name=FONT_NAME)
 
+        # search progress: answers received and descriptions downloaded with the estimated time to finish
+        status_frame = ttk.Frame(mainframe)
+        status_frame.grid(column=0, row=2, sticky='sew')
+        status_frame.grid_columnconfigure(0, weight=1)
+
+        self.status_label = ttk.Label(status_frame, text="")
+        self.status_label.grid(column=0, row=0, sticky='w')
+        # report of the last SSDP search is shown over the status line (released builds have no console for the log)
+        self._status_tip = Hovertip(self.status_label, text="No search yet.", hover_delay=500)
+
+        self.progress_bar = ttk.Progressbar(status_frame, orient="horizontal", length=150, mode="determinate",
+                                            maximum=1.0)
+        self.progress_bar.grid(column=1, row=0, sticky='e', padx=(5, 0))
+
         # configure paddings for the main frame
         for child in mainframe.winfo_children():
             child.grid_configure(padx=5, pady=5)
@@ -203,8 +277,8 @@ class Revealer2:
         # store event for using in clicking callbacks
         self.event = None
 
-        # flag indicating that we are in the process
-        self.window_updating = False
+        # time the closing of the window has started at
+        self._closing_start = None
 
         # prepare notify socket for correct working
         self.sock_notify = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
@@ -230,28 +304,42 @@ class Revealer2:
         if init_ok:
             self.info = ""
 
-            # thread with the adding new rows methods
-            self._update_table_thread = ParseDevicesThread()
-            self._update_table_thread.start()
+            # threads downloading descriptions of the devices found and adding new rows
+            self._description_fetcher = DescriptionFetcher()
+            self._fetch_pool = TaskExecutor(workers=self.FETCH_WORKERS, queue_size=self.FETCH_QUEUE_SIZE,
+                                            name="DescriptionFetch")
+            self._fetch_pool.start()
+            # description downloads in progress to attach duplicate answers to
+            self._fetches_in_flight = InFlightFetches()
+            # devices answered during the current search
+            self._device_identities = DeviceIdentityIndex()
             # ssdp search thread
-            self._ssdp_search_thread = ProcessThread()
+            self._ssdp_search_thread = TaskExecutor(name="SSDPSearch")
             self._ssdp_search_thread.start()
 
-            self._ssdp_threads = SSDPSearchThread()
+            # engine which serves all SSDP sockets of the search
+            self._ssdp_engine = SSDPSearchEngine()
 
             # legacy search thread
-            self._old_search_thread = ProcessThread()
+            self._old_search_thread = TaskExecutor(name="LegacySearch")
             self._old_search_thread.start()
-            # thread for listening notify
-            self._notify_search_thread = ProcessThread()
-            self._notify_search_thread.start()
 
-            # flag of the GUI destroying, is set than user wants to close the window
-            self._destroy_flag = threading.Event()
+            # token of the GUI destroying, is cancelled when user wants to close the window: it stops all tasks,
+            # unblocks their sockets and aborts description downloads
+            self._cancel_token = CancellationToken()
+            self._cancel_token.register(self._description_fetcher.abort_all)
+            self._cancel_token.register(lambda: shutdown_socket(self.sock_notify))
+            # generation of the current search and its token: the token is cancelled by the next search, so results
+            # of the previous searches are dropped and their work is stopped
+            self._search_generation = 0
+            self._search_token = CancellationToken()
+            self._search_cancel_handle = None
+            # counters of the work of the current search
+            self._work_ledger = WorkLedger()
             # flag of the search in progress
             self._in_process = threading.Event()
-            # thread safe event to indicate that we need to update main table one time after search is ended
-            self._in_process_after = threading.Event()
+            # flag of the legacy search in progress
+            self._legacy_in_process = threading.Event()
             # flag of the MIPAS in progress
             self._changing_settings = threading.Event()
 
@@ -260,9 +348,34 @@ class Revealer2:
             # flag indicating that table buttons states were changed for MIPAS
             self.table_buttons_state_changed = False
 
+            # events of the workers: the window is updated only when something has changed
+            self._gui_events = GuiEventQueue(self.root, self.handle_gui_events, self.work_drained,
+                                             poll_time_ms=self.UPDATE_TIME_MS)
+
     def __del__(self):
         self.sock_notify.close()
 
+    def handle_gui_events(self, events):
+        """
+        Handle events posted by the workers: update the window once for all of them and then show results and errors.
+        Called in the main thread.
+
+        :param events: list of GuiEvent
+        :return:
+        """
+
+        if self._cancel_token.is_cancelled():
+            return
+
+        self.update_window()
+
+        # dialogs are shown after the window is updated since they wait for the user
+        for event in events:
+            if event.kind == GuiEventKind.MIPAS_RESULT:
+                self._show_change_settings_info(event.data)
+            elif event.kind == GuiEventKind.ERROR:
+                mb.showerror('Error', event.data, parent=self.root)
+
     def update_window(self):
         """
         Method for updating window state in the main thread. It is important to not use anything GUI-related in the
@@ -277,12 +390,75 @@ class Revealer2:
         self.update_main_table()
         # update table buttons after
         self.update_table_buttons()
-        # reschedule
-        if not self._destroy_flag.is_set():
-            self.window_updating = True
-            self.root.after(self.UPDATE_TIME_MS, self.update_window)
+        # update search progress
+        self.update_progress()
+
+    def searching(self) -> bool:
+        """
+        Check that the search is in progress: answers are received or descriptions are downloaded.
+
+        Downloads are counted by the ledger and not by the pool, since the download is finished in the ledger before
+        the event of it is posted and the pool counts its task till the task returns.
+
+        :return:
+        """
+
+        return self._in_process.is_set() or self._ssdp_engine.in_process() or self._work_ledger.pending() > 0
+
+    def work_drained(self) -> bool:
+        """
+        Check that all the work is finished and shown: there is nothing to update in the window till the next search.
+
+        Threads and downloads are checked before the device list, so rows added by the last task are never missed.
+
+        :return:
+        """
+
+        if self.searching() or self._changing_settings.is_set():
+            return False
+
+        if not self._ssdp_search_thread.empty() or not self._old_search_thread.empty():
+            return False
+
+        if self.buttons_state_changed or self.table_buttons_state_changed:
+            return False
+
+        return self.main_table.shown_version == self.main_table.device_list.snapshot.version and \
+            not self.main_table.render_pending()
+
+    def update_progress(self):
+        """
+        Show progress of the search: answers received, descriptions downloaded and estimated time to finish.
+
+        :return:
+        """
+
+        if self._work_ledger.generation is None:
+            # no search yet
+            return
+
+        self._work_ledger.set_rendered(self.main_table.shown_rows())
+        progress = self._work_ledger.progress()
+        listening = self._in_process.is_set() or self._ssdp_engine.in_process()
+
+        if listening or progress.pending > 0 or self._legacy_in_process.is_set():
+            text = f"{progress.packets} answers, descriptions {progress.finished} of {progress.queued}"
+            if progress.failed > 0:
+                text += f" ({progress.failed} failed)"
+            if listening:
+                text = "Listening: " + text
+            elif progress.eta is not None and progress.pending > 0:
+                text += f", about {progress.eta:.0f} s left"
+            self.progress_bar["value"] = progress.fraction()
         else:
-            self.window_updating = False
+            text = f"{progress.rendered} devices found in {progress.elapsed:.1f} s"
+            report = self._ssdp_engine.report
+            if len(report.interfaces) > 0:
+                text += f" (SSDP search {report.duration:.1f} s, point here for details)"
+                self._status_tip.text = str(report)
+            self.progress_bar["value"] = 1.0
+
+        self.status_label["text"] = text
 
     def update_main_table(self):
         """
@@ -291,41 +467,32 @@ class Revealer2:
         :return:
         """
 
-        if self._in_process.is_set() or not self._update_table_thread.empty() or self._ssdp_threads.in_process():
-            self.main_table.update_with_rewriting()
+        # rows are rewritten only if the device list has changed since the last update
+        shown_version = self.main_table.shown_version
+        self.main_table.update_with_rewriting()
+        if self.main_table.shown_version != shown_version:
+            # the update disables the buttons of the table, they are enabled again after the search
             self.table_buttons_state_changed = True
-            self._in_process_after.set()
-        elif self._in_process_after.is_set():
-            self._in_process_after.clear()
-            self.main_table.update_with_rewriting()
-            self.table_buttons_state_changed = True
-        return
 
     def update_buttons(self):
-        if self._in_process.is_set() or not self._update_table_thread.empty() or self._ssdp_threads.in_process():
+        if self.searching():
             self.button["state"] = "disabled"
             self.button["text"] = "Searching..."
             self.button["cursor"] = ""
-            self.button.update()
             self.buttons_state_changed = True
         elif self._changing_settings.is_set():
             self.button["state"] = "disabled"
             self.button["text"] = "Search"
             self.button["cursor"] = ""
-            self.button.update()
             self.buttons_state_changed = True
         elif self.buttons_state_changed:
             self.button["state"] = "normal"
-            try:
-                self.button["cursor"] = CURSOR_POINTER_MACOS
-            except TclError:
-                self.button["cursor"] = CURSOR_POINTER
+            self.button["cursor"] = self.pointer_cursor
             self.button["text"] = "Search"
-            self.button.update()
             self.buttons_state_changed = False
 
     def update_table_buttons(self):
-        if self._in_process.is_set() or self._ssdp_threads.in_process():
+        if self.searching():
             self.table_buttons_state_changed = True
         elif self._changing_settings.is_set():
             self.table_buttons_state_changed = True
@@ -337,70 +504,38 @@ class Revealer2:
     def on_closing(self):
         """
         Method to be called on X button to close the application.
+
+        All tasks are cancelled: their sockets are shut down and description downloads are aborted, so nothing waits
+        for network timeouts and the window is closed at once.
         :return:
         """
 
-        # create window with closing information
-        popup = Toplevel()
-        # TODO: do we need this _ X for this window ?
-        # popup.overrideredirect(True)
-        popup.grab_set()
-        # add revealer icon
-        try:
-            popup.iconphoto(False, PhotoImage(file=os.path.join(os.path.dirname(__file__),
-                                                                "resources/appicon.png")))
-        except Exception:
-            pass
+        self._closing_start = time.monotonic()
+
+        # events of the workers are not handled anymore
+        self._gui_events.close()
 
-        popup_label = Label(popup, text="Revealer is closing. Please wait, it may take some time...")
-        popup_label.grid(column=0, row=0, sticky="news")
-        popup_label.grid_configure(padx=15, pady=15)
-        # center this window
-        center(popup)
-        # update this window
-        popup.update()
-        self.root.update_idletasks()
-        # popup.resizable(False, False)
-
-        # set destroying flag
-        self._destroy_flag.set()
-        # close all threads first
-        self._update_table_thread.stop_thread()
+        # cancel all tasks first
+        self._cancel_token.cancel()
+        self._fetch_pool.stop_thread()
         self._ssdp_search_thread.stop_thread()
         self._old_search_thread.stop_thread()
-        self._notify_search_thread.stop_thread()
-
-        self._ssdp_threads.stop_all()
 
         # wait till all threads are stopped
-        while self._update_table_thread.task_in_process() or \
-                self._ssdp_search_thread.task_in_process() or \
-                self._old_search_thread.task_in_process() or \
-                self._notify_search_thread.task_in_process():
-            pass
+        deadline = self._closing_start + self.CLOSING_TIMEOUT_SEC
+        for executor in (self._fetch_pool, self._ssdp_search_thread, self._old_search_thread):
+            if not executor.join(timeout=max(0.0, deadline - time.monotonic())):
+                log.warning(f"Threads of {executor.name} haven't stopped in {self.CLOSING_TIMEOUT_SEC * 1000:.0f} ms.")
 
-        # close notify socket
+        # close notify socket and idle description connections
         self.sock_notify.close()
+        self._description_fetcher.close_all()
 
-        # wait till we stops updating table here for not disturbing tkinter
-        if self.window_updating:
-            log.info("We are updating the window so please wait...")
-            self.root.after(self.UPDATE_TIME_MS, self.destroy_after)
-
-    def destroy_after(self):
-        """
-        After callback for destroying everything after our main updating after-method finished its work.
-
-        :return:
-        """
-
-        if not self.window_updating:
-            # and only after all of this - kill the app
-            log.info("Now the window can be closed. Bye.")
-            self.root.destroy()
-        else:
-            log.info("We are updating the window so please wait...")
-            self.root.after(self.UPDATE_TIME_MS, self.destroy_after)
+        # on_closing is called from the main loop and the window is updated only by the events handled in it, so
+        # nothing is updating the window now
+        log.info(f"Now the window can be closed. Closing took "
+                 f"{(time.monotonic() - self._closing_start) * 1000:.1f} ms. Bye.")
+        self.root.destroy()
 
     def print_i(self, string):
         if len(self.info) > 0:
@@ -409,28 +544,58 @@ class Revealer2:
 
     def show_info(self):
         """
-        Method for catching exceptions and showing them in separate windows.
+        Method for catching exceptions and showing them in separate windows. The window is shown by the main thread.
 
         :return:
         """
-        if len(self.info) > 0 and not self._destroy_flag.is_set():
-            mb.showerror('Error', self.info)
+        if len(self.info) > 0 and not self._cancel_token.is_cancelled():
+            self._gui_events.post(GuiEventKind.ERROR, self.info)
+
+    def _new_search_generation(self):
+        """
+        Cancel the previous search and start the new generation of the search.
+
+        :return: generation and cancellation token of the new search.
+        """
+
+        self._search_generation += 1
+
+        self._search_token.cancel()
+        self._cancel_token.unregister(self._search_cancel_handle)
+        self._search_token = CancellationToken()
+        # closing of the application cancels the search too
+        self._search_cancel_handle = self._cancel_token.register(self._search_token.cancel)
+
+        return self._search_generation, self._search_token
+
+    def is_stale(self, generation) -> bool:
+        return generation != self._search_generation
 
     def start_thread_search(self):
 
+        generation, search_token = self._new_search_generation()
+        self._work_ledger.reset(generation)
+
         # remove everything from our table
         self.main_table.delete_all_rows()
-        # and delete all devices from the device list of the table
-        self.main_table.device_list.clear_all()
+        # and delete all devices from the device list of the table, devices of the previous searches are not accepted
+        self.main_table.device_list.clear_all(generation)
 
         # information about this search
         self.info = ""
 
+        profile = self.SSDP_SEARCH_PROFILES[max(0, self.profile_box.current())]
+
         # start thread searches
-        self._ssdp_search_thread.add_task(self.ssdp_search_task)
-        self._old_search_thread.add_task(self.old_search_task)
+        self._ssdp_search_thread.add_task(self.ssdp_search_task, profile, generation, search_token)
+        self._old_search_thread.add_task(self.old_search_task, generation, search_token)
+
+        self._gui_events.wake()
 
     def find_ssdp_enhanced_device(self, device_name):
+        if device_name is None:
+            return None
+
         index = 0
 
         while index < len(self.SSDP_ENHANCED_DEVICES):
@@ -512,43 +677,62 @@ class Revealer2:
                 else:
                     log.info(f"Can't open {label.link} link.")
 
-    def _listen_and_capture_returned_responses_url(self, sock: socket.socket, timer_stop_event):
-        while not self._destroy_flag.is_set() and not timer_stop_event.is_set():
-            try:
-                while not self._destroy_flag.is_set() and not timer_stop_event.is_set():
-                    data, addr = sock.recvfrom(8192)
-                    data_dict = self.parse_ssdp_data(data.decode('utf-8'), addr)
-                    # if we have not received this location before
-                    if data_dict["server"] != "":
-                        self._update_table_thread.add_task(self.add_new_item_task, data_dict, addr)
-            except socket.timeout:
-                pass
-            except OSError:
-                break
+    def is_enhanced_answer(self, record: SSDPRecord):
+        """
+        Check if this answer is from our enhanced device (in the list or with MIPAS field).
 
-        sock.close()
+        :return:
+        """
+
+        return self.find_ssdp_enhanced_device(record.server) is not None or record.mipas is not None
+
+    def _on_ssdp_response(self, data, addr, profile, generation, interface_ip=None):
+        # answers which came after the next search has started are not even parsed
+        if self.is_stale(generation):
+            return
+        self._work_ledger.packet_received(generation)
+        record = parse_ssdp_packet(data, addr)
+        if profile.enhanced_only and not self.is_enhanced_answer(record):
+            return
+        # if we have not received this location before
+        if record.server != "":
+            self.queue_new_item(record, addr, interface_ip=interface_ip, generation=generation)
+
+    def _on_ssdp_notify(self, data, addr, profile, generation):
+        if self.is_stale(generation):
+            return
+        self._work_ledger.packet_received(generation)
+        record = parse_ssdp_packet(data, addr)
+
+        if record.notify:
+            if profile.enhanced_only and not self.is_enhanced_answer(record):
+                return
+            # NOTIFY flag at the end of the arguments is set to False since we don't want to filter NOTIFY
+            # answers. #92687
+            self.queue_new_item(record, addr, False, generation=generation)
 
-    def ssdp_search_task(self):
+    def ssdp_search_task(self, profile, generation, search_token):
 
         try:
-            if not self._destroy_flag.is_set():
+            # search could be replaced by the next one while it was waiting in the queue
+            if not search_token.is_cancelled():
                 self._in_process.set()
-                self._in_process_after.set()
+                self._gui_events.post(GuiEventKind.PHASE_CHANGED, "search started")
             else:
                 return
 
-            notify_started = False
+            self._fetches_in_flight.reset_counters()
+            self._description_fetcher.reset_counters()
+            self._device_identities.clear()
 
             adapters = ifaddr.get_adapters()
 
-            self._ssdp_threads.delete_all()
-            self._ssdp_threads.add_adapters(adapters)
-
-            index = 0
-
             for adapter in adapters:
                 for ip in adapter.ips:
-                    if self._destroy_flag.is_set():
+                    if search_token.is_cancelled():
+                        self._ssdp_engine.clear()
+                        self._in_process.clear()
+                        self._gui_events.post(GuiEventKind.PHASE_CHANGED, "search cancelled")
                         return
                     if not isinstance(ip.ip, str):
                         continue
@@ -556,84 +740,65 @@ class Revealer2:
                     if ip.ip == '127.0.0.1':
                         continue
 
-                    # Send M-Search message to multicast address for UPNP
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-                    try:
-                        sock.bind((ip.ip, 0))
-                    except Exception:
-                        index += 1
-                        continue
-
                     # if ip.ip is suitable for m-search - try to listen for notify messages also
                     # just ONE time
-                    if not notify_started:
-                        # set notify flag to make that process know that it need to listen answers
-                        self._ssdp_threads.start_notify()
-                        # we need to wait a little bit for notify listen to start on
-                        # this ip for correct answers receiving
-                        # See #89128.
-                        self._notify_search_thread.add_task(self.listen_notify_task, ip.ip)
-                        notify_started = True
-                        time.sleep(0.05)
-
-                    # adding search task for this ip on this adapter
-                    self._ssdp_threads[index].start()
-                    self._ssdp_threads[index].add_task(self.ssdp_search_adapter_task, sock,
-                                                       self._ssdp_threads[index].stop_flag)
-
-                    index += 1
+                    if self._ssdp_engine.add_interface(ip.ip) and len(self._ssdp_engine) == 1:
+                        self._ssdp_engine.set_notify_socket(self.sock_notify, ip.ip)
+
+            # all interfaces and notify socket are served in this thread till the end of the search
+            self._ssdp_engine.search(profile.search_targets,
+                                     lambda data, addr, interface_ip:
+                                     self._on_ssdp_response(data, addr, profile, generation, interface_ip),
+                                     lambda data, addr, interface_ip:
+                                     self._on_ssdp_notify(data, addr, profile, generation),
+                                     cancel_token=search_token)
+            self._ssdp_engine.report.add_note(f"Description fetch pool: {self._fetch_pool.queue_depth()} queued, "
+                                              f"{self._fetch_pool.in_flight()} in flight, "
+                                              f"{self._fetch_pool.dropped} dropped.")
+            self._ssdp_engine.report.add_note(f"Description fetches: {self._fetches_in_flight.started} started, "
+                                              f"{self._fetches_in_flight.saved} saved by joining the ones of the "
+                                              f"previous search in progress, {self._fetches_in_flight.stale} of the "
+                                              f"previous searches dropped.")
+            self._ssdp_engine.report.add_note(self._description_fetcher.cache_summary())
+            self._ssdp_engine.report.add_note(f"Devices answered: {len(self._device_identities)}, "
+                                              f"{self._device_identities.duplicates} duplicate answers merged.")
+            log.info(self._ssdp_engine.report)
 
             self._in_process.clear()
-            # set notify flag to false so notify thread will stop when all ssdp searches are finished
-            self._ssdp_threads.stop_notify()
 
         except Exception:
+            self._in_process.clear()
             except_info = traceback.format_exc()
             self.print_i(f"Unhandled exception occurred while performing SSDP search:\n{except_info}")
 
+        self._gui_events.post(GuiEventKind.PHASE_CHANGED, "listening finished")
+
         # show info from search if we had some important information (exceptions with errors)
-        if not self._destroy_flag.is_set():
+        if not self._cancel_token.is_cancelled():
             self.show_info()
 
         return
 
-    def ssdp_search_adapter_task(self, sock, timer_stop_event):
-        # M-Search message body
-        message = \
-            'M-SEARCH * HTTP/1.1\r\n' \
-            'HOST:239.255.255.250:1900\r\n' \
-            'ST:upnp:rootdevice\r\n' \
-            'MX:2\r\n' \
-            'MAN:"ssdp:discover"\r\n' \
-            '\r\n'
-
-        # set timeout
-        sock.settimeout(0.05)
-        timer_stop_event.clear()
-        try:
-            sock.sendto(message.encode('utf-8'), ("239.255.255.250", 1900))
-            self._listen_and_capture_returned_responses_url(sock, timer_stop_event)
-        except OSError:
-            pass
-
-    def _get_uuid_of_found(self, data_dict):
+    def _get_uuid_of_found(self, record: SSDPRecord):
         """
         Check if this device is our enhanced device with correct version.
 
-        :return:
+        :return: UUID of our device, "" if its firmware can't change settings or None if it is not our device.
         """
 
-        device_index_in_list = self.find_ssdp_enhanced_device(data_dict["server"])
+        device_index_in_list = self.find_ssdp_enhanced_device(record.server)
+        # devices without USN are shown with "Not provided" UUID
+        record_uuid = record.uuid if record.uuid is not None else NOT_PROVIDED
 
         if device_index_in_list is not None:
             version_with_settings = \
                 self.SSDP_ENHANCED_DEVICES[device_index_in_list].enhanced_ssdp_support_min_fw
-            uuid = data_dict["uuid"]
+            uuid = record_uuid
 
             # we need to check that if we have our device it supports setting settings via multicast
             if version_with_settings != "":
                 version_with_settings_array = [int(num) for num in version_with_settings.split('.')]
-                current_version = data_dict["version"].split('.')
+                current_version = (record.version or NOT_PROVIDED).split('.')
                 current_version_array = [int(num) for num in current_version]
 
                 # check that we have version greater than this
@@ -646,42 +811,129 @@ class Revealer2:
                         if current_version_array[2] < version_with_settings_array[2]:
                             uuid = ""
 
-        elif data_dict['mipas'] != "Not provided":
-            uuid = data_dict["uuid"]
+        elif record.mipas is not None:
+            uuid = record_uuid
 
         else:
             uuid = None
 
         return uuid
 
-    def add_new_item_task(self, data_dict, addr, notify_flag=False):
+    def queue_new_item(self, record: SSDPRecord, addr, notify_flag=False, interface_ip=None, generation=None):
+        """
+        Queue description download for the device answered. If this device (with the same UUID or LOCATION) has
+        already answered during this search, only its address and interface are remembered. If the description of
+        this device is still being downloaded for the previous search, the answer waits for that download.
+
+        Answers of the previous searches (generation is not the current one) are dropped.
+
+        :return:
+        """
+
+        if generation is None:
+            generation = self._search_generation
+        elif self.is_stale(generation):
+            return
+
+        uuid = record.uuid or ""
+        location = record.location or ""
+
+        identity, known = self._device_identities.observe(uuid, addr[0], location, interface_ip)
+        if known:
+            log.debug(f"{addr[0]} is already known as {identity}")
+            return
+
+        flight = self._fetches_in_flight.join(record.location or NOT_PROVIDED, uuid,
+                                              (record, addr, notify_flag, generation), ssdp_record=record,
+                                              generation=generation)
+        if flight is None:
+            return
+
+        # download is counted before it is queued so the ledger never sees it finished before queued
+        self._work_ledger.fetch_queued(generation)
+        if not self._fetch_pool.add_task(self.fetch_description_task, flight, generation):
+            self._work_ledger.fetch_finished(generation, ok=False, started=False)
+            self._fetches_in_flight.finish(flight)
+            # the answer is dropped - let the device be found by its next answer
+            self._device_identities.forget(identity)
+
+    def fetch_description_task(self, flight, generation):
+        # nobody from the current search waits for this description - it is not downloaded at all
+        if self._fetches_in_flight.drop_stale(flight, self._search_generation):
+            self._work_ledger.fetch_finished(generation, started=False)
+            return
+
+        self._work_ledger.fetch_started(generation)
+        xml_dict = None
+        try:
+            xml_dict = self.parse_upnp_xml(flight.location, flight.ssdp_record)
+
+            # rows of all answers waiting for this description are made first and then inserted to the table together,
+            # so the device list is locked only for the insertion
+            rows = []
+            for record, addr, notify_flag, waiter_generation in self._fetches_in_flight.finish(flight):
+                device_row = self.make_new_item(dict(xml_dict) if xml_dict is not None else None, record, addr,
+                                                notify_flag, waiter_generation)
+                if device_row is not None:
+                    rows.append((device_row, waiter_generation))
+
+            with self.main_table.device_list.batch():
+                for device_row, waiter_generation in rows:
+                    self.main_table.device_list.insert_device(device_row, waiter_generation)
+        finally:
+            # download is finished only after its rows are added, so GUI doesn't stop updating before they are shown
+            self._work_ledger.fetch_finished(generation, ok=xml_dict is not None)
+            self._gui_events.post(GuiEventKind.DEVICES_CHANGED)
+
+    @staticmethod
+    def _presentation_link(xml_dict, data_dict, addr):
+        """
+        Make link to the web page of the device from presentationURL of its description.
+
+        :return: link to show in the table. presentationURL of xml_dict is set to '-' if the device doesn't have it.
+        """
 
+        # check that we have our url with correct format
         try:
-            xml_dict = self.parse_upnp_xml(data_dict["location"])
+            if xml_dict["presentationURL"] is None:
+                link = data_dict["location_url"]
+                xml_dict["presentationURL"] = '-'
+            elif xml_dict["presentationURL"][0:4] != "http":
+                link = data_dict["location_url"] + xml_dict["presentationURL"]
+            else:
+                # from the XML-description we should get relative URL but if we have absolute - use absolute
+                link = xml_dict["presentationURL"]
+        except KeyError:
+            xml_dict["presentationURL"] = '-'
+            link = addr[0]
+
+        return link
+
+    def make_new_item(self, xml_dict, record: SSDPRecord, addr, notify_flag=False, generation=None):
+        """
+        Make the row of the device answered to be inserted to the device list.
+
+        :return: RevealerDeviceRow or None if the device is not shown.
+        """
+
+        if generation is not None and self.is_stale(generation):
+            return None
 
-            uuid = self._get_uuid_of_found(data_dict)
+        try:
+            uuid = self._get_uuid_of_found(record)
 
             if uuid is None and notify_flag:
                 # we don't need not our device from notify
-                return
+                return None
+
+            # dict of the SSDP data is made only for the devices shown in the table - it is kept in their properties
+            data_dict = record.to_dict()
 
             if xml_dict is not None:
                 # append all datadict field to xml_dict
                 for name in data_dict:
                     xml_dict[name] = data_dict[name]
-                # check that we have our url with correct format
-                try:
-                    if xml_dict["presentationURL"] is None:
-                        link = data_dict["location_url"]
-                        xml_dict["presentationURL"] = '-'
-                    elif xml_dict["presentationURL"][0:4] != "http":
-                        link = data_dict["location_url"] + xml_dict["presentationURL"]
-                    else:
-                        # from the XML-description we should get relative URL but if we have absolute - use absolute
-                        link = xml_dict["presentationURL"]
-                except KeyError:
-                    xml_dict["presentationURL"] = '-'
-                    link = addr[0]
+                link = self._presentation_link(xml_dict, data_dict, addr)
 
                 # add version and server name from ssdp dict
                 xml_dict["version"] = data_dict["version"]
@@ -698,21 +950,21 @@ class Revealer2:
                 else:
                     device_name = xml_dict["friendlyName"]
 
-                if not self._destroy_flag.is_set():
-                    with self.main_table.lock:
-                        self.main_table.add_row_ssdp_item(device_name,
-                                                          link, data_dict["ssdp_url"], uuid, xml_dict,
-                                                          tag=RevealerDeviceTag.LOCAL)
+                if not self._cancel_token.is_cancelled():
+                    return self.main_table.make_row_ssdp_item(device_name,
+                                                              link, data_dict["ssdp_url"], uuid, xml_dict,
+                                                              tag=RevealerDeviceTag.LOCAL)
             else:
-                if not self._destroy_flag.is_set():
-                    with self.main_table.lock:
-                        self.main_table.add_row_ssdp_item(data_dict["server"],
-                                                          data_dict["ssdp_url"], data_dict["ssdp_url"],
-                                                          uuid, data_dict, tag=RevealerDeviceTag.NOT_LOCAL)
+                if not self._cancel_token.is_cancelled():
+                    return self.main_table.make_row_ssdp_item(data_dict["server"],
+                                                              data_dict["ssdp_url"], data_dict["ssdp_url"],
+                                                              uuid, data_dict, tag=RevealerDeviceTag.NOT_LOCAL)
         except Exception:
             except_info = traceback.format_exc()
-            self.print_i(f"Error while trying to add new device {addr} with data_dict {data_dict} to the table:\n"
-                         f"{except_info}")
+            self.print_i(f"Error while trying to add new device {addr} with SSDP data {record.to_dict()} to the table:"
+                         f"\n{except_info}")
+
+        return None
 
     def socket_notify_reinit(self):
         # close notify socket
@@ -739,237 +991,25 @@ class Revealer2:
 
         return
 
-    def listen_notify_task(self, interface_ip):
-        """
-        Task for search thread where we listen for all notify messages while we sending m-searches since we add too
-        our device option to send notify with answering to the m-search.
-        :return:
-        """
-
-        multicast_group = '239.255.255.250'
-
-        try:
-            self.sock_notify.setsockopt(socket.SOL_IP, socket.IP_ADD_MEMBERSHIP,
-                                        socket.inet_aton(multicast_group) + socket.inet_aton(interface_ip))
-        except OSError:
-            pass
-
-        self.sock_notify.settimeout(0.1)
-
-        while self._ssdp_threads.in_process() and not self._destroy_flag.is_set():
-            # listen and capture returned responses
-            try:
-                while self._ssdp_threads.in_process() and not self._destroy_flag.is_set():
-                    data, addr = self.sock_notify.recvfrom(8192)
-                    data_strings = data.decode('utf-8').split('\r\n')
-
-                    if data_strings[0] == 'NOTIFY * HTTP/1.1':
-                        data_dict = self.parse_ssdp_data(data.decode('utf-8'), addr)
-                        # NOTIFY flag at the end of the arguments is set to False since we don't want to filter NOTIFY
-                        # answers. #92687
-                        self._update_table_thread.add_task(self.add_new_item_task, data_dict, addr, False)
-
-            except socket.timeout:
-                pass
-            except OSError:
-                break
-
-    def _parse_ssdp_header_server(self, string, ssdp_dict) -> None:
+    def parse_upnp_xml(self, url, record: SSDPRecord = None):
         """
-        Correct format for SERVER header is:
-            <OS>/<OS version> UPnP/<version of UPnP supported> <product>/<product version>
+        Get device description from the cache or download it.
 
-        All fields should be filled according to HTTP/1.1 “product tokens”.
-
-        For example, “SERVER: unix/5.1 UPnP/2.0 MyProduct/1.0”
-
-        Note: whitespaces are used as separator so should not be used in OS / product strings but if some device has
-        additional whitespaces in its product tokens revealer should try and parse them as well with logging about that.
-
-        :param string: str
-           String after SERVER header.
-        :param ssdp_dict: dict
-           Dict with SSDP properties of this device to be filled with parsed information.
+        :param url: str
+            LOCATION of the description.
+        :param record: SSDPRecord
+            SSDP data of the device with CACHE-CONTROL, BOOTID.UPNP.ORG, CONFIGID.UPNP.ORG headers and UUID of USN if
+            known.
         :return:
         """
-        warning_line = ''
-
-        words_string = string.split(' ')
-        # check that format is correct
-        if len(words_string) != 3:
-            warning_line += "SERVER header line with incorrect format: '" + \
-                            string + "'. Whitespaces shouldn't be used in the OS and product names."
-
-            # try to find UPnP field
-            index_upnp = string.index("UPnP/")
-            if index_upnp < 0:
-                warning_line += "Can't parse SERVER header line without UPnP field at all: '" + \
-                                string + "'."
-                os_version_words = ["Not provided", "Not provided"]
-                server_version_words = ["Not provided", "Not provided"]
-            else:
-                os_fields = string[0:index_upnp]
-                os_version_words = os_fields.split('/')
-
-                product_fields = string[index_upnp + 1 + string[index_upnp:].index(" "):]
-                server_version_words = product_fields.split('/')
-
-        else:
-            os_version = words_string[0]
-            os_version_words = os_version.split('/')
-            # TODO: check different lines (with trailing whitespaces and so on)
-            server_version = words_string[len(words_string) - 1]  # last word after ' '
-            server_version_words = server_version.split('/')
-
-        if len(warning_line) > 0:
-            print("Warning:", warning_line)
 
-        try:
-            ssdp_dict["server"] = server_version_words[0]
-        except IndexError:
-            ssdp_dict["server"] = "Not provided"
-        try:
-            ssdp_dict["version"] = server_version_words[1]
-        except IndexError:
-            ssdp_dict["version"] = "Not provided"
+        if record is None:
+            return self._description_fetcher.fetch(url)
 
-        try:
-            ssdp_dict["os"] = os_version_words[0]
-        except IndexError:
-            ssdp_dict["os"] = "Not provided"
-        try:
-            ssdp_dict["os_version"] = os_version_words[1]
-        except IndexError:
-            ssdp_dict["os_version"] = "Not provided"
+        max_age = int(record.max_age) if record.max_age is not None else None
 
-    @staticmethod
-    def _parse_location_url(string):
-        m = re.search(URL_REGEX_PORT, string)
-
-        try:
-            url_raw = m.group()
-            rest_data = string[len(url_raw):]
-            ip_address = (re.search(IP_ADDRES_REGEX, url_raw)).group()
-            port = (re.search(PORT_REGEX, url_raw)).group()
-            return ip_address, port[1::1], rest_data
-        except AttributeError:
-            # try get url without port
-            m = re.search(URL_REGEX_WITHOUT_PORT, string)
-            try:
-                url_raw = m.group()
-                rest_data = string[len(url_raw):]
-                ip_address = (re.search(IP_ADDRES_REGEX, url_raw)).group()
-                return ip_address, None, rest_data
-            except AttributeError:
-                return None, None, string
-
-    def _parse_ssdp_header_location(self, string, ssdp_dict, addr) -> None:
-        # get only field value:
-
-        field_name = re.match("location:\\s*", string.lower()).group()
-        value_string = string[len(field_name):]
-
-        ip_address, port, xml_raw = self._parse_location_url(value_string)
-
-        if ip_address is not None and port is not None:
-            # we have correct absolute location - save it as location
-            ssdp_dict["location"] = value_string
-        elif ip_address is not None and port is None:
-            # if we don't have port specification
-            ssdp_dict['location'] = 'http://' + ip_address + ":80" + xml_raw
-        else:
-            # if we are here it means we have an invalid LOCATION URL -
-            # relative one but UPnP standards require an absolute URL.
-            # See https://openconnectivity.org/upnp-specs/UPnP-arch-DeviceArchitecture-v2.0-20200417.pdf
-            # on pages 29 and 41 for LOCATION header format
-            #
-            # Nevertheless we are trying to get xml-file for this devices with address
-            ssdp_dict['location'] = 'http://' + addr[0] + ":80" + xml_raw
-            ip_address = addr[0]
-
-        ssdp_dict["ssdp_url"] = ip_address
-        ssdp_dict["location_url"] = re.match(URL_REGEX_PORT, value_string.lower()).group()
-
-    def _parse_ssdp_header_usn(self, string, ssdp_dict, addr) -> None:
-        words_string = string.split(':')  # do this again for symmetry
-        try:
-            ssdp_dict["uuid"] = words_string[2]
-        except IndexError:
-            except_info = traceback.format_exc()
-            self.print_i(f"USN of {addr} has incorrect format: {string}. It should be:\n"
-                         f"USN: uuid:00000000-0000-0000-0000-000000000000::<device-type>."
-                         f"\n{except_info}")
-
-    def _parse_ssdp_header_mipas(self, string, ssdp_dict) -> None:
-        words_string = string.split(':')
-        try:
-            ssdp_dict["mipas"] = words_string[1].replace(' ', '')
-        except IndexError:
-            ssdp_dict["mipas"] = ""
-
-    def parse_ssdp_data(self, ssdp_data, addr):
-        ssdp_dict = {"server": "Not provided", "version": "Not provided", "location": "Not provided",
-                     "ssdp_url": "Not provided", "uuid": "Not provided", "location_url": "Not provided",
-                     "os": "Not provided", "os_version": "Not provided", "mipas": "Not provided"}
-        ssdp_strings = ssdp_data.split("\r\n")
-
-        try:
-            for string in ssdp_strings:
-                if string[0:3].lower() != Revealer2.SSDP_HEADER_HTTP:
-                    words_string = string.split(':')
-
-                    if words_string[0].lower() \
-                            == Revealer2.SSDP_HEADER_SERVER:  # format: SERVER: lwIP/1.4.1 UPnP/2.0 8SMC5-USB/4.7.7
-                        # remove header from string
-                        string = string[len(Revealer2.SSDP_HEADER_SERVER) + 1:]
-                        if len(string) > 0 and string[0] == ' ':
-                            string = string[1:]
-                        if len(string) > 0:
-                            self._parse_ssdp_header_server(string, ssdp_dict)
-                    elif words_string[0].lower() == \
-                            Revealer2.SSDP_HEADER_LOCATION:  # format: LOCATION: http://172.16.130.67:80/Basic_info.xml
-                        self._parse_ssdp_header_location(string, ssdp_dict, addr)
-                    elif words_string[0].lower() == \
-                            Revealer2.SSDP_HEADER_USN:
-                        # USN: uuid:40001d0a-0000-0000-8e31-4010900b00c8::upnp:rootdevice
-                        self._parse_ssdp_header_usn(string, ssdp_dict, addr)
-                    elif words_string[0].lower() == \
-                            Revealer2.SSDP_HEADER_MIPAS:
-                        # MIPAS: - our special field to identifty that this device
-                        # supports network settings changing via multicast
-                        self._parse_ssdp_header_mipas(string, ssdp_dict)
-
-        except Exception:
-            except_info = traceback.format_exc()
-            self.print_i(f"Error in parsing {addr} SSDP data:\n{except_info}")
-            return ssdp_dict
-
-        return ssdp_dict
-
-    @staticmethod
-    def parse_upnp_xml(url):
-        xml_dict = {}
-
-        try:
-            response = urllib.request.urlopen(url, timeout=1).read().decode('utf-8')
-
-            tree = ET.fromstring(response)
-
-            for child in tree:
-                tag_array = child.tag.split('}')
-                tag_name = tag_array[len(tag_array) - 1]
-                xml_dict[tag_name] = child.text
-
-                for grandchild in child:
-                    tag_array = grandchild.tag.split('}')
-                    tag_name = tag_array[len(tag_array) - 1]
-                    xml_dict[tag_name] = grandchild.text
-
-            return xml_dict
-
-        except Exception as err:
-            print("Exception for xml_dict", url, err)
-            return None
+        return self._description_fetcher.fetch(url, max_age=max_age, bootid=record.bootid, configid=record.configid,
+                                               uuid=record.uuid)
 
     def change_ip_multicast(self, uuid, settings_dict):
 
@@ -979,48 +1019,47 @@ class Revealer2:
         # start process for changing settings in another thread
         self._ssdp_search_thread.add_task(self.change_ip_multicast_task, uuid, settings_dict)
 
+        self._gui_events.wake()
+
     def _listen_and_capture_returned_responses_location(self, sock: socket.socket, devices, uuid) -> int:
         result = False
-        response_dict = None
+        response_record = None
         try:
-            while not self._destroy_flag.is_set() and not result:
+            while not self._cancel_token.is_cancelled() and not result:
                 data, addr = sock.recvfrom(8192)
-                data_dict = self.parse_ssdp_data(data.decode('utf-8'), addr)
+                record = parse_ssdp_packet(data, addr)
 
                 # if we have not received this location before
-                if data_dict["uuid"] == uuid and \
-                        data_dict["mipas"] == self.SSDP_MIPAS_RESULT_OK or \
-                        data_dict["mipas"] == self.SSDP_MIPAS_RESULT_ERROR:
-                    devices.add(data_dict["location"])
+                if record.uuid == uuid and \
+                        record.mipas == self.SSDP_MIPAS_RESULT_OK or \
+                        record.mipas == self.SSDP_MIPAS_RESULT_ERROR:
+                    devices.add(record.location)
                     result = True
-                    response_dict = data_dict
+                    response_record = record
 
         except socket.timeout:
             # try to get notify response from different network
             try:
-                while not self._destroy_flag.is_set() and not result:
+                while not self._cancel_token.is_cancelled() and not result:
                     data_notify, addr_notify = self.sock_notify.recvfrom(8192)
-                    data_strings = data_notify.decode('utf-8').split('\r\n')
+                    record = parse_ssdp_packet(data_notify, addr_notify)
 
-                    if data_strings[0] == 'NOTIFY * HTTP/1.1':
-
-                        data_notify_dict = self.parse_ssdp_data(data_notify.decode('utf-8'), addr_notify)
-
-                        if data_notify_dict["uuid"] == uuid and \
-                                data_notify_dict["mipas"] == self.SSDP_MIPAS_RESULT_OK or \
-                                data_notify_dict["mipas"] == self.SSDP_MIPAS_RESULT_ERROR:
-                            devices.add(data_notify_dict["location"])
+                    if record.notify:
+                        if record.uuid == uuid and \
+                                record.mipas == self.SSDP_MIPAS_RESULT_OK or \
+                                record.mipas == self.SSDP_MIPAS_RESULT_ERROR:
+                            devices.add(record.location)
                             result = True
-                            response_dict = data_notify_dict
+                            response_record = record
             except socket.timeout:
                 pass
             except OSError:
                 pass
 
             sock.close()
-            if response_dict is not None:
+            if response_record is not None:
                 # check if it was OK from the server or ERROR
-                if response_dict["mipas"] == self.SSDP_MIPAS_RESULT_OK:
+                if response_record.mipas == self.SSDP_MIPAS_RESULT_OK:
                     return RESULT_OK
                 else:
                     return RESULT_ERROR
@@ -1035,9 +1074,9 @@ class Revealer2:
             pass
         except OSError:
             pass
-        if response_dict is not None:
+        if response_record is not None:
             # check if it was OK from the server or ERROR
-            if response_dict["mipas"] == self.SSDP_MIPAS_RESULT_OK:
+            if response_record.mipas == self.SSDP_MIPAS_RESULT_OK:
                 return RESULT_OK
             else:
                 return RESULT_ERROR
@@ -1112,7 +1151,9 @@ class Revealer2:
             except OSError:
                 continue
 
-            _break = self._listen_and_capture_returned_responses_location(sock, devices, uuid)
+            # socket is shut down on cancel to wake up the listener at once
+            with self._cancel_token.on_cancel(lambda: shutdown_socket(sock)):
+                _break = self._listen_and_capture_returned_responses_location(sock, devices, uuid)
             if _break == RESULT_OK or _break == RESULT_ERROR:
                 break
 
@@ -1151,28 +1192,30 @@ class Revealer2:
 
         try:
             self._changing_settings.set()
+            self._gui_events.post(GuiEventKind.PHASE_CHANGED, "settings change started")
 
             devices = set()
 
             adapters = ifaddr.get_adapters()
 
             for adapter in adapters:
-                if self._destroy_flag.is_set():
+                if self._cancel_token.is_cancelled():
                     break
                 if result == RESULT_OK or result == RESULT_ERROR:
                     break
                 result = self._change_ips_of_adapter(adapter, message, devices, uuid)
 
-            if not self._destroy_flag.is_set():
-                self._show_change_settings_info(result)
-
             self._changing_settings.clear()
+            # result is shown by the main thread
+            self._gui_events.post(GuiEventKind.MIPAS_RESULT, result)
         except Exception:
+            self._changing_settings.clear()
+            self._gui_events.post(GuiEventKind.PHASE_CHANGED, "settings change failed")
             except_info = traceback.format_exc()
             self.print_i(f"Unhandled error while setting device network settings:\n{except_info}")
 
         # show window with errors if there were any
-        if not self._destroy_flag.is_set():
+        if not self._cancel_token.is_cancelled():
             self.show_info()
 
     def change_ip_click(self, name, uuid, link):
@@ -1195,19 +1238,22 @@ class Revealer2:
                                                    sock: socket.socket,
                                                    devices,
                                                    ssdp_devices,
-                                                   ssdp_device_number) -> bool:
+                                                   ssdp_device_number,
+                                                   generation,
+                                                   search_token) -> bool:
         try:
-            while not self._destroy_flag.is_set():
+            while not search_token.is_cancelled():
                 data, addr = sock.recvfrom(8192)
+                self._work_ledger.packet_received(generation)
                 if addr[0] not in devices and addr[0] not in ssdp_devices:
                     devices.add(addr[0])
 
                     title = addr[0]
 
-                    if not self._destroy_flag.is_set():
-                        with self.main_table.lock:
-                            self.main_table.add_row_old_item(title, "http://" + addr[0],
-                                                             tag=RevealerDeviceTag.OLD_LOCAL)
+                    if not search_token.is_cancelled():
+                        self.main_table.add_row_old_item(title, "http://" + addr[0],
+                                                         tag=RevealerDeviceTag.OLD_LOCAL, generation=generation)
+                        self._gui_events.post(GuiEventKind.DEVICES_CHANGED)
 
                     ssdp_device_number += 1
 
@@ -1221,10 +1267,49 @@ class Revealer2:
 
         return False
 
-    def old_search(self, ssdp_devices, device_number):
+    @staticmethod
+    def _send_old_search_request(ip_address):
+        """
+        Send broadcast request of the old protocol from the interface.
+
+        :param ip_address: str
+            IP address of the interface.
+        :return: socket to listen for the answers or None if the request can't be sent.
+        """
+
+        # Send M-Search message to multicast address for UPNP
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        try:
+            sock.bind((ip_address, 0))
+        except Exception:
+            sock.close()
+            return None
+
+        try:
+            message = "DISCOVER_CUBIELORD_REQUEST " + str(sock.getsockname()[1])
+        except Exception:
+            sock.close()
+            return None
+
+        sock.settimeout(0.5)
+        try:
+            sock.sendto(message.encode('utf-8'), ("255.255.255.255", 8008))
+        except OSError:
+            sock.close()
+            return None
+
+        return sock
+
+    def old_search(self, ssdp_devices, device_number, generation, search_token):
         """
         Perform old version of searching devices in the local network as in the revealer 0.1.0
         Sends multicast packet with special string and listen for the answers.
+
+        :param generation: int
+            Generation of the search the found devices are added to the table by.
+        :param search_token: CancellationToken
+            Token of the search: it is cancelled by the next search or by closing of the application.
         :return:
         """
 
@@ -1243,39 +1328,35 @@ class Revealer2:
                     if ip.ip == '127.0.0.1':
                         continue
 
-                    # Send M-Search message to multicast address for UPNP
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-                    try:
-                        sock.bind((ip.ip, 0))
-                    except Exception:
-                        continue
-
-                    try:
-                        message = "DISCOVER_CUBIELORD_REQUEST " + str(sock.getsockname()[1])
-                    except Exception:
+                    sock = self._send_old_search_request(ip.ip)
+                    if sock is None:
                         continue
 
-                    sock.settimeout(0.5)
-                    try:
-                        sock.sendto(message.encode('utf-8'), ("255.255.255.255", 8008))
-                    except OSError:
-                        continue
-
-                    # listen and capture returned responses
-                    _break = self._listen_and_capture_returned_responses_old(sock,
-                                                                             devices,
-                                                                             ssdp_devices,
-                                                                             ssdp_device_number)
-                    if _break:
+                    # listen and capture returned responses, socket is shut down on cancel to wake up the listener
+                    with search_token.on_cancel(lambda: shutdown_socket(sock)):
+                        _break = self._listen_and_capture_returned_responses_old(sock,
+                                                                                 devices,
+                                                                                 ssdp_devices,
+                                                                                 ssdp_device_number,
+                                                                                 generation,
+                                                                                 search_token)
+                    if _break or search_token.is_cancelled():
                         break
+                if search_token.is_cancelled():
+                    break
             return devices
         except Exception:
             except_info = traceback.format_exc()
             self.print_i(f"Unhandled error in old protocol search:\n{except_info}")
 
-    def old_search_task(self):
-        self.old_search({}, 1)
+    def old_search_task(self, generation, search_token):
+        if not search_token.is_cancelled():
+            self._legacy_in_process.set()
+            try:
+                self.old_search({}, 1, generation, search_token)
+            finally:
+                self._legacy_in_process.clear()
+        self._gui_events.post(GuiEventKind.PHASE_CHANGED, "legacy search finished")
 
 
 class MIPASDialog(sd.Dialog):
@@ -1304,6 +1385,7 @@ class MIPASDialog(sd.Dialog):
 
         self.main_font = font.nametofont(FONT_NAME)
         self.main_font.actual()
+        self.resources = get_resources(parent)
 
         self.device = device
         self.uuid = uuid
@@ -1394,10 +1476,10 @@ class MIPASDialog(sd.Dialog):
         # try to change foreground color for macos
         try:
             frame = LabelFrame(master, text="Network settings", fg=self.text_color,
-                               font=(self.main_font.name, self.main_font.actual()['size'], 'bold'))
+                               font=self.resources.font(self.main_font.name, 'bold'))
         except TclError:
             frame = LabelFrame(master, text="Network settings",
-                               font=(self.main_font.name, self.main_font.actual()['size'], 'bold'))
+                               font=self.resources.font(self.main_font.name, 'bold'))
 
         frame.grid(row=2, column=0, sticky='ns')
 
@@ -1447,7 +1529,7 @@ class MIPASDialog(sd.Dialog):
         note_frame.grid(row=3, column=0, sticky='news')
 
         self.note_label = Label(note_frame, text=self.USER_NOTE_TEXT, justify=LEFT,
-                                font=(self.main_font.name, self.main_font.actual()['size'], 'italic'),
+                                font=self.resources.font(self.main_font.name, 'italic'),
                                 wraplength=100)
         self.note_label.grid(column=0, row=0, padx=5, sticky='we')
 
@@ -1616,14 +1698,12 @@ class PropDialog(sd.Dialog):
                             'os_version': {'name': 'OS version', 'row': 31},
                             'location': {'name': 'Location', 'row': 36}}
 
-        # try to use mac os specific cursor - if exception is raised we are not on mac os and should use default
-        self.pointer_cursor = CURSOR_POINTER_MACOS
-        try:
-            test_label = Label(parent, text='', cursor=self.pointer_cursor)
-            test_label.destroy()
+        self.resources = get_resources(parent)
+        self.pointer_cursor = self.resources.pointer_cursor
+        # mac os cursor is available on mac os only, so it tells which text color to use
+        if self.resources.macos_cursor:
             self.text_color = "SystemButtonText"
-        except TclError:
-            self.pointer_cursor = CURSOR_POINTER
+        else:
             self.text_color = DEFAULT_TEXT_COLOR
 
         sd.Dialog.__init__(self, parent, device_name)
@@ -1655,18 +1735,18 @@ class PropDialog(sd.Dialog):
                         ttk.Separator(master, orient='horizontal').grid(column=0, row=29, pady=5, sticky='news')
                         ttk.Separator(master, orient='horizontal').grid(column=1, row=29, pady=5, sticky='news')
                     Label(master, text=label_name + ": ", justify=LEFT, fg=text_color,
-                          font=(self.main_font.name, self.main_font.actual()['size'],
-                                'bold')).grid(column=0, row=row_number, padx=5, sticky='w')
+                          font=self.resources.font(self.main_font.name, 'bold')).grid(
+                        column=0, row=row_number, padx=5, sticky='w')
                     label_count += 1
                     if name == 'presentationURL' and self.dict[name] != '-':
                         text_color = "blue"
                         Label(master, text=self.url, justify=LEFT, cursor=self.pointer_cursor, fg=text_color,
-                              font=(self.main_font.name, self.main_font.actual()['size'], 'underline')).grid(
+                              font=self.resources.font(self.main_font.name, 'underline')).grid(
                             column=1, row=row_number, padx=5, sticky='w')
                         label_count += 1
                     elif name == 'presentationURL' and self.dict[name] == '-':
                         Label(master, text='Not provided', justify=LEFT, fg=text_color,
-                              font=(self.main_font.name, self.main_font.actual()['size'], 'italic')).grid(
+                              font=self.resources.font(self.main_font.name, 'italic')).grid(
                             column=1, row=row_number, padx=5, sticky='w')
                         label_count += 1
                     else:
@@ -1677,7 +1757,7 @@ class PropDialog(sd.Dialog):
                         elif self.dict[name] == "Not provided":
                             font_style = 'italic'
                         Label(master, text=self.dict[name], justify=LEFT, cursor=cursor, fg=text_color,
-                              font=(self.main_font.name, self.main_font.actual()['size'], font_style)).grid(
+                              font=self.resources.font(self.main_font.name, font_style)).grid(
                             column=1, row=row_number, padx=5, sticky='w')
                         label_count += 1
                 except KeyError:
@@ -1740,12 +1820,15 @@ class PropDialog(sd.Dialog):
 
 
 if __name__ == '__main__':
+    # search reports and warnings are written to the console
+    log.basicConfig(level=log.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
     print("Starting revealer version " + Version.full + ".")
 
     app = Revealer2()
     try:
         app.root.protocol("WM_DELETE_WINDOW", app.on_closing)
-        app.root.after(app.UPDATE_TIME_MS, app.update_window)
+        app.update_window()
         app.root.mainloop()
     except TclError:
         pass
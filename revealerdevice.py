@@ -1,4 +1,18 @@
+import itertools
 import logging as log
+import socket
+import sys
+import threading
+from bisect import bisect_left
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+# value of the fields which devices didn't provide - one shared string for all devices
+NOT_PROVIDED = sys.intern("Not provided")
+
+# versions of the device rows: every row gets the new one when it is made or changed, so the table redraws the row only
+# if the version it shows is not the same (next() of count is atomic in CPython)
+_row_versions = itertools.count(1)
 
 
 class RevealerDeviceType:
@@ -13,11 +27,94 @@ class RevealerDeviceTag:
     OLD_LOCAL = "old_local"
 
 
+class DeviceProperties(MutableMapping):
+    """
+    Class of the properties of the device from its SSDP answer and description: dict-like view with fixed set of keys.
+
+    Values are kept in the list in the order of FIELDS, so the keys are not stored in every device and fields which are
+    not provided refer to the same NOT_PROVIDED string.
+    """
+
+    FIELDS = ("friendlyName", "manufacturer", "manufacturerURL", "modelDescription", "modelName", "modelNumber",
+              "modelURL", "serialNumber", "UDN", "presentationURL",
+              "server", "version", "ssdp_server", "location", "ssdp_url", "uuid", "location_url", "os", "os_version",
+              "mipas", "max_age", "bootid", "configid")
+    _FIELD_INDEX = {name: index for index, name in enumerate(FIELDS)}
+
+    # marker of the field which is absent in the mapping at all
+    _ABSENT = object()
+
+    __slots__ = ("_values", "_extra")
+
+    def __init__(self, properties=None):
+        self._values = [self._ABSENT] * len(self.FIELDS)
+        # fields out of FIELDS - they are not expected, so dict is created only when needed
+        self._extra = None
+
+        if properties is not None:
+            for name, value in properties.items():
+                self[name] = value
+
+    def __getitem__(self, name):
+        index = self._FIELD_INDEX.get(name)
+        if index is None:
+            if self._extra is None:
+                raise KeyError(name)
+            return self._extra[name]
+
+        value = self._values[index]
+        if value is self._ABSENT:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name, value):
+        if value == NOT_PROVIDED:
+            value = NOT_PROVIDED
+
+        index = self._FIELD_INDEX.get(name)
+        if index is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[name] = value
+        else:
+            self._values[index] = value
+
+    def __delitem__(self, name):
+        index = self._FIELD_INDEX.get(name)
+        if index is None:
+            if self._extra is None:
+                raise KeyError(name)
+            del self._extra[name]
+        elif self._values[index] is self._ABSENT:
+            raise KeyError(name)
+        else:
+            self._values[index] = self._ABSENT
+
+    def __iter__(self):
+        for name, value in zip(self.FIELDS, self._values):
+            if value is not self._ABSENT:
+                yield name
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        length = len(self._values) - self._values.count(self._ABSENT)
+        if self._extra is not None:
+            length += len(self._extra)
+        return length
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self)})"
+
+
 class RevealerDeviceRow:
     """
     Class of Device row information.
     """
 
+    __slots__ = ("name", "type", "other_data", "link", "ip_address", "uuid", "tag", "legacy", "mipas", "row",
+                 "version")
+
     def __init__(self, device_name, device_type, device_info, device_link, device_ip_address, device_uuid, device_tag,
                  device_legacy=False, device_mipas=False):
         self.name = device_name
@@ -32,6 +129,7 @@ class RevealerDeviceRow:
         self.mipas = device_mipas
 
         self.row = 0
+        self.version = next(_row_versions)
 
     def set_row(self, row):
         self.row = row
@@ -53,6 +151,7 @@ class RevealerDeviceRow:
         self.mipas = device_mipas
 
         self.row = 0
+        self.version = next(_row_versions)
 
     def deepcopy(self):
         return RevealerDeviceRow(
@@ -67,45 +166,320 @@ class RevealerDeviceRow:
             device_mipas=self.mipas
         )
 
-    def get_dict(self):
-        row_dict = {
-            'name': self.name,
-            'type': self.type,
-            'other_data': self.other_data,
-            'link': self.link,
-            'ip_address': self.ip_address,
-            'uuid': self.uuid,
-            'tag': self.tag,
-            'legacy': self.legacy,
-            'mipas': self.mipas
-        }
-        return row_dict
+
+def _fenwick_locate(tree, index):
+    """
+    Find the block with the device at this position and position of the device inside the block.
+
+    :param tree: list or tuple
+        Fenwick tree over the lengths of the blocks.
+    :param index: int
+        Position of the device in the whole list.
+    :return: tuple
+    """
+
+    block = 0
+    step = 1
+    while step * 2 < len(tree):
+        step *= 2
+
+    while step > 0:
+        if block + step < len(tree) and tree[block + step] <= index:
+            block += step
+            index -= tree[block]
+        step //= 2
+
+    return block, index
+
+
+class SortedDeviceView:
+    """
+    Read-only view of the sorted list of devices at some moment. It shares the blocks of devices with the index, so it
+    is cheap to make and it is not changed by the following insertions into the index.
+    """
+
+    __slots__ = ("_items", "_tree", "_len")
+
+    def __init__(self, items=(), tree=(), length=0):
+        self._items = items
+        self._tree = tree
+        self._len = length
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for items in self._items:
+            yield from items
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+        if index < 0 or index >= self._len:
+            raise IndexError("device index out of range")
+
+        block, index = _fenwick_locate(self._tree, index)
+        return self._items[block][index]
+
+
+class SortedDeviceIndex:
+    """
+    Sorted list of devices with unique keys.
+
+    Keys are kept in blocks of limited size and the sizes of the blocks are summed in the Fenwick tree, so insertion
+    doesn't shift the whole list and both rank of the key and device at the position are found in O(log N).
+
+    Blocks of devices are tuples which are replaced on insertion and never changed, so view() can share them.
+    """
+
+    # the block is split in two when it grows bigger than twice this size
+    BLOCK_SIZE = 256
+
+    def __init__(self):
+        self._keys = []
+        self._items = []
+        # last (maximum) key of every block
+        self._maxes = []
+        # Fenwick tree over the lengths of the blocks
+        self._tree = []
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for items in self._items:
+            yield from items
+
+    def __contains__(self, key):
+        block = bisect_left(self._maxes, key)
+        if block == len(self._maxes):
+            return False
+        keys = self._keys[block]
+        index = bisect_left(keys, key)
+        return keys[index] == key
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+        if index < 0 or index >= self._len:
+            raise IndexError("device index out of range")
+
+        block, index = _fenwick_locate(self._tree, index)
+        return self._items[block][index]
+
+    def clear(self):
+        self.__init__()
+
+    def view(self):
+        """
+        Make read-only view of the current state of the list.
+
+        :return: SortedDeviceView
+        """
+
+        return SortedDeviceView(tuple(self._items), tuple(self._tree), self._len)
+
+    def add(self, key, item):
+        """
+        Add the device to the index.
+
+        :param key: tuple
+            Sort key of the device.
+        :param item: RevealerDeviceRow
+            Device.
+        :return: int or None
+            Position of the device in the sorted list or None if a device with such key is already in the list.
+        """
+
+        if not self._maxes:
+            self._keys.append([key])
+            self._items.append((item,))
+            self._maxes.append(key)
+            self._rebuild_tree()
+            self._len = 1
+            return 0
+
+        block = bisect_left(self._maxes, key)
+        if block == len(self._maxes):
+            # bigger than everything in the list - append to the last block
+            block -= 1
+
+        keys = self._keys[block]
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            return None
+
+        keys.insert(index, key)
+        items = self._items[block]
+        self._items[block] = items[:index] + (item,) + items[index:]
+        self._maxes[block] = keys[-1]
+        self._len += 1
+
+        rank = self._prefix(block) + index
+
+        if len(keys) > 2 * self.BLOCK_SIZE:
+            self._split(block)
+        else:
+            self._tree_add(block, 1)
+
+        return rank
+
+    def rank(self, key):
+        """
+        Position of the key in the sorted list or None if there is no such key.
+
+        :param key: tuple
+        :return: int or None
+        """
+
+        block = bisect_left(self._maxes, key)
+        if block == len(self._maxes):
+            return None
+
+        keys = self._keys[block]
+        index = bisect_left(keys, key)
+        if keys[index] != key:
+            return None
+
+        return self._prefix(block) + index
+
+    def _split(self, block):
+        keys = self._keys[block]
+        items = self._items[block]
+        half = len(keys) // 2
+
+        self._keys[block:block + 1] = [keys[:half], keys[half:]]
+        self._items[block:block + 1] = [items[:half], items[half:]]
+        self._maxes[block:block + 1] = [keys[half - 1], keys[-1]]
+
+        # new block shifts positions of all next blocks in the tree
+        self._rebuild_tree()
+
+    def _rebuild_tree(self):
+        tree = [0] + [len(keys) for keys in self._keys]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, block, value):
+        i = block + 1
+        while i < len(self._tree):
+            self._tree[i] += value
+            i += i & -i
+
+    def _prefix(self, block):
+        """
+        Number of devices in the blocks before this one.
+        """
+
+        result = 0
+        i = block
+        while i > 0:
+            result += self._tree[i]
+            i -= i & -i
+        return result
+
+
+class RevealerDeviceSnapshot:
+    """
+    Class of the published state of the device list. It is never changed, so GUI thread reads it without locking.
+    """
+
+    __slots__ = ("version", "ssdp_devices", "old_devices")
+
+    def __init__(self, version, ssdp_devices, old_devices):
+        self.version = version
+        self.ssdp_devices = ssdp_devices
+        self.old_devices = old_devices
 
 
 class RevealerDeviceList:
     """
     Class for storaging Revealer Device list with remembering rows and so on.
 
+    Devices are added from the worker threads under the lock of the list. Changes made in batch() are published at
+    once as new snapshot with the next version, and GUI reads only the latest snapshot.
     """
 
     def __init__(self):
 
-        self.ssdp_devices = []
-        self.old_devices = []
+        self.ssdp_devices = SortedDeviceIndex()
+        self.old_devices = SortedDeviceIndex()
 
-        self.ssdp_dict = {}
-        self.legacy_dict = {}
         self.ip_dict_whole = {}
 
-    def clear_all(self):
-        self.ssdp_devices = []
-        self.old_devices = []
+        # generation of the search the list is filled by, devices found by the older searches are dropped
+        self.generation = None
 
-        self.ssdp_dict = {}
-        self.legacy_dict = {}
-        self.ip_dict_whole = {}
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._changed = False
+
+        self.snapshot = RevealerDeviceSnapshot(0, SortedDeviceView(), SortedDeviceView())
+
+    @contextmanager
+    def batch(self):
+        """
+        Make several changes of the list and publish them together.
+        """
+
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._changed:
+                    self._publish()
+
+    def _publish(self):
+        self._changed = False
+        # assignment of the attribute is atomic, so readers get either old or new snapshot
+        self.snapshot = RevealerDeviceSnapshot(self.snapshot.version + 1, self.ssdp_devices.view(),
+                                               self.old_devices.view())
+
+    def clear_all(self, generation=None):
+        """
+        Remove all devices.
+
+        :param generation: int
+            Generation of the search which is going to fill the list, None to accept devices of any search.
+        :return:
+        """
+
+        with self.batch():
+            self.ssdp_devices = SortedDeviceIndex()
+            self.old_devices = SortedDeviceIndex()
+
+            self.ip_dict_whole = {}
+            self.generation = generation
+
+            self._changed = True
+
+    def is_stale(self, generation) -> bool:
+        return generation is not None and self.generation is not None and generation != self.generation
+
+    def add_device(self, name, device_type, link, ip_address, other_data, uuid, tag, legacy, mipas_support=False,
+                   generation=None):
+
+        # late devices of the previous search are dropped before any work is done for them
+        if self.is_stale(generation):
+            return
+
+        self.insert_device(self.make_device(name, device_type, link, ip_address, other_data, uuid, tag, legacy,
+                                            mipas_support), generation)
+
+    @staticmethod
+    def make_device(name, device_type, link, ip_address, other_data, uuid, tag, legacy, mipas_support=False):
+        """
+        Make the row of the device for insert_device(). Nothing is locked, so rows of several devices can be made
+        first and then inserted together in one batch().
 
-    def add_device(self, name, device_type, link, ip_address, other_data, uuid, tag, legacy, mipas_support=False):
+        :return: RevealerDeviceRow
+        """
 
         device_row = RevealerDeviceRow(
             device_name=name,
@@ -119,18 +493,39 @@ class RevealerDeviceList:
             device_mipas=mipas_support
         )
 
-        if not legacy:
-            row = self.add_device_to_ssdp_dict(device_row)
-            if row is not None:
-                device_row.set_row(row=row)
-                log.debug(f"Add ssdp device {device_row.name} to row {row}")
-                self.ssdp_devices.insert(row - 1, device_row)
+        # keep compact properties of the device - it is made before the lock to hold it shorter
+        if other_data is not None and not isinstance(other_data, DeviceProperties):
+            device_row.other_data = DeviceProperties(other_data)
+
+        return device_row
+
+    def insert_device(self, device_row: RevealerDeviceRow, generation=None):
+        """
+        Put the device made by make_device() to the sorted list if it is not there yet.
+
+        :param generation: int
+            Generation of the search which has found the device, None if it is not known.
+        :return:
+        """
+
+        with self.batch():
+            # the list could be cleared for the new search while the row was being made
+            if self.is_stale(generation):
+                return
+
+            if not device_row.legacy:
+                row = self.add_device_to_ssdp_dict(device_row)
+                if row is not None:
+                    device_row.set_row(row=row)
+                    log.debug(f"Add ssdp device {device_row.name} to row {row}")
+
+            else:
+                row = self.add_device_to_legacy_dict(device_row)
+                if row is not None:
+                    device_row.set_row(row=row)
 
-        else:
-            row = self.add_device_to_legacy_dict(device_row)
             if row is not None:
-                device_row.set_row(row=row)
-                self.old_devices.insert(row - 1, device_row)
+                self._changed = True
 
     def print_old_devices(self):
         index = 0
@@ -139,74 +534,72 @@ class RevealerDeviceList:
             index += 1
         print()
 
-    def add_device_to_ssdp_dict(self, device_row: RevealerDeviceRow):
+    @staticmethod
+    def ssdp_sort_key(device_row: RevealerDeviceRow):
         """
-        Method which sort dictionary with ssdp found device for putting our devices higher in the list and sort in
-        alphabetical order in our and other?
+        Our devices are higher in the list and both our and other devices are sorted in alphabetical order of name
+        and link.
 
-        :return: None
+        :return: tuple
         """
 
-        our_dict = {}
-        other_dict = {}
+        device = device_row.name + device_row.link
+        return device_row.type, device.casefold(), device
 
-        device_info = device_row.get_dict()
+    def add_device_to_ssdp_dict(self, device_row: RevealerDeviceRow):
+        """
+        Method which puts ssdp found device to the sorted list: our devices are higher in the list and both our and
+        other devices are sorted in alphabetical order.
 
-        device = device_info['name'] + device_info['link']
-        device_type = device_info['type']
+        :return: int or None
+            Row of the device in the table or None if this device is already in the list.
+        """
 
-        uuid = device_info['uuid']
+        uuid = device_row.uuid
         if uuid is None:
             try:
-                uuid = device_info['other_data']['UDN'][5:]
+                uuid = device_row.other_data['UDN'][5:]
             except Exception:
                 uuid = ''
 
         # check presence in the dict
         try:
-            presence_whole = self.ip_dict_whole[device_info['ip_address']+uuid]
+            presence_whole = self.ip_dict_whole[device_row.ip_address + uuid]
             log.debug(presence_whole)
             return None
         except KeyError:
-            self.ip_dict_whole[device_info['ip_address']+uuid] = device_info['name']
+            self.ip_dict_whole[device_row.ip_address + uuid] = device_row.name
 
-        try:
-            presence = self.ssdp_dict[device_info['name'] + device_info['link']]
-            log.debug(presence)
+        rank = self.ssdp_devices.add(self.ssdp_sort_key(device_row), device_row)
+        if rank is None:
+            log.debug(f"{device_row.name + device_row.link} is already in the list")
             return None
-        except KeyError:
-            # find end of the our list to sort only them
-            for ex_device in self.ssdp_dict:
-                if self.ssdp_dict[ex_device]['type'] == RevealerDeviceType.OUR:
-                    our_dict[ex_device] = self.ssdp_dict[ex_device]
-                else:
-                    other_dict[ex_device] = self.ssdp_dict[ex_device]
-
-            if device_type == RevealerDeviceType.OUR:
-                our_dict[device] = {'type': device_type}
-                sorted_list = sorted(our_dict, key=lambda v: v.upper())
-                alpha_row = sorted_list.index(device) + 1
 
-            else:
-                other_dict[device] = {'type': device_type}
-                sorted_list = sorted(other_dict, key=lambda v: v.upper())
-                alpha_row = sorted_list.index(device) + 1 + len(our_dict)
-
-            self.ssdp_dict[device] = {'type': device_type}
+        return rank + 1
 
-            return alpha_row
+    @staticmethod
+    def legacy_sort_key(device_row: RevealerDeviceRow):
+        """
+        Legacy devices are sorted by their IP addresses as numbers, addresses which can't be parsed are at the end.
 
-    def add_device_to_legacy_dict(self, device_row):
+        :return: tuple
         """
-        Method which sort dictionary with found legacy device.
 
-        :return: None
+        try:
+            return 0, socket.inet_aton(device_row.ip_address), device_row.link
+        except (OSError, TypeError):
+            return 1, str(device_row.ip_address).encode(), device_row.link
+
+    def add_device_to_legacy_dict(self, device_row: RevealerDeviceRow):
         """
+        Method which puts found legacy device to the list sorted by IP addresses.
 
-        device_info = device_row.get_dict()
+        :return: int or None
+            Row of the device in the legacy table or None if this device is already in the list.
+        """
 
-        name = device_info['name']
-        link = device_info['link']
+        name = device_row.name
+        link = device_row.link
 
         try:
             presence_whole = self.ip_dict_whole[link]
@@ -215,10 +608,133 @@ class RevealerDeviceList:
         except KeyError:
             self.ip_dict_whole[link] = name
 
-            self.legacy_dict[name] = len(self.old_devices) + len(self.ssdp_devices) + 4
+        rank = self.old_devices.add(self.legacy_sort_key(device_row), device_row)
+        if rank is None:
+            log.debug(f"{link} is already in the legacy list")
+            return None
+
+        return rank + 1
+
+
+class DeviceIdentity:
+    """
+    Class of the device answered to the search with all UUIDs, addresses, interfaces and LOCATIONs it was seen with.
+    """
+
+    __slots__ = ("uuids", "addresses", "interfaces", "locations")
+
+    def __init__(self):
+        self.uuids = set()
+        self.addresses = set()
+        self.interfaces = set()
+        self.locations = set()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(uuids={self.uuids}, addresses={self.addresses}, " \
+               f"interfaces={self.interfaces}, locations={self.locations})"
+
+
+class DeviceIdentityIndex:
+    """
+    Class of the devices answered during the search. Devices are found by USN UUID first and by LOCATION if UUID is
+    not provided or is not known yet, and by IP address only if there is neither of them. Every answer of the same
+    device adds its address, interface and LOCATION to one DeviceIdentity, so a device reachable through several
+    interfaces or answering with different LOCATION forms is shown and downloaded only once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        self._by_uuid = {}
+        self._by_location = {}
+        self._by_address = {}
+
+        self._count = 0
+        # number of answers of the devices which have answered before
+        self.duplicates = 0
 
-            sorted_list = sorted(self.legacy_dict)
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        with self._lock:
+            self._by_uuid = {}
+            self._by_location = {}
+            self._by_address = {}
+            self._count = 0
+            self.duplicates = 0
+
+    def find(self, uuid=None, location=None, address=None):
+        """
+        Find the device by its UUID, LOCATION or IP address (only if neither UUID nor LOCATION is known).
+
+        :return: DeviceIdentity or None
+        """
 
-            alpha_row = sorted_list.index(name) + 1  # + len(self.ssdp_devices) + 3
+        identity = None
+        if uuid:
+            identity = self._by_uuid.get(uuid)
+        if identity is None and location:
+            identity = self._by_location.get(location)
+        if identity is None and not uuid and not location and address:
+            identity = self._by_address.get(address)
+        return identity
+
+    def observe(self, uuid, address, location, interface=None):
+        """
+        Remember the answer of the device.
+
+        :param uuid: str or None
+            UUID from the USN header.
+        :param address: str
+            IP address the answer came from.
+        :param location: str or None
+            LOCATION header.
+        :param interface: str or None
+            IP address of the interface the answer was received on.
+        :return: tuple
+            DeviceIdentity and flag which is True if this device has answered before.
+        """
+
+        with self._lock:
+            identity = self.find(uuid, location, address)
+
+            known = identity is not None
+            if known:
+                self.duplicates += 1
+            else:
+                identity = DeviceIdentity()
+                self._count += 1
+
+            if uuid:
+                identity.uuids.add(uuid)
+                self._by_uuid[uuid] = identity
+            if location:
+                identity.locations.add(location)
+                self._by_location[location] = identity
+            if address:
+                identity.addresses.add(address)
+                self._by_address.setdefault(address, identity)
+            if interface:
+                identity.interfaces.add(interface)
+
+            return identity, known
+
+    def forget(self, identity):
+        """
+        Remove the device so its next answer is handled as new one (if its answer was not handled at all for example).
+
+        :param identity: DeviceIdentity
+        :return:
+        """
 
-            return alpha_row
+        with self._lock:
+            removed = False
+            for index, keys in ((self._by_uuid, identity.uuids), (self._by_location, identity.locations),
+                                (self._by_address, identity.addresses)):
+                for key in keys:
+                    if index.get(key) is identity:
+                        del index[key]
+                        removed = True
+            if removed:
+                self._count -= 1
@@ -1,16 +1,14 @@
 import os
-from tkinter import ttk, Canvas, HORIZONTAL, VERTICAL, Frame, TclError, Label, font, Button, PhotoImage
-import threading
-from idlelib.tooltip import Hovertip
-
 import time
+from collections import deque
+from tkinter import ttk, Canvas, HORIZONTAL, VERTICAL, Frame, TclError, Label, font, Button
+from idlelib.tooltip import Hovertip
 
-import logging as log
-from revealerdevice import RevealerDeviceTag, RevealerDeviceType, RevealerDeviceList, RevealerDeviceRow
+from guiresources import get_resources
+from revealerdevice import RevealerDeviceTag, RevealerDeviceType, RevealerDeviceList, RevealerDeviceRow, \
+    RevealerDeviceSnapshot, SortedDeviceView
 
 DEFAULT_TEXT_COLOR = "black"
-CURSOR_POINTER = "hand2"
-CURSOR_POINTER_MACOS = "pointinghand"
 DEFAULT_BG_COLOR = "white"
 
 
@@ -60,9 +58,19 @@ class AutoScrollbar(ttk.Scrollbar):
 
 
 class VerticalScrolledFrame(Frame):
+    """
+    Frame with vertical scrollbar. Its interior frame is scrolled with the canvas, or, if virtual height is set, the
+    canvas scrolls over the virtual height and the owner moves the interior and fills it in on_view_change() calls.
+    """
+
     def __init__(self, parent, column, row, *args, **kw):
         Frame.__init__(self, parent, *args, **kw)
 
+        # height of the scrolled content if it is not the interior frame itself
+        self.virtual_height = None
+        # callback called after the view is scrolled or resized
+        self.on_view_change = None
+
         self.grid(column=column, row=row, sticky='news')
 
         self.grid_rowconfigure(0, weight=1)
@@ -77,7 +85,7 @@ class VerticalScrolledFrame(Frame):
                              width=200, height=300,
                              yscrollcommand=self.vscrollbar.set, background=DEFAULT_BG_COLOR)
         self.canvas.grid(column=0, row=0, sticky='news')
-        self.vscrollbar.config(command=self.canvas.yview)
+        self.vscrollbar.config(command=self._yview)
 
         self.canvas.grid_rowconfigure(0, weight=1)
         self.canvas.grid_columnconfigure(0, weight=1)
@@ -104,6 +112,14 @@ class VerticalScrolledFrame(Frame):
         self.canvas.bind_all("<Button-4>", self._on_mousewheel)
         self.canvas.bind_all("<Button-5>", self._on_mousewheel)
 
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self._view_changed()
+
+    def _view_changed(self):
+        if self.on_view_change is not None:
+            self.on_view_change()
+
     def _on_mousewheel(self, event):
         # only if scrollbar is active
         if self.vscrollbar.active:
@@ -120,11 +136,30 @@ class VerticalScrolledFrame(Frame):
                     self.canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
                 else:
                     self.canvas.yview_scroll(int(event.delta), "units")
+            self._view_changed()
+
+    def set_virtual_height(self, height):
+        """
+        Set height of the scrolled content.
+
+        :param height: int
+            Height in pixels or None to scroll the interior frame itself.
+        :return:
+        """
+
+        self.virtual_height = height
+        self._update_scrollregion()
+
+    def _update_scrollregion(self):
+        if self.virtual_height is not None:
+            height = self.virtual_height
+        else:
+            height = self.interior.winfo_reqheight()
+        self.canvas.config(scrollregion=(0, 0, self.interior.winfo_reqwidth(), height))
 
     def _configure_interior(self, event):
         # Update the scrollbars to match the size of the inner frame.
-        size = (self.interior.winfo_reqwidth(), self.interior.winfo_reqheight())
-        self.canvas.config(scrollregion=(0, 0, size[0], size[1]))
+        self._update_scrollregion()
         if self.interior.winfo_reqwidth() != self.canvas.winfo_width():
             # Update the canvas's width to fit the inner frame.
             self.canvas.config(width=self.interior.winfo_reqwidth())
@@ -133,6 +168,85 @@ class VerticalScrolledFrame(Frame):
         if self.interior.winfo_width() != self.canvas.winfo_width():
             # Update the inner frame's width to fill the canvas.
             self.canvas.itemconfigure(self.interior_id, width=self.canvas.winfo_width())
+        self._view_changed()
+
+
+class RevealerTableRow:
+    """
+    Widgets of one row of the table. Rows are never destroyed: they are bound to other devices when the table is
+    scrolled or changed.
+    """
+
+    def __init__(self, master, grid_row, os_main_root, left_click_func=None, right_click_func=None):
+        self.grid_row = grid_row
+
+        self.device = Label(master, text="", anchor="w", background=DEFAULT_BG_COLOR, fg=DEFAULT_TEXT_COLOR)
+        self.device.grid(row=grid_row, column=0, sticky="ew")
+
+        self.middle_1 = Frame(master, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
+        self.middle_1.grid(row=grid_row, column=1, sticky="news")
+
+        self.link = Label(master, text="", anchor="w", background=DEFAULT_BG_COLOR, fg=DEFAULT_TEXT_COLOR)
+        self.link.grid(row=grid_row, column=2, sticky="ew")
+
+        self.middle_3 = Frame(master, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
+        self.middle_3.grid(row=grid_row, column=3, sticky="news")
+
+        # settings button is created for every row so all rows have the same height
+        self.buttons = ButtonSettings(master, col=4, row=grid_row, command_change=None, command_view=None,
+                                      os_main_root=os_main_root, width=1, type=RevealerDeviceType.OUR)
+
+        for label in (self.device, self.link):
+            label.tag = None
+            label.link = None
+            label.uuid = None
+            label.other_data = None
+
+        # options applied to the widgets, so only the changed ones are configured again
+        self._applied = {}
+        # what the row shows now: kind of the row, version of the device row and color, None if nothing
+        self.bound_key = None
+
+        # bind left-click to 'open_link' and right-click to 'change_ip'
+        self.link.bind("<Button-1>", left_click_func)
+        self.link.bind("<Button-3>", right_click_func)
+        self.device.bind("<Button-3>", right_click_func)
+
+        self.hidden = False
+
+    def widgets(self):
+        return self.device, self.middle_1, self.link, self.middle_3, self.buttons.frame
+
+    def configure(self, widget, **options):
+        """
+        Configure only the options of the widget which differ from the applied ones.
+        """
+
+        applied = self._applied.setdefault(widget, {})
+        changed = {name: value for name, value in options.items() if applied.get(name) != value}
+        if changed:
+            widget.configure(**changed)
+            applied.update(changed)
+
+    def set_background(self, bg_color, separator_color=None):
+        for widget in (self.device, self.link, self.buttons.frame):
+            self.configure(widget, background=bg_color)
+        for widget in (self.middle_1, self.middle_3):
+            self.configure(widget, background=separator_color if separator_color is not None else bg_color)
+        self.buttons.change_button_color(bg_color)
+
+    def hide(self):
+        self.bound_key = None
+        if not self.hidden:
+            for widget in self.widgets():
+                widget.grid_remove()
+            self.hidden = True
+
+    def show(self):
+        if self.hidden:
+            for widget in self.widgets():
+                widget.grid()
+            self.hidden = False
 
 
 class RevealerTable:
@@ -145,21 +259,29 @@ class RevealerTable:
      |                                            |
      |____________________________________________|
 
+    The table is virtual: widgets exist only for the rows fitting the viewport. This fixed pool of rows is bound to
+    the visible part of the device list snapshot every time the table is scrolled, resized or the list is changed, so
+    memory and drawing time don't depend on the number of devices.
+
+    Rows are bound from the top of the viewport in chunks limited by RENDER_BUDGET_MS, the rest of them are bound in
+    the next turns of the main loop, so the main loop handles user input between the chunks.
     """
 
     EVEN_ROW_COLOR = "#eAeFeF"
     # EVEN_ROW_COLOR = "yellow"
     HEADER_COLOR = "#ced0d0"
+    SEPARATOR_COLOR = "#a0a0a0"
 
     HEADER_TAG = "header"
     ADDITIONAL_HEADER_TAG = "header_add"
 
     BLANK_LINE_TAG = "blank"
 
-    # this value minus 3 defines max ssdp devices counts to be listed without moving the legacy table
-    LEGACY_HEADER_ROW = 1000
+    # two blank lines and the header between SSDP and legacy devices
+    LEGACY_HEADER_ROWS = 3
 
-    lock = threading.Lock()
+    # maximum time of binding rows in one turn of the main loop
+    RENDER_BUDGET_MS = 8
 
     def __init__(self, master, col, row, height, left_click_url_func=None, right_click_func=None, settings_func=None,
                  properties_view_func=None, os_main_root=None, font_name='TkTextFont'):
@@ -172,19 +294,17 @@ class RevealerTable:
         self.properties_view_func = properties_view_func
 
         self.main_font = font.nametofont(font_name)
-        self.main_font.actual()
+        # images, cursor and fonts shared by all rows
+        self.resources = get_resources(self.main_table)
+        self._fonts = {weight: self.resources.font(self.main_font.name, weight) for weight in ('', 'bold', 'underline')}
 
         self.col = col
         self.row = row
 
-        # last added row
-        self.last_row = 1
-
-        # exist at least one legacy device
-        self.legacy_last_row = 0
-        self.legacy_header_row = 0
-
         self.device_list = RevealerDeviceList()
+        # version of the device list snapshot shown in the table and the snapshot itself
+        self.shown_version = None
+        self._snapshot = self.device_list.snapshot
 
         # save path root to the main.py if it is provided - if no: just save path to this file
         if os_main_root is not None:
@@ -192,16 +312,30 @@ class RevealerTable:
         else:
             self.os_main_root = os.path.dirname(__file__)
 
-        # try to use mac os specific cursor - if exception is raised we are not on mac os and should use default
-        self.pointer_cursor = CURSOR_POINTER_MACOS
-        try:
-            test_label = Label(self.main_table, text='', cursor=self.pointer_cursor)
-            test_label.destroy()
-        except TclError:
-            self.pointer_cursor = CURSOR_POINTER
-
-        self.ssdp_rows = []
-        self.legacy_rows = []
+        self.pointer_cursor = self.resources.pointer_cursor
+
+        # settings buttons are disabled while the table is updated by the search and enabled after it
+        self._buttons_enabled = True
+        # position of the interior frame in the canvas
+        self._interior_top = 0
+        # positions of the rows in the viewport waiting to be bound, index of the first visible row they are bound from
+        # and id of the scheduled binding of them
+        self._render_queue = deque()
+        self._render_first = 0
+        self._render_after_id = None
+
+        # pool of the row widgets and the height of one row measured on the first of them
+        self._pool = []
+        self._add_pool_row()
+        self.main_table.update_idletasks()
+        self.row_height = max(widget.winfo_reqheight() for widget in self._pool[0].widgets())
+        self.main_table.grid_rowconfigure(0, minsize=self.row_height)
+        self.main_table.grid_rowconfigure(1, minsize=self.row_height)
+        self._pool[0].hide()
+
+        self.great_table.canvas.configure(yscrollincrement=self.row_height)
+        self.great_table.set_virtual_height(self.row_height)
+        self.great_table.on_view_change = self._bind_visible_rows
 
     def create_table(self, master, col, row, height):
 
@@ -210,8 +344,6 @@ class RevealerTable:
                                                  background=DEFAULT_BG_COLOR,
                                                  height=height, width=500)
 
-        self.legacy_header_row = self.LEGACY_HEADER_ROW
-
         # get object of the real frame to fill in with found devices
         new_table = self.great_table.interior
 
@@ -249,156 +381,243 @@ class RevealerTable:
 
         return new_table
 
-    def disable_all_buttons(self):
-        """
-        Method for disabling all buttons in the table while settings changing or searching.
+    def _add_pool_row(self):
+        grid_row = len(self._pool) + 1
+        self._pool.append(RevealerTableRow(self.main_table, grid_row, self.os_main_root,
+                                           left_click_func=self.left_click_func,
+                                           right_click_func=self.right_click_func))
+        if len(self._pool) > 1:
+            self.main_table.grid_rowconfigure(grid_row, minsize=self.row_height)
 
-        :return:
+    def _rows_needed(self) -> int:
+        """
+        :return: number of rows filling the viewport under the header. Rows missing in the pool are made while they
+        are bound, extra rows are kept hidden when the viewport is made smaller.
         """
 
-        for i in self.main_table.winfo_children():
-            if hasattr(i, 'button_flag'):
-                # disable all buttons
-                if i.button_flag:
-                    i.button.disable()
+        return max(1, self.great_table.canvas.winfo_height() // self.row_height)
 
-    def enable_all_buttons(self):
+    def row_count(self, snapshot=None) -> int:
         """
-        Method for disabling all buttons in the table while settings changing or searching.
-
-        :return:
+        :return: number of rows of the table (without its header) for the snapshot of the device list.
         """
 
-        for i in self.main_table.winfo_children():
-            if hasattr(i, 'button_flag'):
-                # destroy all children which is not header
-                if i.button_flag:
-                    i.button.enable()
+        if snapshot is None:
+            snapshot = self._snapshot
+
+        if len(snapshot.old_devices) == 0:
+            return len(snapshot.ssdp_devices)
+        return len(snapshot.ssdp_devices) + self.LEGACY_HEADER_ROWS + len(snapshot.old_devices)
 
-    def update(self):
+    def _bind_visible_rows(self):
         """
-        Update table according to current state of the list
+        Bind the rows of the pool to the part of the table visible in the viewport. The interior frame with the header
+        and the pool is always placed at the top of the viewport. Rows still showing the same version of the same
+        device are not touched.
 
         :return:
         """
 
-        # delete all rows
-        # self.delete_all_rows()
+        canvas = self.great_table.canvas
+        needed = self._rows_needed()
 
-        _start_time = time.time()
+        top = max(0.0, canvas.canvasy(0))
+        # first row fully visible under the header
+        first = int(-(-top // self.row_height))
+        if top != self._interior_top:
+            canvas.coords(self.great_table.interior_id, 0, top)
+            self._interior_top = top
 
-        old_widget_number = len(self.main_table.winfo_children())
-
-        for i in self.main_table.winfo_children():
-            if hasattr(i, 'tag'):
-                # destroy all children which is not header
-                if not i.tag == self.HEADER_TAG:
-                    i.destroy_tag = '1'
-            else:
-                # and if does not have any tag at all
-                i.destroy_tag = '1'
+        # rows under the viewport are hidden at once, the visible ones are bound from the top by the budget
+        for row in self._pool[needed:]:
+            row.hide()
 
-        # append ssdp devices
-        for i in range(len(self.device_list.ssdp_devices)):
-            self.add_ssdp_row(row=i + 1, device_row=self.device_list.ssdp_devices[i])
+        if self._render_after_id is not None:
+            self.main_table.after_cancel(self._render_after_id)
+            self._render_after_id = None
+        self._render_first = first
+        self._render_queue = deque(range(needed))
+        self._render_pending()
 
-        if len(self.device_list.old_devices) > 0:
-            self.add_legacy_headers(row=len(self.device_list.ssdp_devices) + 1)
-            start_legacy_row = 4 + len(self.device_list.ssdp_devices)
-            for i in range(len(self.device_list.old_devices)):
-                self.add_legacy_row(row=i + start_legacy_row, device_row=self.device_list.old_devices[i])
+    def _render_pending(self):
+        """
+        Bind the rows waiting for it till the time budget of this turn of the main loop is spent and schedule binding
+        of the rest.
 
-        log.debug(f"old_widget_number = {old_widget_number}")
-        log.debug(f"len(self.main_table.winfo_children()) = {len(self.main_table.winfo_children())}")
+        :return:
+        """
 
-        _time = time.time()
+        self._render_after_id = None
+        deadline = time.perf_counter() + self.RENDER_BUDGET_MS / 1000
+        queue = self._render_queue
 
-        # self.delete_to_widget(old_widget_number)
+        while queue:
+            position = queue.popleft()
+            if position == len(self._pool):
+                self._add_pool_row()
+            self._bind_row(self._pool[position], self._render_first + position)
+            if time.perf_counter() >= deadline:
+                break
 
-        log.debug(f"len(self.main_table.winfo_children()) = {len(self.main_table.winfo_children())}."
-                  f" Time = {time.time() - _start_time} secs. Other time = {time.time() - _time}")
+        if queue:
+            # idle callbacks added now are called in the next turn after the pending events are handled
+            self._render_after_id = self.main_table.after_idle(self._render_pending)
 
-    def update_with_rewriting(self):
+    def render_pending(self) -> bool:
         """
-        Update main table with rewriting data in the labels and not rebuilding the whole table
-        :return:
+        :return: True if some visible rows are not bound yet.
         """
 
-        ssdp_shown = len(self.ssdp_rows)
-        legacy_shown = len(self.legacy_rows)
-
-        len_ssdp = len(self.device_list.ssdp_devices)
-        len_legacy = len(self.device_list.old_devices)
-        min_len = min(len_ssdp, len_legacy)
-
-        # if no legacy devices were shown and now we have some - draw legacy headers
-        # TODO: what if we have a lot of devices - we need to move all rows down
-        if legacy_shown == 0 and len(self.device_list.old_devices) > 0:
-            self.add_legacy_headers(row=self.LEGACY_HEADER_ROW)
+        return len(self._render_queue) > 0
+
+    def _bind_row(self, row, index):
+        snapshot = self._snapshot
+        len_ssdp = len(snapshot.ssdp_devices)
+
+        if index < len_ssdp:
+            device_row = snapshot.ssdp_devices[index]
+            key = ("ssdp", device_row.version, index % 2)
+            if row.bound_key != key:
+                row.show()
+                row.buttons.show()
+                self.ssdp_row_reinit(row, device_row)
+                self._set_row_color(row, index + 1)
+                row.bound_key = key
+            self._apply_button_state(row)
+        elif index >= self.row_count(snapshot):
+            row.hide()
+        elif index < len_ssdp + self.LEGACY_HEADER_ROWS - 1:
+            if row.bound_key != ("blank",):
+                row.show()
+                self._blank_row_reinit(row)
+                row.bound_key = ("blank",)
+        elif index == len_ssdp + self.LEGACY_HEADER_ROWS - 1:
+            if row.bound_key != ("header",):
+                row.show()
+                self._legacy_header_reinit(row)
+                row.bound_key = ("header",)
+        else:
+            legacy_index = index - len_ssdp - self.LEGACY_HEADER_ROWS
+            device_row = snapshot.old_devices[legacy_index]
+            key = ("legacy", device_row.version, legacy_index % 2)
+            if row.bound_key != key:
+                row.show()
+                self.legacy_row_reinit(row, device_row)
+                # legacy rows are colored from the second one
+                self._set_row_color(row, legacy_index + 1)
+                row.bound_key = key
+
+    def _set_row_color(self, row, alpha_row):
+        if alpha_row % 2 == 0:
+            row.set_background(self.EVEN_ROW_COLOR)
+        else:
+            row.set_background(DEFAULT_BG_COLOR)
 
-        # do for every row from each list
-        for i in range(min_len):
-            # update this row in the ssdp list
-            if i + 1 > ssdp_shown:
-                self.add_ssdp_row(row=i + 1, device_row=self.device_list.ssdp_devices[i])
+    def _apply_button_state(self, row):
+        if self._buttons_enabled and row.buttons.frame.button_flag:
+            row.buttons.enable()
+        else:
+            row.buttons.disable()
+
+    def _clear_labels(self, row, tag, text_device="", text_link="", anchor="w"):
+        for label, text in ((row.device, text_device), (row.link, text_link)):
+            row.configure(label, text=text, anchor=anchor, fg=DEFAULT_TEXT_COLOR, cursor="", font=self._fonts[''])
+            label.tag = tag
+            label.link = None
+            label.uuid = None
+            label.other_data = None
+
+        row.buttons.hide()
+
+    def _blank_row_reinit(self, row):
+        self._clear_labels(row, self.BLANK_LINE_TAG)
+        row.set_background(DEFAULT_BG_COLOR)
+
+    def _legacy_header_reinit(self, row):
+        self._clear_labels(row, self.ADDITIONAL_HEADER_TAG, text_device="Legacy Protocol Devices", text_link="URL",
+                           anchor="center")
+        row.set_background(self.HEADER_COLOR, separator_color=self.SEPARATOR_COLOR)
+
+    def legacy_row_reinit(self, row, device_row: RevealerDeviceRow):
+        row.buttons.hide()
+
+        if device_row.tag != "not_local":
+            row.configure(row.device, text=device_row.name, anchor="w", fg=DEFAULT_TEXT_COLOR, cursor="",
+                          font=self._fonts['bold'])
+            row.configure(row.link, text=device_row.link, anchor="w", fg="blue", cursor=self.pointer_cursor,
+                          font=self._fonts['underline'])
+        else:
+            row.configure(row.device, text=device_row.name, anchor="w", fg=DEFAULT_TEXT_COLOR, cursor="",
+                          font=self._fonts[''])
+            row.configure(row.link, text=device_row.link, anchor="w", fg=DEFAULT_TEXT_COLOR, cursor="",
+                          font=self._fonts[''])
 
-            else:
-                device_info = self.device_list.ssdp_devices[i].get_dict()
-                self.ssdp_row_reinit(device_widget=self.ssdp_rows[i][0], link_widget=self.ssdp_rows[i][1],
-                                     button_widget=self.ssdp_rows[i][2], device_info=device_info)
+        for label in (row.device, row.link):
+            label.tag = device_row.tag
+            label.link = device_row.link
+            label.uuid = None
+            label.other_data = None
 
-            self.ssdp_rows[i][2].disable()
+    def disable_all_buttons(self):
+        """
+        Method for disabling all buttons in the table while settings changing or searching.
 
-            # and in the legacy
-            if i + 1 > legacy_shown:
-                self.add_legacy_row(row=self.LEGACY_HEADER_ROW + i + 1 + 3, device_row=self.device_list.old_devices[i])
+        :return:
+        """
 
-            else:
-                # just update row info
-                self.legacy_rows[i][0].configure(text=self.device_list.old_devices[i].name)
-                self.legacy_rows[i][1].configure(text=self.device_list.old_devices[i].link)
+        self._buttons_enabled = False
+        for row in self._pool:
+            if not row.hidden:
+                self._apply_button_state(row)
 
-            if i % 5 == 9:
-                self.main_table.update()
+    def enable_all_buttons(self):
+        """
+        Method for disabling all buttons in the table while settings changing or searching.
 
-        for i in range(min_len, min_len + max(0, len_legacy-min_len)):
-            if i + 1 > legacy_shown:
-                self.add_legacy_row(row=self.LEGACY_HEADER_ROW + i + 1 + 3, device_row=self.device_list.old_devices[i])
+        :return:
+        """
 
-            else:
-                # just update row info
-                self.legacy_rows[i][0].configure(text=self.device_list.old_devices[i].name)
-                self.legacy_rows[i][1].configure(text=self.device_list.old_devices[i].link)
+        self._buttons_enabled = True
+        for row in self._pool:
+            if not row.hidden:
+                self._apply_button_state(row)
 
-            if i % 10 == 9:
-                self.main_table.update()
+    def update_with_rewriting(self):
+        """
+        Update main table with rewriting data in the visible rows which show other devices than before and not
+        rebuilding the whole table
+        :return:
+        """
 
-        # update ssdp devices if its row was already in the list or add row
-        for i in range(min_len, min_len + max(0, len_ssdp-min_len)):
-            if i + 1 > ssdp_shown:
-                self.add_ssdp_row(row=i + 1, device_row=self.device_list.ssdp_devices[i])
+        # take the latest snapshot once - the list may be changed by the worker threads while the table is updated
+        snapshot = self.device_list.snapshot
+        if snapshot.version == self.shown_version:
+            # nothing to draw
+            return
 
-            else:
-                device_info = self.device_list.ssdp_devices[i].get_dict()
-                self.ssdp_row_reinit(device_widget=self.ssdp_rows[i][0], link_widget=self.ssdp_rows[i][1],
-                                     button_widget=self.ssdp_rows[i][2], device_info=device_info)
+        self._snapshot = snapshot
+        # buttons are disabled while the table is updated by the search
+        self._buttons_enabled = False
 
-            self.ssdp_rows[i][2].disable()
+        # the header row is a part of the scrolled height
+        virtual_height = (self.row_count(snapshot) + 1) * self.row_height
+        if virtual_height != self.great_table.virtual_height:
+            self.great_table.set_virtual_height(virtual_height)
+        self._bind_visible_rows()
 
-            if i % 10 == 9:
-                self.main_table.update()
+        self.shown_version = snapshot.version
 
-    def button_reinit(self, button, device_info):
-        name = device_info['name']
-        uuid = device_info['uuid']
-        link = device_info['link']
-        other_data = device_info['other_data']
-        tag = device_info['tag']
+    def button_reinit(self, button, device_row: RevealerDeviceRow):
+        name = device_row.name
+        uuid = device_row.uuid
+        link = device_row.link
+        other_data = device_row.other_data
+        tag = device_row.tag
 
-        if uuid is None:
+        if uuid is None and not device_row.mipas:
             device_type = RevealerDeviceType.OTHER
             state = "normal"
-        elif device_info['uuid'] != "":
+        elif uuid != "" or device_row.mipas:
             device_type = RevealerDeviceType.OUR
             state = "normal"
         else:
@@ -412,310 +631,66 @@ class RevealerTable:
             tag=tag, device_type=device_type, state=state
         )
 
-    def ssdp_row_reinit(self, device_widget, link_widget, button_widget, device_info):
+    def ssdp_row_reinit(self, row, device_row: RevealerDeviceRow):
 
-        tag = device_info['tag']
-        link = device_info['link']
-        uuid = device_info['uuid']
-        other_data = device_info['other_data']
+        tag = device_row.tag
+        link = device_row.link
+        uuid = device_row.uuid
+        other_data = device_row.other_data
 
         device_font_weight = 'bold'
         if uuid is None:
             device_font_weight = ''
 
         # device label
-        device_widget.configure(text=device_info['name'])
-        device_widget.configure(font=(self.main_font.name, self.main_font.actual()['size'],
-                                      device_font_weight))
-
-        if tag != "not_local":
-
-            # link label
-            if link[0:4] == "http":
-                link_widget.configure(text=link)
-                link_widget.configure(font=(self.main_font.name, self.main_font.actual()['size'],
-                                            'underline'))
-                link_widget.configure(fg="blue")
-                link_widget.configure(cursor=self.pointer_cursor)
-            else:
-                link_widget.configure(text=link)
-                link_widget.configure(font=(self.main_font.name, self.main_font.actual()['size'],
-                                            device_font_weight))
-                link_widget.configure(fg=DEFAULT_TEXT_COLOR)
-                link_widget.configure(cursor="arrow")
+        row.configure(row.device, text=device_row.name, anchor="w", fg=DEFAULT_TEXT_COLOR, cursor="",
+                      font=self._fonts[device_font_weight])
 
+        # link label
+        if tag != "not_local" and link[0:4] == "http":
+            row.configure(row.link, text=link, anchor="w", fg="blue", cursor=self.pointer_cursor,
+                          font=self._fonts['underline'])
         else:
-            link_widget.configure(text=link)
-            link_widget.configure(font=(self.main_font.name, self.main_font.actual()['size'],
-                                        device_font_weight))
-            link_widget.configure(fg=DEFAULT_TEXT_COLOR)
-            link_widget.configure(cursor="arrow")
-
-        device_widget.tag = tag
-        link_widget.tag = tag
-
-        device_widget.link = link
-        link_widget.link = link
-
-        device_widget.uuid = uuid
-        device_widget.other_data = other_data
+            row.configure(row.link, text=link, anchor="w", fg=DEFAULT_TEXT_COLOR, cursor="",
+                          font=self._fonts[device_font_weight])
 
-        link_widget.uuid = uuid
-        link_widget.other_data = other_data
+        for label in (row.device, row.link):
+            label.tag = tag
+            label.link = link
+            label.uuid = uuid
+            label.other_data = other_data
 
         # update buttons
-        self.button_reinit(button_widget, device_info)
-
-    def add_ssdp_row(self, row, device_row: RevealerDeviceRow):
-
-        device_info = device_row.get_dict()
-
-        alpha_row = row
-
-        # find correct color
-        if alpha_row % 2 == 0:
-            bg_color = self.EVEN_ROW_COLOR
-        else:
-            bg_color = DEFAULT_BG_COLOR
-
-        middle_1 = Frame(self.main_table, takefocus=0, background=bg_color, width=2)
-        middle_1.grid(row=alpha_row, column=1, sticky='news')
-        middle_1.tag = device_info['tag']
-
-        middle_3 = Frame(self.main_table, takefocus=0, background=bg_color, width=2)
-        middle_3.grid(row=alpha_row, column=3, sticky='news')
-        middle_3.tag = device_info['tag']
-
-        font_weight = 'bold'
-
-        if device_info['uuid'] is None:
-            font_weight = ''
-
-        if device_info['tag'] != "not_local":
-            device = Label(self.main_table, text=device_info['name'], anchor="w", background=bg_color,
-                           fg=DEFAULT_TEXT_COLOR,
-                           font=(self.main_font.name, self.main_font.actual()['size'], font_weight))
-            if device_info['link'][0:4] == "http":
-                link_l = Label(self.main_table, text=device_info['link'], anchor="w", background=bg_color,
-                               cursor=self.pointer_cursor,
-                               fg="blue",
-                               font=(self.main_font.name, self.main_font.actual()['size'], 'underline'))
-            else:
-                link_l = Label(self.main_table, text=device_info['link'], anchor="w", background=bg_color,
-                               fg=DEFAULT_TEXT_COLOR,
-                               font=(self.main_font.name, self.main_font.actual()['size'], font_weight))
-        else:
-            device = Label(self.main_table, text=device_info['name'], anchor="w", background=bg_color,
-                           fg=DEFAULT_TEXT_COLOR,
-                           font=(self.main_font.name, self.main_font.actual()['size'], font_weight))
-            link_l = Label(self.main_table, text=device_info['link'], anchor="w", background=bg_color,
-                           fg=DEFAULT_TEXT_COLOR,
-                           font=(self.main_font.name, self.main_font.actual()['size'], font_weight))
-
-        link_l.grid(row=alpha_row, column=2, sticky="ew")
-        device.grid(row=alpha_row, column=0, sticky="ew")
-
-        device.tag = device_info['tag']
-        link_l.tag = device_info['tag']
-
-        device.link = device_info['link']
-        link_l.link = device_info['link']
-
-        device.uuid = device_info['uuid']
-        device.other_data = device_info['other_data']
-
-        link_l.uuid = device_info['uuid']
-        link_l.other_data = device_info['other_data']
-
-        # add settings button
-        if device_info['uuid'] is None and not device_info["mipas"]:
-            button_settings = ButtonSettings(self.main_table, col=4, row=alpha_row, os_main_root=self.os_main_root,
-                                             command_change=lambda:
-                                             self.settings_func(device_info['name'], device_info['uuid'],
-                                                                link_l['text']),
-                                             command_view=lambda: self.properties_view_func(device_info['other_data'],
-                                                                                            link_l['text']),
-                                             bg_color=bg_color, width=1, tag=device_info['tag'],
-                                             type=RevealerDeviceType.OTHER)
-        elif device_info['uuid'] != "" or device_info["mipas"]:
-            button_settings = ButtonSettings(self.main_table, col=4, row=alpha_row, os_main_root=self.os_main_root,
-                                             command_change=lambda:
-                                             self.settings_func(device_info['name'], device_info['uuid'],
-                                                                link_l['text']),
-                                             command_view=lambda: self.properties_view_func(device_info['other_data'],
-                                                                                            link_l['text']),
-                                             bg_color=bg_color, width=1, tag=device_info['tag'],
-                                             type=RevealerDeviceType.OUR)
-        else:
-            button_settings = ButtonSettings(self.main_table, col=4, row=alpha_row, os_main_root=self.os_main_root,
-                                             command_change=lambda:
-                                             self.settings_func(device_info['name'], device_info['uuid'],
-                                                                link_l['text']),
-                                             command_view=lambda: self.properties_view_func(device_info['other_data'],
-                                                                                            link_l['text']),
-                                             bg_color=bg_color, width=1, tag=device_info['tag'],
-                                             state="disabled", type=RevealerDeviceType.OUR)
-
-        # bind double left click and right click
-        # bind left-click to 'open_link'
-        link_l.bind("<Button-1>", self.left_click_func)
-
-        # bind right-click to 'change_ip'
-        link_l.bind("<Button-3>", self.right_click_func)
-        device.bind("<Button-3>", self.right_click_func)
-
-        row_widgets = [device, link_l, button_settings]
-        self.ssdp_rows.append(row_widgets)
-
-        self.last_row += 1
-
-    def add_legacy_headers(self, row):
-        # add two blank lines
-        blank = Label(self.main_table, text="", anchor="w", background=DEFAULT_BG_COLOR)
-        blank.grid(row=row, column=0, sticky="ew")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Frame(self.main_table, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
-        blank.grid(row=row, column=1, sticky="news")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Label(self.main_table, text="", anchor="w", background=DEFAULT_BG_COLOR)
-        blank.grid(row=row, column=2, sticky="ew")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Frame(self.main_table, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
-        blank.grid(row=row, column=3, sticky="news")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Frame(self.main_table, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
-        blank.grid(row=row, column=4, sticky="news")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Label(self.main_table, text="", anchor="w", background=DEFAULT_BG_COLOR)
-        blank.grid(row=row + 1, column=0, sticky="ew")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Frame(self.main_table, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
-        blank.grid(row=row + 1, column=1, sticky="news")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Label(self.main_table, text="", anchor="w", background=DEFAULT_BG_COLOR)
-        blank.grid(row=row + 1, column=2, sticky="ew")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Frame(self.main_table, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
-        blank.grid(row=row + 1, column=3, sticky="news")
-        blank.tag = self.BLANK_LINE_TAG
-
-        blank = Frame(self.main_table, takefocus=0, background=DEFAULT_BG_COLOR, width=2)
-        blank.grid(row=row + 1, column=4, sticky="news")
-        blank.tag = self.BLANK_LINE_TAG
-
-        # add additional header line
-        # add headers
-        header_1 = Label(self.main_table, text="Legacy Protocol Devices", anchor="center", fg=DEFAULT_TEXT_COLOR,
-                         background=self.HEADER_COLOR)
-        header_1.grid(row=row + 2, column=0, sticky="ew")
-        header_1.tag = self.ADDITIONAL_HEADER_TAG
-
-        header_2 = ttk.Separator(self.main_table, takefocus=0, orient=VERTICAL)
-        header_2.grid(row=row + 2, column=1, sticky="ns")
-        header_2.tag = self.ADDITIONAL_HEADER_TAG
-
-        header_3 = Label(self.main_table, text="URL", anchor="center", background=self.HEADER_COLOR, height=0,
-                         fg=DEFAULT_TEXT_COLOR)
-        header_3.grid(row=row + 2, column=2, sticky="ew")
-        header_3.tag = self.ADDITIONAL_HEADER_TAG
-
-        header_4 = ttk.Separator(self.main_table, takefocus=0, orient=VERTICAL)
-        header_4.grid(row=row + 2, column=3, sticky="ns")
-        header_4.tag = self.ADDITIONAL_HEADER_TAG
-
-        blank = Frame(self.main_table, takefocus=0, background=self.HEADER_COLOR, width=2)
-        blank.grid(row=row + 2, column=4, sticky="news")
-        blank.tag = self.BLANK_LINE_TAG
-
-    def add_legacy_row(self, row, device_row: RevealerDeviceRow):
-
-        device_info = device_row.get_dict()
-
-        alpha_row = row
+        self.button_reinit(row.buttons, device_row)
 
-        # find correct color
-        if (alpha_row - self.LEGACY_HEADER_ROW + 1) % 2 == 0:
-            bg_color = self.EVEN_ROW_COLOR
-        else:
-            bg_color = DEFAULT_BG_COLOR
-
-        middle = Frame(self.main_table, takefocus=0, background=bg_color, width=2)
-        middle.grid(row=alpha_row, column=1, sticky="news")
-        middle.tag = device_info['tag']
-
-        middle = Frame(self.main_table, takefocus=0, background=bg_color, width=2)
-        middle.grid(row=alpha_row, column=3, sticky="news")
-        middle.tag = device_info['tag']
-
-        if device_info['tag'] != "not_local":
-            device = Label(self.main_table, text=device_info['name'], anchor="w", background=bg_color,
-                           fg=DEFAULT_TEXT_COLOR,
-                           font=(self.main_font.name, self.main_font.actual()['size'], 'bold'))
-            link = Label(self.main_table, text=device_info['link'], anchor="w", background=bg_color,
-                         cursor=self.pointer_cursor,
-                         fg="blue", font=(self.main_font.name, self.main_font.actual()['size'], 'underline'))
-        else:
-            device = Label(self.main_table, text=device_info['name'], anchor="w", background=bg_color)
-            link = Label(self.main_table, text=device_info['link'], anchor="w", background=bg_color,
-                         fg=DEFAULT_TEXT_COLOR,
-                         font=(self.main_font.name, self.main_font.actual()['size'], ''))
-
-        link.grid(row=alpha_row, column=2, sticky="ew")
-        device.grid(row=alpha_row, column=0, sticky="ew")
-
-        device.tag = device_info['tag']
-        link.tag = device_info['tag']
-
-        device.link = link['text']
-        link.link = link['text']
-
-        blank_settings = Frame(self.main_table, takefocus=0, background=bg_color, width=2)
-        blank_settings.grid(row=alpha_row, column=4, sticky='news')
-        blank_settings.tag = device_info['tag']
-
-        # bind left-click to 'open_link'
-        link.bind("<Button-1>", self.left_click_func)
-
-        row_widgets = [device, link]
+    def shown_rows(self) -> int:
+        """
+        :return: number of devices in the snapshot shown in the table.
+        """
 
-        self.legacy_rows.append(row_widgets)
+        return len(self._snapshot.ssdp_devices) + len(self._snapshot.old_devices)
 
     def delete_all_rows(self):
-        self.last_row = 1
-        self.legacy_last_row = 0
+        self.shown_version = None
+        self._snapshot = RevealerDeviceSnapshot(None, SortedDeviceView(), SortedDeviceView())
 
-        self.ssdp_rows = []
-        self.legacy_rows = []
+        self.great_table.set_virtual_height(self.row_height)
+        self.great_table.canvas.yview_moveto(0)
+        self._bind_visible_rows()
 
-        # self.device_list.clear_all()
+    def add_row_ssdp_item(self, name, link, ip_address, uuid, other_data, tag, generation=None):
 
-        for i in self.main_table.winfo_children():
-            if hasattr(i, 'tag'):
-                # destroy all children which is not header
-                if not i.tag == self.HEADER_TAG:
-                    i.destroy()
-            else:
-                # and if does not have any tag at all
-                i.destroy()
+        self.device_list.insert_device(self.make_row_ssdp_item(name, link, ip_address, uuid, other_data, tag),
+                                       generation)
 
-    def delete_to_widget(self, widget_n):
-        widgets_arr = self.main_table.winfo_children()
-        for i in range(len(widgets_arr)):
-            if hasattr(widgets_arr[i], 'destroy_tag'):
-                # destroy all children which is not header
-                if widgets_arr[i].destroy_tag == '1':
-                    widgets_arr[i].grid_forget()
-                    widgets_arr[i].destroy()
+        return
 
-    def add_row_ssdp_item(self, name, link, ip_address, uuid, other_data, tag):
+    def make_row_ssdp_item(self, name, link, ip_address, uuid, other_data, tag):
+        """
+        Make the row of the SSDP device to be inserted to the device list later with device_list.insert_device().
+
+        :return: RevealerDeviceRow
+        """
 
         # we need to sort alphabetically at every moment
         # so... ignore the new row i guess
@@ -740,23 +715,11 @@ class RevealerTable:
             # our device
             type = RevealerDeviceType.OUR
 
-        self.device_list.add_device(name=name, link=link, ip_address=ip_address, uuid=uuid, other_data=other_data,
-                                    tag=tag, device_type=type, legacy=False, mipas_support=mipas_support)
-
-        return
+        return self.device_list.make_device(name=name, link=link, ip_address=ip_address, uuid=uuid,
+                                            other_data=other_data, tag=tag, device_type=type, legacy=False,
+                                            mipas_support=mipas_support)
 
-    def _set_row_color(self, row, additional_row, widget, subtract_legacy_header_row: bool):
-        subtruhend = self.legacy_header_row if subtract_legacy_header_row else 0
-        if (row + additional_row - subtruhend) % 2 == 0:
-            widget["background"] = self.EVEN_ROW_COLOR
-            if hasattr(widget, 'button'):
-                widget.button.change_button_color(self.EVEN_ROW_COLOR)
-        else:
-            widget["background"] = DEFAULT_BG_COLOR
-            if hasattr(widget, 'button'):
-                widget.button.change_button_color(DEFAULT_BG_COLOR)
-
-    def add_row_old_item(self, name, link, tag):
+    def add_row_old_item(self, name, link, tag, generation=None):
 
         self.device_list.add_device(
             name=name,
@@ -766,7 +729,8 @@ class RevealerTable:
             other_data=None,
             uuid=None,
             tag=tag,
-            legacy=True
+            legacy=True,
+            generation=generation
         )
 
         return
@@ -792,18 +756,13 @@ class ButtonSettings:
         # it is important to use this specific file path for correct mac os app bundle working
         self.os_main_root = os_main_root
 
-        photo = PhotoImage(file=os.path.join(self.os_main_root, 'resources/settings2.png'))
+        # images and cursor are shared by the buttons of all rows
+        self.resources = get_resources(master)
+        self.pointer_cursor = self.resources.pointer_cursor
+        photo = self.resources.image(os.path.join(self.os_main_root, 'resources/settings2.png'))
 
         text_settings = "Change network settings..."
 
-        # try to use mac os specific cursor - if exception is raised we are not on mac os and should use default
-        self.pointer_cursor = CURSOR_POINTER_MACOS
-        try:
-            test_label = Label(master, text='', cursor=self.pointer_cursor)
-            test_label.destroy()
-        except TclError:
-            self.pointer_cursor = CURSOR_POINTER
-
         if state == "normal":
             cursor = self.pointer_cursor
             # flag for indication if this button should be enabled for working after search is finished
@@ -834,7 +793,7 @@ class ButtonSettings:
             self._change_hovertip = None
             self._button_change = None
 
-        photo = PhotoImage(file=os.path.join(self.os_main_root, 'resources/properties.png'))
+        photo = self.resources.image(os.path.join(self.os_main_root, 'resources/properties.png'))
 
         button = Button(self.frame, image=photo, command=command_view, relief="flat", bg=bg_color,
                         cursor=self.pointer_cursor, highlightbackground=bg_color)
@@ -854,6 +813,11 @@ class ButtonSettings:
 
         self._button_view = button
 
+        # current state of the widgets - Tcl is called only if it is changed
+        self._shown = True
+        self._change_shown = self._button_change is not None
+        self._change_state = state
+
     def reinit(self, command_view, command_change, tag, device_type, state="normal"):
         """
         Method of reinitialization of the buttons
@@ -868,9 +832,6 @@ class ButtonSettings:
         # update frame tag
         self.frame.tag = tag
 
-        # update button settings widget
-        photo = PhotoImage(file=os.path.join(self.os_main_root, 'resources/settings2.png'))
-
         text_settings = "Change network settings..."
 
         if state == "normal":
@@ -885,6 +846,7 @@ class ButtonSettings:
 
         if device_type == RevealerDeviceType.OUR and self._button_change is None:
             # add button if it doesn't exist
+            photo = self.resources.image(os.path.join(self.os_main_root, 'resources/settings2.png'))
             button = Button(self.frame, image=photo, command=command_change, relief="flat",
                             bg=self.bg_color, cursor=cursor,
                             highlightbackground=self.bg_color)
@@ -901,32 +863,66 @@ class ButtonSettings:
             button.bind("<Enter>", self._on_enter, add="+")
 
             self._button_change = button
+            self._change_shown = True
+            self._change_state = state
         elif device_type == RevealerDeviceType.OUR and self._button_change is not None:
-            self._button_change.configure(command=command_change)
-            self._button_change.configure(cursor=cursor)
+            self._button_change.configure(command=command_change, cursor=cursor, state=state)
+            self._change_state = state
+            if not self._change_shown:
+                self._button_change.grid()
+                self._change_shown = True
             self._change_hovertip.text = text_settings
-        elif device_type != RevealerDeviceType.OUR and self._button_change is not None:
-            self._button_change.destroy()
-            self._button_change = None
+        elif device_type != RevealerDeviceType.OUR and self._change_shown:
+            # button is hidden and not destroyed since rows of the table are reused for other devices
+            self._button_change.grid_remove()
+            self._change_shown = False
 
         # update properties button
         self._button_view.configure(command=command_view)
 
+    def hide(self):
+        """
+        Hide buttons of the row which has no device (blank lines and headers of the table or legacy devices).
+        :return:
+        """
+        self.frame.button_flag = False
+        if not self._shown:
+            return
+
+        self._button_view.grid_remove()
+        if self._change_shown:
+            self._button_change.grid_remove()
+        self._shown = False
+
+    def show(self):
+        if self._shown:
+            return
+
+        self._button_view.grid()
+        if self._change_shown:
+            self._button_change.grid()
+        self._shown = True
+
     def disable(self):
         """
         Disable button.
         :return:
         """
-        if self._button_change is not None:
-            self._button_change["state"] = "disabled"
-            self._button_change.update()
+        self._set_change_state("disabled")
 
     def enable(self):
-        if self._button_change is not None:
-            self._button_change["state"] = "normal"
-            self._button_change.update()
+        self._set_change_state("normal")
+
+    def _set_change_state(self, state):
+        if self._button_change is not None and self._change_state != state:
+            self._button_change["state"] = state
+            self._change_state = state
 
     def change_button_color(self, color):
+        if color == self.bg_color:
+            return
+        self.bg_color = color
+
         if self._button_change is not None:
             self._button_change.configure(bg=color, highlightbackground=color)
             self._button_change.bg_default = color
@@ -0,0 +1,206 @@
+"""
+Single-pass parser of SSDP answers and NOTIFY messages.
+"""
+
+import logging as log
+import re
+
+from revealerdevice import NOT_PROVIDED
+
+# absolute URL: scheme://host[:port][rest]
+_URL_RE = re.compile(r"^(https?)://([^/:?#\s]+)(?::(\d{1,5}))?(.*)$", re.IGNORECASE | re.DOTALL)
+_IPV4_RE = re.compile(r"^((25[0-5]|(2[0-4]|1\d|[1-9]|)\d)\.){3}(25[0-5]|(2[0-4]|1\d|[1-9]|)\d)$")
+_MAX_AGE_RE = re.compile(r"max-age\s*=\s*(\d+)", re.IGNORECASE)
+
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+
+_NOTIFY_START = b"NOTIFY * HTTP/1.1"
+
+
+class SSDPRecord:
+    """
+    Class of the parsed SSDP message. Fields which are not present in the message are None.
+    """
+
+    __slots__ = ("notify", "server", "version", "os", "os_version", "location", "ssdp_url", "location_url", "uuid",
+                 "mipas", "max_age", "bootid", "configid")
+
+    def __init__(self):
+        # flag to indicate that this is NOTIFY message and not an answer to M-SEARCH
+        self.notify = False
+
+        self.server = None
+        self.version = None
+        self.os = None
+        self.os_version = None
+
+        self.location = None
+        self.ssdp_url = None
+        self.location_url = None
+
+        self.uuid = None
+        self.mipas = None
+
+        self.max_age = None
+        self.bootid = None
+        self.configid = None
+
+    def to_dict(self):
+        """
+        Make dict of the SSDP data in the format used by the device list and the properties window.
+
+        :return:
+        """
+
+        def value(field):
+            return field if field is not None else NOT_PROVIDED
+
+        return {"server": value(self.server), "version": value(self.version), "location": value(self.location),
+                "ssdp_url": value(self.ssdp_url), "uuid": value(self.uuid), "location_url": value(self.location_url),
+                "os": value(self.os), "os_version": value(self.os_version), "mipas": value(self.mipas),
+                "max_age": value(self.max_age), "bootid": value(self.bootid), "configid": value(self.configid)}
+
+
+def _parse_server(value, record, addr) -> None:
+    """
+    Correct format for SERVER header is:
+        <OS>/<OS version> UPnP/<version of UPnP supported> <product>/<product version>
+
+    All fields should be filled according to HTTP/1.1 "product tokens".
+
+    For example, "SERVER: unix/5.1 UPnP/2.0 MyProduct/1.0"
+
+    Note: whitespaces are used as separator so should not be used in OS / product strings but if some device has
+    additional whitespaces in its product tokens revealer should try and parse them as well with logging about that.
+    """
+
+    if not value:
+        return
+
+    words = value.split(" ")
+    if len(words) == 3:
+        os_fields = words[0]
+        product_fields = words[2]
+    else:
+        index_upnp = value.find("UPnP/")
+        if index_upnp < 0:
+            log.warning(f"Can't parse SERVER header line of {addr} without UPnP field at all: '{value}'.")
+            return
+
+        log.warning(f"SERVER header line of {addr} with incorrect format: '{value}'. Whitespaces shouldn't be used "
+                    f"in the OS and product names.")
+        os_fields = value[:index_upnp]
+        index_product = value.find(" ", index_upnp)
+        product_fields = value[index_product + 1:] if index_product >= 0 else ""
+
+    os_words = os_fields.split("/")
+    product_words = product_fields.split("/")
+
+    record.os = os_words[0]
+    if len(os_words) > 1:
+        record.os_version = os_words[1]
+
+    record.server = product_words[0]
+    if len(product_words) > 1:
+        record.version = product_words[1]
+
+
+def _parse_location(value, record, addr) -> None:
+    m = _URL_RE.match(value)
+
+    if m is None:
+        # if we are here it means we have an invalid LOCATION URL -
+        # relative one but UPnP standards require an absolute URL.
+        # See https://openconnectivity.org/upnp-specs/UPnP-arch-DeviceArchitecture-v2.0-20200417.pdf
+        # on pages 29 and 41 for LOCATION header format
+        #
+        # Nevertheless we are trying to get xml-file for this devices with address
+        record.location_url = "http://" + addr[0] + ":80"
+        record.location = record.location_url + value
+        record.ssdp_url = addr[0]
+        return
+
+    scheme, host, port, rest = m.groups()
+    scheme = scheme.lower()
+
+    if port is None:
+        # if we don't have port specification
+        port = _DEFAULT_PORTS[scheme]
+        record.location = scheme + "://" + host + ":" + port + rest
+    else:
+        # we have correct absolute location - save it as location
+        record.location = value
+
+    record.location_url = (scheme + "://" + host + ":" + port).lower()
+    record.ssdp_url = host if _IPV4_RE.match(host) else addr[0]
+
+
+def _parse_usn(value, record, addr) -> None:
+    # USN: uuid:40001d0a-0000-0000-8e31-4010900b00c8::upnp:rootdevice
+    words = value.split(":")
+    if len(words) > 1:
+        record.uuid = words[1]
+    else:
+        log.warning(f"USN of {addr} has incorrect format: {value}. It should be:\n"
+                    f"USN: uuid:00000000-0000-0000-0000-000000000000::<device-type>.")
+
+
+def _parse_mipas(value, record, addr) -> None:
+    # MIPAS: - our special field to identifty that this device
+    # supports network settings changing via multicast
+    record.mipas = value.split(":")[0].replace(" ", "")
+
+
+def _parse_cache_control(value, record, addr) -> None:
+    # CACHE-CONTROL: max-age=1800
+    m = _MAX_AGE_RE.search(value)
+    if m is not None:
+        record.max_age = m.group(1)
+
+
+def _parse_bootid(value, record, addr) -> None:
+    # BOOTID.UPNP.ORG: 1 - it is increased every time the device reboots
+    record.bootid = value
+
+
+def _parse_configid(value, record, addr) -> None:
+    # CONFIGID.UPNP.ORG: 1 - it is changed every time the device description changes
+    record.configid = value
+
+
+_HEADER_PARSERS = {
+    b"server": _parse_server,
+    b"location": _parse_location,
+    b"usn": _parse_usn,
+    b"mipas": _parse_mipas,
+    b"cache-control": _parse_cache_control,
+    b"bootid.upnp.org": _parse_bootid,
+    b"configid.upnp.org": _parse_configid,
+}
+
+
+def parse_ssdp_packet(data, addr) -> SSDPRecord:
+    """
+    Parse SSDP answer or NOTIFY message in one pass over its bytes without decoding the whole datagram.
+
+    :param data: bytes or memoryview
+        Received datagram.
+    :param addr: tuple
+        Address of the sender.
+    :return:
+    """
+
+    data = bytes(data)
+
+    record = SSDPRecord()
+    record.notify = data.startswith(_NOTIFY_START)
+
+    # lines are split and only names of the headers are compared - values are decoded for known headers only
+    for line in data.split(b"\n"):
+        name, separator, value = line.partition(b":")
+        if separator:
+            parser = _HEADER_PARSERS.get(name.strip().lower())
+            if parser is not None:
+                parser(value.strip().decode("utf-8", "replace"), record, addr)
+
+    return record
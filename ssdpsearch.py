@@ -0,0 +1,509 @@
+"""
+Single-threaded SSDP discovery engine.
+"""
+
+import logging as log
+import math
+import random
+import selectors
+import socket
+import threading
+import time
+import traceback
+
+
+class SSDPInterface:
+    """
+    Class of one local interface address which M-SEARCH requests are sent from. It also keeps arrival times of the
+    answers to decide when the search on this interface is complete.
+    """
+
+    def __init__(self, ip, sock):
+        self.ip = ip
+        self.sock = sock
+
+        # MX of the M-SEARCH requests and maximum listening time after the last request
+        self.mx = None
+        self.listen_window = None
+        # M-SEARCH requests (one for every search target) sent in every round
+        self.messages = []
+        # number of devices answered on this interface in the previous complete search with the same targets if known
+        self.expected_responders = None
+
+        self.responders = set()
+
+        # number of new devices answered after every M-SEARCH round
+        self.round_yields = []
+        self.next_round_time = None
+
+        self.sent_time = None
+        self.last_sent_time = None
+        self.first_time = None
+        self.last_new_time = None
+        self.complete_time = None
+        # True if the search was finished because no new devices answered for the quiet window
+        self.quiet = False
+        # True if listening was stopped by the socket error before the search was complete
+        self.aborted = False
+
+    def send(self, now) -> bool:
+        """
+        Send one more M-SEARCH round from this interface.
+
+        :param now: float
+            Monotonic time of the sending.
+        :return: True if at least one request was sent.
+        """
+
+        sent = False
+        for message in self.messages:
+            try:
+                self.sock.sendto(message, (SSDPSearchEngine.MULTICAST_GROUP, SSDPSearchEngine.MULTICAST_PORT))
+                sent = True
+            except OSError:
+                pass
+
+        if not sent:
+            return False
+
+        if self.sent_time is None:
+            self.sent_time = now
+        self.last_sent_time = now
+        self.round_yields.append(0)
+
+        return True
+
+    def rounds_sent(self) -> int:
+        return len(self.round_yields)
+
+    def add_response(self, addr, now) -> bool:
+        """
+        Remember answer arrival.
+
+        :param addr: tuple
+            Address of the device answered.
+        :param now: float
+            Monotonic time of the answer.
+        :return: True if this device has not answered on this interface before.
+        """
+
+        if addr[0] in self.responders:
+            return False
+
+        self.responders.add(addr[0])
+        # device is counted in the round of the last request sent
+        self.round_yields[-1] += 1
+        if self.first_time is None:
+            self.first_time = now
+        self.last_new_time = now
+
+        return True
+
+    def quiet_deadline(self, quiet_window, min_listen):
+        """
+        Time when the search on this interface is complete if no new devices answer.
+
+        Quiet window is measured from the last new device answered (or from the last request if no new device has
+        answered after it), so the search doesn't wait for the whole MX when all devices have already answered. The
+        listening window after the last request is the upper bound checked by the caller.
+
+        :param quiet_window: float
+            Time without new devices for the search to be complete.
+        :param min_listen: float
+            Minimum listening time after the first request.
+        :return: monotonic time.
+        """
+
+        if self.last_new_time is None or self.last_new_time < self.last_sent_time:
+            reference = self.last_sent_time
+        else:
+            reference = self.last_new_time
+        return max(reference + quiet_window, self.sent_time + min_listen)
+
+    def is_complete(self) -> bool:
+        return self.complete_time is not None
+
+    def complete(self, now, quiet) -> None:
+        self.complete_time = now
+        self.quiet = quiet
+
+    def time_to_first(self):
+        if self.first_time is None:
+            return None
+        return self.first_time - self.sent_time
+
+    def time_to_complete(self):
+        if self.complete_time is None or self.sent_time is None:
+            return None
+        return self.complete_time - self.sent_time
+
+
+class SSDPScanReport:
+    """
+    Class of the summary of one search to be shown in the log.
+    """
+
+    def __init__(self):
+        self.interfaces = []
+        self.notes = []
+        self.duration = 0.
+
+    def add_interface(self, interface: SSDPInterface) -> None:
+        self.interfaces.append(interface)
+
+    def add_note(self, line) -> None:
+        """
+        Add line about the search from outside the engine (description downloading for example).
+        """
+
+        self.notes.append(line)
+
+    def lines(self):
+        lines = [f"SSDP search finished in {self.duration:.2f} s."]
+
+        for interface in self.interfaces:
+            if interface.sent_time is None:
+                lines.append(f"  {interface.ip}: M-SEARCH was not sent.")
+                continue
+
+            line = f"  {interface.ip}: MX {interface.mx}, window {interface.listen_window:.1f} s"
+            if interface.expected_responders is not None:
+                line += f" (expected {interface.expected_responders} device(s))"
+            line += f", {len(interface.responders)} device(s)"
+            if interface.time_to_first() is not None:
+                line += f", first after {interface.time_to_first():.3f} s"
+            if interface.time_to_complete() is not None:
+                reason = "quiet" if interface.quiet else "timeout"
+                line += f", complete after {interface.time_to_complete():.3f} s ({reason})"
+            if interface.rounds_sent() > 1:
+                line += ", new devices per round: " + "/".join(str(n) for n in interface.round_yields)
+            lines.append(line + ".")
+
+        for note in self.notes:
+            lines.append("  " + note)
+
+        return lines
+
+    def __str__(self):
+        return "\n".join(self.lines())
+
+
+class SSDPSearchEngine:
+    """
+    Class which owns M-SEARCH sockets of all the interfaces and the NOTIFY socket and serves all of them from one
+    selector loop. Search is finished by the deadline so the whole search costs one thread however many interfaces
+    the computer has.
+    """
+
+    MULTICAST_GROUP = "239.255.255.250"
+    MULTICAST_PORT = 1900
+
+    RECV_BUFFER_SIZE = 8192
+
+    # MX of the M-SEARCH request is chosen for every interface from the number of devices answered on it in the
+    # previous search, so they answer no faster than the target rate
+    SSDP_DEFAULT_MX = 2
+    SSDP_MIN_MX = 1
+    SSDP_MAX_MX = 5
+    SSDP_TARGET_RESPONSE_RATE = 250  # answers per second
+
+    # maximum time for listening for SSDP answers is MX of the request plus a little additional timeout for
+    # program parsing
+    SSDP_TIMEOUT_MARGIN_SEC = 0.2
+
+    # search on the interface is complete if no new device has answered on it for this time, MX of the request only
+    # limits the listening time
+    SSDP_QUIET_WINDOW_SEC = 1.0
+    # minimum listening time after the first request even if the quiet window is shorter
+    SSDP_MIN_LISTEN_SEC = 0.5
+
+    # M-SEARCH is sent several times since UDP answers may be lost when a lot of devices answer at once
+    SSDP_SEARCH_ROUNDS = 2
+    # random spacing between M-SEARCH rounds on one interface
+    SSDP_ROUND_SPACING_SEC = (0.2, 0.5)
+
+    def __init__(self, quiet_window_sec=SSDP_QUIET_WINDOW_SEC, rounds=SSDP_SEARCH_ROUNDS):
+        self.quiet_window_sec = quiet_window_sec
+        self.rounds = max(1, rounds)
+
+        self._interfaces = []
+        self._notify_sock = None
+
+        # number of devices answered on every interface address in the previous complete search with the same search
+        # targets, key is (interface address, search targets)
+        self._population = {}
+
+        # report of the last finished search
+        self.report = SSDPScanReport()
+
+        self._in_process = threading.Event()
+        self._stop_flag = threading.Event()
+
+        # socket pair to wake up selector loop when search should be stopped
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_recv.setblocking(False)
+        self._wakeup_send.setblocking(False)
+
+    def __len__(self):
+        return len(self._interfaces)
+
+    def add_interface(self, ip) -> bool:
+        """
+        Open socket for M-SEARCH requests on this interface address.
+
+        :param ip: str
+            IP address of the local interface.
+        :return: True if socket was bound to this address.
+        """
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        try:
+            sock.bind((ip, 0))
+        except OSError:
+            sock.close()
+            return False
+
+        sock.setblocking(False)
+        self._interfaces.append(SSDPInterface(ip, sock))
+
+        return True
+
+    def set_notify_socket(self, sock, interface_ip) -> None:
+        """
+        Listen for NOTIFY messages on this socket during the search. Socket is not owned by the engine and is not
+        closed by it.
+
+        :param sock: socket.socket
+            Socket bound to the SSDP multicast port.
+        :param interface_ip: str
+            IP address of the interface to join multicast group on.
+        :return:
+        """
+
+        try:
+            sock.setsockopt(socket.SOL_IP, socket.IP_ADD_MEMBERSHIP,
+                            socket.inet_aton(self.MULTICAST_GROUP) + socket.inet_aton(interface_ip))
+        except OSError:
+            pass
+
+        self._notify_sock = sock
+
+    def clear(self) -> None:
+        """
+        Close all interface sockets and forget about the NOTIFY socket.
+
+        :return:
+        """
+
+        for interface in self._interfaces:
+            interface.sock.close()
+
+        self._interfaces = []
+        self._notify_sock = None
+
+    def choose_mx(self, expected_responders) -> int:
+        """
+        Choose MX so the expected number of devices answer no faster than the target rate.
+
+        :param expected_responders: int
+            Number of devices answered in the previous search or None if unknown.
+        :return:
+        """
+
+        if expected_responders is None:
+            return self.SSDP_DEFAULT_MX
+
+        mx = math.ceil(expected_responders / self.SSDP_TARGET_RESPONSE_RATE)
+        return min(self.SSDP_MAX_MX, max(self.SSDP_MIN_MX, mx))
+
+    @staticmethod
+    def build_msearch(search_target, mx) -> bytes:
+        # M-Search message body
+        message = \
+            "M-SEARCH * HTTP/1.1\r\n" \
+            "HOST:239.255.255.250:1900\r\n" \
+            "ST:" + search_target + "\r\n" \
+            "MX:" + str(mx) + "\r\n" \
+            'MAN:"ssdp:discover"\r\n' \
+            "\r\n"
+        return message.encode("utf-8")
+
+    @staticmethod
+    def _population_key(interface, search_targets):
+        return interface.ip, tuple(search_targets)
+
+    def _prepare_interface(self, interface, search_targets) -> None:
+        interface.expected_responders = self._population.get(self._population_key(interface, search_targets))
+        interface.mx = self.choose_mx(interface.expected_responders)
+        interface.listen_window = interface.mx + self.SSDP_TIMEOUT_MARGIN_SEC
+        interface.messages = [self.build_msearch(search_target, interface.mx) for search_target in search_targets]
+
+    def search(self, search_targets, on_response, on_notify, cancel_token=None) -> None:
+        """
+        Send M-SEARCH request from all interfaces in several rounds with random spacing and serve the answers. Search
+        on the interface is complete when all rounds are sent and no new device has answered on it for the quiet
+        window (but not before the minimum listening time is over) or when MX of the last round plus a margin is
+        over. MX of the requests is chosen for every interface from the number of devices answered on it in the
+        previous complete search with the same search targets. Callbacks are called in this thread so they should be
+        short (put tasks to other threads for example).
+
+        :param search_targets: list
+            ST values of the M-SEARCH requests sent in every round.
+        :param on_response: callable(data, addr, interface_ip)
+            Callback for the M-SEARCH answers with IP address of the interface the answer was received on.
+        :param on_notify: callable(data, addr, interface_ip)
+            Callback for the messages received on the NOTIFY socket, interface_ip is None for them.
+        :param cancel_token: CancellationToken
+            Token stopping the search when it is cancelled, even before the search has started.
+        :return:
+        """
+
+        self._in_process.set()
+        self._stop_flag.clear()
+
+        self.report = SSDPScanReport()
+        start_time = time.monotonic()
+
+        selector = selectors.DefaultSelector()
+        cancel_handle = None
+        try:
+            self._drain_wakeup()
+            if cancel_token is not None:
+                cancel_handle = cancel_token.register(self.stop)
+            selector.register(self._wakeup_recv, selectors.EVENT_READ, None)
+
+            # register NOTIFY socket first so we don't miss NOTIFY answers on our M-SEARCH
+            # See #89128.
+            if self._notify_sock is not None:
+                selector.register(self._notify_sock, selectors.EVENT_READ, (None, on_notify))
+
+            active = []
+            for interface in self._interfaces:
+                self._prepare_interface(interface, search_targets)
+                self.report.add_interface(interface)
+                if not interface.send(time.monotonic()):
+                    continue
+                self._schedule_next_round(interface)
+                selector.register(interface.sock, selectors.EVENT_READ, (interface, on_response))
+                active.append(interface)
+
+            self._serve(selector, active)
+        finally:
+            if cancel_token is not None:
+                cancel_token.unregister(cancel_handle)
+            selector.close()
+            self.report.duration = time.monotonic() - start_time
+            # only complete searches tell the number of devices, cancelled or failed ones would make MX too small
+            for interface in self.report.interfaces:
+                if interface.is_complete() and not interface.aborted:
+                    self._population[self._population_key(interface, search_targets)] = len(interface.responders)
+            self.clear()
+            self._in_process.clear()
+
+    def _schedule_next_round(self, interface) -> None:
+        if interface.rounds_sent() < self.rounds:
+            interface.next_round_time = interface.last_sent_time + random.uniform(*self.SSDP_ROUND_SPACING_SEC)
+        else:
+            interface.next_round_time = None
+
+    def _update_interfaces(self, selector, active, now):
+        """
+        Send next M-SEARCH rounds and stop listening on the interfaces with finished search.
+
+        :return: time of the next interface check or None if all interfaces are complete.
+        """
+
+        next_check = None
+
+        for interface in active:
+            if interface.is_complete():
+                continue
+
+            if interface.next_round_time is not None:
+                if now >= interface.next_round_time:
+                    interface.send(now)
+                    self._schedule_next_round(interface)
+
+            if interface.next_round_time is not None:
+                # interface can't be complete till all rounds are sent
+                if next_check is None or interface.next_round_time < next_check:
+                    next_check = interface.next_round_time
+                continue
+
+            hard_deadline = interface.last_sent_time + interface.listen_window
+            quiet_deadline = interface.quiet_deadline(self.quiet_window_sec, self.SSDP_MIN_LISTEN_SEC)
+
+            if now >= quiet_deadline or now >= hard_deadline:
+                interface.complete(now, quiet=quiet_deadline < hard_deadline)
+                selector.unregister(interface.sock)
+                continue
+
+            check = min(quiet_deadline, hard_deadline)
+            if next_check is None or check < next_check:
+                next_check = check
+
+        return next_check
+
+    def _serve(self, selector, active) -> None:
+        while not self._stop_flag.is_set():
+            now = time.monotonic()
+            next_check = self._update_interfaces(selector, active, now)
+            if next_check is None:
+                break
+
+            for key, _ in selector.select(next_check - now):
+                if key.data is None:
+                    # we were woken up to stop
+                    self._drain_wakeup()
+                    continue
+
+                interface, callback = key.data
+
+                try:
+                    data, addr = key.fileobj.recvfrom(self.RECV_BUFFER_SIZE)
+                except (BlockingIOError, socket.timeout):
+                    continue
+                except OSError:
+                    log.debug(f"Socket {key.fileobj} is closed. Stop listening on it.")
+                    selector.unregister(key.fileobj)
+                    if interface is not None:
+                        interface.complete(time.monotonic(), quiet=False)
+                        interface.aborted = True
+                    continue
+
+                if interface is not None:
+                    interface.add_response(addr, time.monotonic())
+
+                try:
+                    callback(data, addr, interface.ip if interface is not None else None)
+                except Exception:
+                    log.error(f"Error while handling SSDP packet from {addr}:\n{traceback.format_exc()}")
+
+    def _drain_wakeup(self) -> None:
+        try:
+            while self._wakeup_recv.recv(64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def stop(self) -> None:
+        """
+        Stop the search in progress.
+
+        :return:
+        """
+
+        self._stop_flag.set()
+        try:
+            self._wakeup_send.send(b"\0")
+        except OSError:
+            pass
+
+    def in_process(self) -> bool:
+        """
+        Checks if the search is now in process.
+
+        :return:
+        """
+
+        return self._in_process.is_set()
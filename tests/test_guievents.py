@@ -0,0 +1,165 @@
+"""
+Tests of the event queue from the worker threads to the GUI thread. Main loop of Tk is replaced with the fake one
+which runs the scheduled calls when the test asks it.
+"""
+
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from guievents import GuiEventKind, GuiEventQueue  # noqa: E402
+
+
+class FakeTk:
+    """
+    Tcl interpreter telling whether it is threaded.
+    """
+
+    def __init__(self, threaded):
+        self.threaded = threaded
+
+    def eval(self, script):
+        return "1" if self.threaded else "0"
+
+    @staticmethod
+    def getboolean(value):
+        return value == "1"
+
+
+class FakeRoot:
+    """
+    Root window with the calls scheduled by after_idle() and after() kept till run() is called.
+    """
+
+    def __init__(self, threaded=True):
+        self.tk = FakeTk(threaded)
+        # (id, delay or None for after_idle, function)
+        self.calls = []
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _schedule(self, delay, func):
+        with self._lock:
+            self._next_id += 1
+            self.calls.append((f"after#{self._next_id}", delay, func))
+            return f"after#{self._next_id}"
+
+    def after_idle(self, func):
+        return self._schedule(None, func)
+
+    def after(self, delay, func):
+        return self._schedule(delay, func)
+
+    def after_cancel(self, after_id):
+        self.calls = [call for call in self.calls if call[0] != after_id]
+
+    def run(self):
+        """
+        Run the calls scheduled till now.
+
+        :return: delays of the calls.
+        """
+
+        calls, self.calls = self.calls, []
+        for _, _, func in calls:
+            func()
+        return [delay for _, delay, _ in calls]
+
+
+class GuiEventQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.idle = True
+
+    def make_queue(self, threaded=True):
+        self.root = FakeRoot(threaded)
+        return GuiEventQueue(self.root, self.handled.append, lambda: self.idle, poll_time_ms=50)
+
+    def kinds(self):
+        return [[event.kind for event in events] for events in self.handled]
+
+    def test_posts_are_coalesced_into_one_wakeup(self):
+        queue = self.make_queue()
+        self.assertTrue(queue.threaded)
+
+        threads = [threading.Thread(target=queue.post, args=(GuiEventKind.DEVICES_CHANGED,)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.root.calls), 1)
+        self.assertEqual(self.root.run(), [None])
+        self.assertEqual(self.kinds(), [[GuiEventKind.DEVICES_CHANGED] * 10])
+
+        # the next post after the handling wakes the GUI again
+        queue.post(GuiEventKind.ERROR, "text")
+        self.root.run()
+        self.assertEqual(self.handled[-1][0].data, "text")
+
+    def test_handler_error_doesnt_stop_handling(self):
+        queue = self.make_queue()
+        self.handled = []
+
+        def handler(events):
+            self.handled.append(events)
+            raise ValueError("handler error")
+
+        queue._handler = handler
+        queue.post(GuiEventKind.PHASE_CHANGED)
+        self.root.run()
+        queue.post(GuiEventKind.PHASE_CHANGED)
+        self.root.run()
+
+        self.assertEqual(len(self.handled), 2)
+
+    def test_close_drops_events(self):
+        queue = self.make_queue()
+        queue.post(GuiEventKind.DEVICES_CHANGED)
+        queue.close()
+        queue.post(GuiEventKind.DEVICES_CHANGED)
+        queue.wake()
+
+        self.root.run()
+        self.assertEqual(self.handled, [])
+
+    def test_close_cancels_scheduled_handling(self):
+        queue = self.make_queue()
+        queue.wake()
+        self.assertEqual(len(self.root.calls), 1)
+
+        queue.close()
+        self.assertEqual(self.root.calls, [])
+
+    def test_polling_without_threaded_tcl(self):
+        queue = self.make_queue(threaded=False)
+        self.assertFalse(queue.threaded)
+
+        # workers can't call tkinter, so posting schedules nothing
+        queue.post(GuiEventKind.DEVICES_CHANGED)
+        self.assertEqual(self.root.calls, [])
+
+        self.idle = False
+        queue.wake()
+        # repeated wake doesn't start the second polling
+        queue.wake()
+        self.assertEqual(self.root.run(), [None])
+        self.assertEqual(self.kinds(), [[GuiEventKind.DEVICES_CHANGED]])
+
+        queue.post(GuiEventKind.PHASE_CHANGED)
+        self.assertEqual(self.root.run(), [50])
+        self.assertEqual(self.kinds()[-1], [GuiEventKind.PHASE_CHANGED])
+
+        # polling stops when the work is finished
+        self.idle = True
+        self.assertEqual(self.root.run(), [50])
+        self.assertEqual(self.root.calls, [])
+        self.assertEqual(self.handled[-1], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
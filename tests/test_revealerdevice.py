@@ -0,0 +1,229 @@
+"""
+Tests of the device list structures.
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from revealerdevice import DeviceIdentityIndex, DeviceProperties, NOT_PROVIDED, RevealerDeviceList, \
+    RevealerDeviceTag, RevealerDeviceType, SortedDeviceIndex  # noqa: E402
+
+
+class SortedDeviceIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # small blocks so the tests split them many times
+        self.index = SortedDeviceIndex()
+        self.index.BLOCK_SIZE = 4
+
+    def test_order_and_ranks_match_sorted_list(self):
+        keys = list(range(500))
+        random.Random(1).shuffle(keys)
+        added = []
+
+        for key in keys:
+            added.append(key)
+            rank = self.index.add((key,), f"device {key}")
+            self.assertEqual(rank, sorted(added).index(key))
+
+        self.assertEqual(len(self.index), len(keys))
+        self.assertEqual(list(self.index), [f"device {key}" for key in sorted(keys)])
+        for position, key in enumerate(sorted(keys)):
+            self.assertEqual(self.index.rank((key,)), position)
+            self.assertEqual(self.index[position], f"device {key}")
+        self.assertEqual(self.index[-1], "device 499")
+
+    def test_duplicate_key_is_not_added(self):
+        self.assertEqual(self.index.add(("a",), 1), 0)
+        self.assertIsNone(self.index.add(("a",), 2))
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index[0], 1)
+
+    def test_missing_keys(self):
+        self.assertNotIn(("a",), self.index)
+        self.assertIsNone(self.index.rank(("a",)))
+
+        for key in "bdf":
+            self.index.add((key,), key)
+        for key in "aceg":
+            self.assertNotIn((key,), self.index)
+            self.assertIsNone(self.index.rank((key,)))
+        self.assertIn(("d",), self.index)
+
+        with self.assertRaises(IndexError):
+            self.index[3]
+        with self.assertRaises(IndexError):
+            self.index[-4]
+
+    def test_view_is_not_changed_by_insertions(self):
+        for key in range(0, 40, 2):
+            self.index.add((key,), key)
+        view = self.index.view()
+
+        for key in range(1, 40, 2):
+            self.index.add((key,), key)
+
+        self.assertEqual(len(view), 20)
+        self.assertEqual(list(view), list(range(0, 40, 2)))
+        self.assertEqual([view[i] for i in range(len(view))], list(range(0, 40, 2)))
+        self.assertEqual(list(self.index), list(range(40)))
+
+    def test_clear(self):
+        for key in range(20):
+            self.index.add((key,), key)
+        self.index.clear()
+
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(list(self.index), [])
+        self.assertEqual(self.index.add((5,), 5), 0)
+
+
+class DevicePropertiesTest(unittest.TestCase):
+
+    def test_behaves_like_dict(self):
+        data = {"friendlyName": "Device", "server": "Server", "mipas": "Not provided", "custom": 1}
+        properties = DeviceProperties(data)
+
+        self.assertEqual(dict(properties), data)
+        self.assertEqual(len(properties), 4)
+        self.assertEqual(properties["custom"], 1)
+        self.assertNotIn("uuid", properties)
+        self.assertEqual(properties.get("uuid", "-"), "-")
+        with self.assertRaises(KeyError):
+            properties["uuid"]
+        with self.assertRaises(KeyError):
+            properties["other"]
+
+    def test_keys_follow_fields_order(self):
+        properties = DeviceProperties({"custom": 1, "uuid": "u", "friendlyName": "Device"})
+
+        self.assertEqual(list(properties), ["friendlyName", "uuid", "custom"])
+
+    def test_delete(self):
+        properties = DeviceProperties({"uuid": "u", "custom": 1})
+        del properties["uuid"]
+        del properties["custom"]
+
+        self.assertEqual(len(properties), 0)
+        with self.assertRaises(KeyError):
+            del properties["uuid"]
+        with self.assertRaises(KeyError):
+            del properties["custom"]
+
+    def test_not_provided_is_shared(self):
+        value = "".join(["Not ", "provided"])
+        properties = DeviceProperties({"uuid": value, "custom": value})
+
+        self.assertIs(properties["uuid"], NOT_PROVIDED)
+        self.assertIs(properties["custom"], NOT_PROVIDED)
+
+
+class RevealerDeviceListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.device_list = RevealerDeviceList()
+
+    def make_device(self, name, legacy=False):
+        return self.device_list.make_device(name=name, device_type=RevealerDeviceType.OTHER, link="http://" + name,
+                                            ip_address=name, other_data=None if legacy else {"server": "Server"},
+                                            uuid=None, tag=RevealerDeviceTag.LOCAL, legacy=legacy)
+
+    def test_batch_is_published_once(self):
+        rows = [self.make_device(f"10.0.0.{i}") for i in range(3)] + [self.make_device("10.0.0.9", legacy=True)]
+        # rows are made without publishing anything
+        self.assertEqual(self.device_list.snapshot.version, 0)
+
+        with self.device_list.batch():
+            for device_row in rows:
+                self.device_list.insert_device(device_row)
+            self.assertEqual(self.device_list.snapshot.version, 0)
+
+        snapshot = self.device_list.snapshot
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual([device.name for device in snapshot.ssdp_devices], ["10.0.0.0", "10.0.0.1", "10.0.0.2"])
+        self.assertEqual([device.name for device in snapshot.old_devices], ["10.0.0.9"])
+        self.assertIsInstance(snapshot.ssdp_devices[0].other_data, DeviceProperties)
+
+    def test_known_and_stale_devices_are_not_published(self):
+        self.device_list.add_device(**self.device_kwargs("10.0.0.1"))
+        self.device_list.clear_all(generation=2)
+        version = self.device_list.snapshot.version
+
+        self.device_list.insert_device(self.make_device("10.0.0.1"), generation=1)
+        self.assertEqual(self.device_list.snapshot.version, version)
+
+        self.device_list.insert_device(self.make_device("10.0.0.1"), generation=2)
+        self.device_list.insert_device(self.make_device("10.0.0.1"), generation=2)
+        self.assertEqual(self.device_list.snapshot.version, version + 1)
+        self.assertEqual(len(self.device_list.snapshot.ssdp_devices), 1)
+
+    @staticmethod
+    def device_kwargs(name):
+        return {"name": name, "device_type": RevealerDeviceType.OTHER, "link": "http://" + name, "ip_address": name,
+                "other_data": {"server": "Server"}, "uuid": None, "tag": RevealerDeviceTag.LOCAL, "legacy": False}
+
+
+class DeviceIdentityIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.identities = DeviceIdentityIndex()
+
+    def test_answers_of_one_device_are_merged(self):
+        identity, known = self.identities.observe("uuid-1", "10.0.0.1", "http://10.0.0.1:80/desc.xml", "10.0.0.100")
+        self.assertFalse(known)
+
+        # the same UUID from the other interface
+        same, known = self.identities.observe("uuid-1", "192.168.0.1", "http://192.168.0.1:80/desc.xml",
+                                              "192.168.0.100")
+        self.assertTrue(known)
+        self.assertIs(same, identity)
+
+        # the same LOCATION without USN
+        same, known = self.identities.observe("", "10.0.0.1", "http://10.0.0.1:80/desc.xml")
+        self.assertTrue(known)
+        self.assertIs(same, identity)
+
+        self.assertEqual(len(self.identities), 1)
+        self.assertEqual(self.identities.duplicates, 2)
+        self.assertEqual(identity.addresses, {"10.0.0.1", "192.168.0.1"})
+        self.assertEqual(identity.interfaces, {"10.0.0.100", "192.168.0.100"})
+        self.assertEqual(len(identity.locations), 2)
+
+    def test_address_is_used_only_without_uuid_and_location(self):
+        identity, _ = self.identities.observe("", "10.0.0.1", "")
+
+        other, known = self.identities.observe("uuid-2", "10.0.0.1", "")
+        self.assertFalse(known)
+        self.assertIsNot(other, identity)
+
+        same, known = self.identities.observe("", "10.0.0.1", "")
+        self.assertTrue(known)
+        self.assertIs(same, identity)
+
+        self.assertEqual(len(self.identities), 2)
+
+    def test_forget(self):
+        identity, _ = self.identities.observe("uuid-1", "10.0.0.1", "http://10.0.0.1:80/desc.xml")
+        self.identities.forget(identity)
+
+        self.assertEqual(len(self.identities), 0)
+        self.assertIsNone(self.identities.find("uuid-1"))
+        _, known = self.identities.observe("uuid-1", "10.0.0.1", "http://10.0.0.1:80/desc.xml")
+        self.assertFalse(known)
+
+    def test_clear(self):
+        self.identities.observe("uuid-1", "10.0.0.1", "")
+        self.identities.observe("uuid-1", "10.0.0.1", "")
+        self.identities.clear()
+
+        self.assertEqual(len(self.identities), 0)
+        self.assertEqual(self.identities.duplicates, 0)
+        self.assertIsNone(self.identities.find("uuid-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Smoke test of the virtual device table: the table is created, filled, scrolled, updated and cleared under Tk.
+
+Needs a display: the test is skipped without it (use xvfb-run on a headless machine).
+"""
+
+import os
+import sys
+import unittest
+from tkinter import Tk, TclError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from revealerdevice import RevealerDeviceTag  # noqa: E402
+from revealertable import RevealerTable  # noqa: E402
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+class RevealerTableTest(unittest.TestCase):
+
+    def setUp(self):
+        try:
+            self.root = Tk()
+        except TclError as err:
+            raise unittest.SkipTest(f"Tk can't be started: {err}")
+
+        self.root.geometry("800x600")
+        self.root.grid_rowconfigure(0, weight=1)
+        self.root.grid_columnconfigure(0, weight=1)
+        self.table = RevealerTable(master=self.root, col=0, row=0, height=560, os_main_root=ROOT_DIR)
+        self.root.update()
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def render(self):
+        self.table.update_with_rewriting()
+        self.root.update()
+        while self.table.render_pending():
+            self.root.update()
+
+    def add_devices(self, first, number):
+        for i in range(first, first + number):
+            ip_address = f"10.0.{i >> 8 & 255}.{i & 255}"
+            if i % 10 == 9:
+                self.table.add_row_old_item(ip_address, "http://" + ip_address, tag=RevealerDeviceTag.OLD_LOCAL)
+                continue
+
+            properties = {"friendlyName": f"Device {i:05}", "mipas": "OK" if i % 3 == 0 else "Not provided",
+                          "ssdp_url": ip_address, "presentationURL": "-", "server": "Server",
+                          "location_url": f"http://{ip_address}"}
+            self.table.add_row_ssdp_item(properties["friendlyName"], properties["location_url"], ip_address, None,
+                                         properties, tag=RevealerDeviceTag.LOCAL)
+
+    def visible_texts(self):
+        """
+        :return: texts of the device labels of the shown rows of the pool from the top of the viewport.
+        """
+
+        return [row.device.cget("text") for row in self.table._pool if not row.hidden]
+
+    def expected_texts(self, first, number):
+        snapshot = self.table.device_list.snapshot
+        texts = [device.name for device in snapshot.ssdp_devices]
+        if len(snapshot.old_devices) > 0:
+            texts += ["", "", "Legacy Protocol Devices"] + [device.name for device in snapshot.old_devices]
+        return texts[first:first + number]
+
+    def test_fill_scroll_update_and_clear(self):
+        self.add_devices(0, 500)
+        self.render()
+
+        self.assertEqual(self.table.shown_rows(), 500)
+        shown = self.visible_texts()
+        self.assertGreater(len(shown), 0)
+        self.assertEqual(shown, self.expected_texts(0, len(shown)))
+        # widgets are made only for the rows fitting the viewport
+        self.assertLess(len(self.table._pool), 100)
+
+        # the same call as dragging the scrollbar
+        self.table.great_table._yview("moveto", 0.5)
+        self.root.update()
+        while self.table.render_pending():
+            self.root.update()
+
+        first = self.table._render_first
+        self.assertGreater(first, 0)
+        shown = self.visible_texts()
+        self.assertEqual(shown, self.expected_texts(first, len(shown)))
+
+        # devices found later are added to the rows already shown
+        self.add_devices(500, 100)
+        self.render()
+        self.assertEqual(self.table.shown_rows(), 600)
+        shown = self.visible_texts()
+        self.assertEqual(shown, self.expected_texts(self.table._render_first, len(shown)))
+
+        self.table.device_list.clear_all()
+        self.table.delete_all_rows()
+        self.render()
+        self.assertEqual(self.table.shown_rows(), 0)
+        self.assertEqual(self.visible_texts(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
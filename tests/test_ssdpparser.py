@@ -0,0 +1,108 @@
+"""
+Tests of the SSDP parser on complete, partial and malformed messages.
+"""
+
+import logging as log
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from revealerdevice import NOT_PROVIDED  # noqa: E402
+from ssdpparser import parse_ssdp_packet  # noqa: E402
+
+ADDR = ("172.16.130.67", 1900)
+
+
+class ParseSSDPPacketTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # malformed headers are logged as warnings
+        log.disable(log.WARNING)
+
+    @classmethod
+    def tearDownClass(cls):
+        log.disable(log.NOTSET)
+
+    def test_answer_of_our_device(self):
+        record = parse_ssdp_packet(b"HTTP/1.1 200 OK\r\n"
+                                   b"CACHE-CONTROL: max-age=1800\r\n"
+                                   b"LOCATION: http://172.16.130.67:80/Basic_info.xml\r\n"
+                                   b"SERVER: lwIP/1.4.1 UPnP/2.0 8SMC5-USB/4.7.7\r\n"
+                                   b"USN: uuid:40001d0a-0000-0000-8e31-4010900b00c8::upnp:rootdevice\r\n"
+                                   b"MIPAS: OK\r\n"
+                                   b"BOOTID.UPNP.ORG: 7\r\n"
+                                   b"CONFIGID.UPNP.ORG: 3\r\n"
+                                   b"\r\n", ADDR)
+
+        self.assertFalse(record.notify)
+        self.assertEqual((record.os, record.os_version), ("lwIP", "1.4.1"))
+        self.assertEqual((record.server, record.version), ("8SMC5-USB", "4.7.7"))
+        self.assertEqual(record.location, "http://172.16.130.67:80/Basic_info.xml")
+        self.assertEqual(record.location_url, "http://172.16.130.67:80")
+        self.assertEqual(record.ssdp_url, "172.16.130.67")
+        self.assertEqual(record.uuid, "40001d0a-0000-0000-8e31-4010900b00c8")
+        self.assertEqual(record.mipas, "OK")
+        self.assertEqual((record.max_age, record.bootid, record.configid), ("1800", "7", "3"))
+
+    def test_notify_with_lower_case_headers(self):
+        record = parse_ssdp_packet(b"NOTIFY * HTTP/1.1\n"
+                                   b"location:https://Device.local/desc.xml\n"
+                                   b"server:Linux/5.4 UPnP/1.1 Product/2.0\n", ADDR)
+
+        self.assertTrue(record.notify)
+        self.assertEqual(record.server, "Product")
+        self.assertEqual(record.location, "https://Device.local:443/desc.xml")
+        self.assertEqual(record.location_url, "https://device.local:443")
+        # host is not an IP address - address of the sender is used
+        self.assertEqual(record.ssdp_url, ADDR[0])
+
+    def test_partial_answer(self):
+        record = parse_ssdp_packet(b"HTTP/1.1 200 OK\r\nSERVER: Linux UPnP/1.0 Product\r\n", ADDR)
+
+        self.assertEqual((record.os, record.server), ("Linux", "Product"))
+        for field in ("version", "os_version", "location", "ssdp_url", "location_url", "uuid", "mipas",
+                      "max_age", "bootid", "configid"):
+            self.assertIsNone(getattr(record, field), field)
+
+        data = record.to_dict()
+        self.assertEqual(data["server"], "Product")
+        self.assertIs(data["uuid"], NOT_PROVIDED)
+        self.assertIs(data["location"], NOT_PROVIDED)
+
+    def test_relative_location(self):
+        record = parse_ssdp_packet(b"HTTP/1.1 200 OK\r\nLOCATION: /desc.xml\r\n", ADDR)
+
+        self.assertEqual(record.location, "http://172.16.130.67:80/desc.xml")
+        self.assertEqual(record.location_url, "http://172.16.130.67:80")
+        self.assertEqual(record.ssdp_url, ADDR[0])
+
+    def test_malformed_headers(self):
+        record = parse_ssdp_packet(b"HTTP/1.1 200 OK\r\n"
+                                   b"USN: no-uuid-here\r\n"
+                                   b"CACHE-CONTROL: no-cache\r\n"
+                                   b"line without separator\r\n"
+                                   b"SERVER: Product/1.0\r\n", ADDR)
+
+        self.assertIsNone(record.uuid)
+        self.assertIsNone(record.max_age)
+        # SERVER without UPnP field can't be split into OS and product
+        self.assertIsNone(record.server)
+
+    def test_server_with_whitespaces_and_bad_bytes(self):
+        record = parse_ssdp_packet(b"HTTP/1.1 200 OK\r\nSERVER: Some OS/1.0 UPnP/1.0 My \xff Product/2.1\r\n", ADDR)
+
+        self.assertEqual((record.os, record.os_version), ("Some OS", "1.0 "))
+        self.assertEqual((record.server, record.version), ("My \ufffd Product", "2.1"))
+
+    def test_empty_and_garbage_data(self):
+        for data in (b"", b"\r\n\r\n", b"\x00\x01\x02", memoryview(b"garbage: \xff")):
+            record = parse_ssdp_packet(data, ADDR)
+            self.assertFalse(record.notify)
+            self.assertIsNone(record.location)
+
+
+if __name__ == "__main__":
+    unittest.main()
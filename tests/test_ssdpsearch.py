@@ -0,0 +1,283 @@
+"""
+Tests of the SSDP search engine. M-SEARCH requests are sent to the local responder instead of the multicast group, it
+answers them from loopback addresses as different devices.
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ssdpsearch import SSDPSearchEngine  # noqa: E402
+from thread import CancellationToken  # noqa: E402
+
+ROOT_DEVICE = "upnp:rootdevice"
+
+
+class Responder:
+    """
+    Local SSDP responder: every M-SEARCH request is answered by the devices of the plan after their delays.
+    """
+
+    def __init__(self, plan=()):
+        """
+        :param plan: list
+            (delay after the request in seconds, IP address of the device) for every answer.
+        """
+
+        self.plan = list(plan)
+        # arrival time and text of every request received
+        self.requests = []
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+
+        self._devices = {}
+        self._timers = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _device_socket(self, ip):
+        sock = self._devices.get(ip)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((ip, 0))
+            self._devices[ip] = sock
+        return sock
+
+    def _answer(self, ip, addr):
+        try:
+            self._device_socket(ip).sendto(b"HTTP/1.1 200 OK\r\nSERVER: Linux/5.4 UPnP/1.1 Device/1.0\r\n\r\n", addr)
+        except OSError:
+            pass
+
+    def _run(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(8192)
+            except OSError:
+                return
+            self.requests.append((time.monotonic(), data.decode()))
+            for delay, ip in self.plan:
+                timer = threading.Timer(delay, self._answer, (ip, addr))
+                timer.daemon = True
+                timer.start()
+                self._timers.append(timer)
+
+    def close(self):
+        for timer in self._timers:
+            timer.cancel()
+        self.sock.close()
+        for sock in self._devices.values():
+            sock.close()
+
+
+class SSDPSearchEngineTestCase(unittest.TestCase):
+    """
+    Base of the tests: requests of the engine go to the responder of the test.
+    """
+
+    def setUp(self):
+        self.responder = None
+        self.engine = SSDPSearchEngine()
+        self.responses = []
+        self.notifies = []
+
+    def tearDown(self):
+        self.engine.clear()
+        if self.responder is not None:
+            self.responder.close()
+
+    def start_responder(self, plan=()):
+        self.responder = Responder(plan)
+        for name, value in (("MULTICAST_GROUP", "127.0.0.1"), ("MULTICAST_PORT", self.responder.port)):
+            patcher = mock.patch.object(SSDPSearchEngine, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def search(self, interfaces=("127.0.0.1",), targets=(ROOT_DEVICE,), cancel_token=None):
+        for ip in interfaces:
+            self.assertTrue(self.engine.add_interface(ip))
+
+        start = time.monotonic()
+        self.engine.search(list(targets),
+                           lambda data, addr, interface_ip: self.responses.append((addr[0], interface_ip)),
+                           lambda data, addr, interface_ip: self.notifies.append((addr[0], interface_ip)),
+                           cancel_token=cancel_token)
+        return time.monotonic() - start
+
+
+class SSDPSearchLoopTest(SSDPSearchEngineTestCase):
+
+    def test_all_interfaces_and_notify_are_served_by_one_loop(self):
+        self.start_responder([(0.05, "127.0.0.11"), (0.1, "127.0.0.12")])
+        notify_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        notify_sock.bind(("127.0.0.1", 0))
+        self.addCleanup(notify_sock.close)
+        self.engine.set_notify_socket(notify_sock, "127.0.0.1")
+
+        device = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        device.bind(("127.0.0.13", 0))
+        self.addCleanup(device.close)
+        threading.Timer(0.1, device.sendto, (b"NOTIFY * HTTP/1.1\r\n\r\n", notify_sock.getsockname())).start()
+
+        threads = threading.active_count()
+        self.search(interfaces=("127.0.0.1", "127.0.0.2"))
+
+        # every interface gets answers of both devices (to every round of the requests)
+        self.assertEqual(sorted(set(self.responses)), [("127.0.0.11", "127.0.0.1"), ("127.0.0.11", "127.0.0.2"),
+                                                       ("127.0.0.12", "127.0.0.1"), ("127.0.0.12", "127.0.0.2")])
+        self.assertEqual(self.notifies, [("127.0.0.13", None)])
+        # no threads are started by the search (timers of the responder are finished by now)
+        self.assertLessEqual(threading.active_count(), threads)
+        # sockets of the interfaces are closed after the search
+        self.assertEqual(len(self.engine), 0)
+        self.assertFalse(self.engine.in_process())
+
+    def test_stop_from_other_thread(self):
+        self.start_responder()
+        token = CancellationToken()
+        threading.Timer(0.1, token.cancel).start()
+
+        duration = self.search(cancel_token=token)
+
+        self.assertLess(duration, 1.0)
+        self.assertFalse(self.engine.report.interfaces[0].is_complete())
+
+    def test_cancelled_token_stops_search_at_once(self):
+        self.start_responder()
+        token = CancellationToken()
+        token.cancel()
+
+        self.assertLess(self.search(cancel_token=token), 0.5)
+
+    def test_request(self):
+        self.assertEqual(SSDPSearchEngine.build_msearch(ROOT_DEVICE, 3),
+                         b"M-SEARCH * HTTP/1.1\r\n"
+                         b"HOST:239.255.255.250:1900\r\n"
+                         b"ST:upnp:rootdevice\r\n"
+                         b"MX:3\r\n"
+                         b'MAN:"ssdp:discover"\r\n'
+                         b"\r\n")
+
+
+class SSDPSearchMXTest(SSDPSearchEngineTestCase):
+
+    def test_mx_is_chosen_from_expected_devices(self):
+        self.assertEqual(self.engine.choose_mx(None), SSDPSearchEngine.SSDP_DEFAULT_MX)
+        self.assertEqual(self.engine.choose_mx(0), SSDPSearchEngine.SSDP_MIN_MX)
+        self.assertEqual(self.engine.choose_mx(250), 1)
+        self.assertEqual(self.engine.choose_mx(251), 2)
+        self.assertEqual(self.engine.choose_mx(1000), 4)
+        self.assertEqual(self.engine.choose_mx(100000), SSDPSearchEngine.SSDP_MAX_MX)
+
+    def test_devices_of_complete_search_are_expected_in_the_next_one(self):
+        self.engine = SSDPSearchEngine(quiet_window_sec=0.1)
+        self.start_responder([(0.05, "127.0.0.11"), (0.05, "127.0.0.12")])
+
+        self.search()
+        self.assertIsNone(self.engine.report.interfaces[0].expected_responders)
+
+        self.search()
+        interface = self.engine.report.interfaces[0]
+        self.assertEqual(interface.expected_responders, 2)
+        self.assertEqual(interface.mx, SSDPSearchEngine.SSDP_MIN_MX)
+        self.assertIn(f"MX:{SSDPSearchEngine.SSDP_MIN_MX}\r\n", self.responder.requests[-1][1])
+
+        # number of devices is kept separately for every set of search targets
+        self.search(targets=("ssdp:all",))
+        self.assertIsNone(self.engine.report.interfaces[0].expected_responders)
+
+    def test_devices_of_cancelled_search_are_not_expected(self):
+        self.start_responder([(0.05, "127.0.0.11")])
+        token = CancellationToken()
+        threading.Timer(0.3, token.cancel).start()
+
+        self.search(cancel_token=token)
+        self.search()
+
+        self.assertIsNone(self.engine.report.interfaces[0].expected_responders)
+
+
+class SSDPSearchRoundsTest(SSDPSearchEngineTestCase):
+
+    def test_rounds_are_sent_with_spacing(self):
+        self.engine = SSDPSearchEngine(quiet_window_sec=0.3, rounds=3)
+        self.start_responder([(0.05, "127.0.0.11")])
+
+        self.search(targets=(ROOT_DEVICE, "ssdp:all"))
+
+        # both search targets in every round
+        self.assertEqual(len(self.responder.requests), 6)
+        times = [arrival for arrival, request in self.responder.requests]
+        for previous, current in zip(times[1::2], times[2::2]):
+            self.assertGreaterEqual(current - previous, SSDPSearchEngine.SSDP_ROUND_SPACING_SEC[0] - 0.05)
+            self.assertLess(current - previous, SSDPSearchEngine.SSDP_ROUND_SPACING_SEC[1] + 0.2)
+
+        interface = self.engine.report.interfaces[0]
+        # the device is new only in the round it has answered first
+        self.assertEqual(interface.round_yields, [1, 0, 0])
+        self.assertIn("new devices per round: 1/0/0", str(self.engine.report))
+
+
+class SSDPSearchTerminationTest(SSDPSearchEngineTestCase):
+
+    def test_quiet_search_is_complete_before_mx(self):
+        self.engine = SSDPSearchEngine(quiet_window_sec=0.3)
+        self.start_responder([(0.05, "127.0.0.11"), (0.1, "127.0.0.12")])
+
+        duration = self.search()
+
+        interface = self.engine.report.interfaces[0]
+        self.assertEqual(interface.responders, {"127.0.0.11", "127.0.0.12"})
+        self.assertTrue(interface.quiet)
+        # the last round is sent in 0.5 s at most, MX of the request is 2 s
+        self.assertLess(duration, 1.5)
+
+    def test_search_without_answers_lasts_minimum_time(self):
+        self.engine = SSDPSearchEngine(quiet_window_sec=0.1)
+        self.start_responder()
+
+        duration = self.search()
+
+        interface = self.engine.report.interfaces[0]
+        self.assertEqual(len(interface.responders), 0)
+        self.assertTrue(interface.quiet)
+        self.assertGreaterEqual(duration, SSDPSearchEngine.SSDP_MIN_LISTEN_SEC)
+        self.assertLess(duration, 1.5)
+
+    def test_late_devices_extend_search(self):
+        self.engine = SSDPSearchEngine(quiet_window_sec=0.6)
+        self.start_responder([(0.1, "127.0.0.11"), (0.6, "127.0.0.12"), (1.1, "127.0.0.13"), (1.6, "127.0.0.14")])
+
+        duration = self.search()
+
+        interface = self.engine.report.interfaces[0]
+        self.assertEqual(interface.responders, {"127.0.0.11", "127.0.0.12", "127.0.0.13", "127.0.0.14"})
+        self.assertTrue(interface.quiet)
+        self.assertGreaterEqual(duration, 1.6)
+
+    def test_search_is_limited_by_mx(self):
+        self.engine = SSDPSearchEngine(quiet_window_sec=0.6)
+        self.engine.SSDP_DEFAULT_MX = 1
+        # new devices answer all the time
+        self.start_responder([(0.1 + i * 0.3, f"127.0.0.{11 + i}") for i in range(10)])
+
+        duration = self.search()
+
+        interface = self.engine.report.interfaces[0]
+        self.assertFalse(interface.quiet)
+        self.assertLess(len(interface.responders), 10)
+        # the last round is sent in 0.5 s at most, listening after it is limited by MX 1 s plus the margin
+        self.assertLess(duration, 2.0)
+        self.assertGreaterEqual(interface.time_to_complete(), 1.0 + SSDPSearchEngine.SSDP_TIMEOUT_MARGIN_SEC)
+
+
+if __name__ == "__main__":
+    unittest.main()
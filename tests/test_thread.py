@@ -0,0 +1,166 @@
+"""
+Tests of the cancellation token and the task executor.
+"""
+
+import logging as log
+import os
+import sys
+import threading
+import unittest
+from concurrent.futures import CancelledError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from thread import CancellationToken, TaskExecutor  # noqa: E402
+
+# timeout of the waits which must not time out
+WAIT_SEC = 5
+
+
+class CancellationTokenTest(unittest.TestCase):
+
+    def test_callbacks_are_called_once(self):
+        token = CancellationToken()
+        calls = []
+        token.register(lambda: calls.append(1))
+        token.register(lambda: calls.append(2))
+
+        token.cancel()
+        token.cancel()
+
+        self.assertTrue(token.is_cancelled())
+        self.assertTrue(token.wait(0))
+        self.assertEqual(sorted(calls), [1, 2])
+
+    def test_unregistered_callback_is_not_called(self):
+        token = CancellationToken()
+        calls = []
+        handle = token.register(lambda: calls.append(1))
+        token.unregister(handle)
+        token.unregister(None)
+
+        with token.on_cancel(lambda: calls.append(2)):
+            pass
+        token.cancel()
+
+        self.assertEqual(calls, [])
+
+    def test_register_after_cancel_calls_at_once(self):
+        token = CancellationToken()
+        token.cancel()
+        calls = []
+
+        self.assertIsNone(token.register(lambda: calls.append(1)))
+        self.assertEqual(calls, [1])
+
+    def test_failing_callback_doesnt_stop_others(self):
+        token = CancellationToken()
+        calls = []
+        token.register(lambda: 1 / 0)
+        token.register(lambda: calls.append(1))
+
+        log.disable(log.ERROR)
+        try:
+            token.cancel()
+        finally:
+            log.disable(log.NOTSET)
+
+        self.assertEqual(calls, [1])
+
+    def test_cancel_from_other_thread_wakes_waiter(self):
+        token = CancellationToken()
+        released = threading.Event()
+
+        with token.on_cancel(released.set):
+            threading.Timer(0.01, token.cancel).start()
+            self.assertTrue(token.wait(WAIT_SEC))
+
+        self.assertTrue(released.is_set())
+
+
+class TaskExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = TaskExecutor(workers=2, queue_size=2, name="Test")
+        self.executor.start()
+
+    def tearDown(self):
+        self.executor.stop_thread()
+        self.assertTrue(self.executor.join(WAIT_SEC))
+
+    def block_workers(self):
+        """
+        Occupy both workers till the returned event is set.
+        """
+
+        started = threading.Barrier(3)
+        release = threading.Event()
+        for _ in range(2):
+            self.executor.submit(lambda: (started.wait(WAIT_SEC), release.wait(WAIT_SEC)))
+        started.wait(WAIT_SEC)
+        return release
+
+    def test_result_and_exception(self):
+        self.assertEqual(self.executor.submit(lambda x, y: x + y, 1, y=2).result(WAIT_SEC), 3)
+
+        log.disable(log.ERROR)
+        try:
+            future = self.executor.submit(lambda: 1 / 0)
+            with self.assertRaises(ZeroDivisionError):
+                future.result(WAIT_SEC)
+        finally:
+            log.disable(log.NOTSET)
+
+    def test_full_queue_drops_tasks(self):
+        release = self.block_workers()
+
+        self.assertTrue(self.executor.add_task(lambda: None))
+        self.assertTrue(self.executor.add_task(lambda: None))
+        self.assertFalse(self.executor.add_task(lambda: None))
+        self.assertEqual(self.executor.dropped, 1)
+        self.assertEqual(self.executor.queue_depth(), 2)
+        self.assertEqual(self.executor.in_flight(), 2)
+
+        release.set()
+
+    def test_empty_counts_tasks_till_they_finish(self):
+        self.assertTrue(self.executor.empty())
+        release = self.block_workers()
+        self.assertFalse(self.executor.empty())
+        self.assertTrue(self.executor.task_in_process())
+
+        release.set()
+        self.executor.submit(lambda: None).result(WAIT_SEC)
+        # result is set before the task is marked done by the worker
+        self.executor._task_queue.join()
+        self.assertTrue(self.executor.empty())
+        self.assertFalse(self.executor.task_in_process())
+
+    def test_cancel_pending(self):
+        release = self.block_workers()
+        futures = [self.executor.submit(lambda: None) for _ in range(2)]
+
+        self.assertEqual(self.executor.cancel_pending(), 2)
+        self.assertTrue(all(future.cancelled() for future in futures))
+        with self.assertRaises(CancelledError):
+            futures[0].result(0)
+
+        release.set()
+        self.executor._task_queue.join()
+        self.assertTrue(self.executor.empty())
+
+    def test_submit_after_stop(self):
+        release = self.block_workers()
+        queued = self.executor.submit(lambda: None)
+
+        self.executor.stop_thread()
+        release.set()
+
+        self.assertTrue(queued.cancelled())
+        self.assertIsNone(self.executor.submit(lambda: None))
+        self.assertFalse(self.executor.add_task(lambda: None))
+        self.assertTrue(self.executor.join(WAIT_SEC))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,323 @@
+"""
+Tests of the device description downloads and the description cache validation. Descriptions are served by the local
+HTTP server.
+"""
+
+import http.client
+import http.server
+import io
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from upnpdescription import CachedDescription, DescriptionCache, DescriptionFetcher, InFlightFetches, \
+    StreamingDescriptionParser  # noqa: E402
+
+DESCRIPTION = ('<?xml version="1.0"?>'
+               '<root xmlns="urn:schemas-upnp-org:device-1-0"><device>'
+               "<friendlyName>{name}</friendlyName><UDN>uuid:{uuid}</UDN>"
+               "</device></root>")
+
+
+class FakeSocket:
+    """
+    Socket with the response already received for reading it without the server.
+    """
+
+    def __init__(self, data):
+        self._data = data
+
+    def makefile(self, mode):
+        return io.BufferedReader(io.BytesIO(self._data))
+
+
+class DescriptionServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class DescriptionHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        device = self.server.device
+        self.server.requests.append(self.headers.get("If-None-Match"))
+
+        if self.headers.get("If-None-Match") == device["etag"]:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = DESCRIPTION.format(**device).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", device["etag"])
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DescriptionFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = DescriptionServer(("127.0.0.1", 0), DescriptionHandler)
+        self.server.device = {"name": "Device A", "uuid": "AAAA-1", "etag": '"a"'}
+        self.server.requests = []
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.url = f"http://127.0.0.1:{self.server.server_port}/desc.xml"
+        self.fetcher = DescriptionFetcher()
+
+    def tearDown(self):
+        self.fetcher.close_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fetch(self, **kwargs):
+        xml_dict = self.fetcher.fetch(self.url, **kwargs)
+        self.assertIsNotNone(xml_dict)
+        return xml_dict["friendlyName"]
+
+    def test_fresh_description_is_taken_from_cache(self):
+        self.assertEqual(self.fetch(bootid="1"), "Device A")
+        self.assertEqual(self.fetch(bootid="1"), "Device A")
+
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual((self.fetcher.downloads, self.fetcher.hits), (1, 1))
+
+    def test_reboot_revalidates_description(self):
+        self.fetch(bootid="1")
+        self.assertEqual(self.fetch(bootid="2"), "Device A")
+
+        self.assertEqual(self.server.requests, [None, '"a"'])
+        self.assertEqual(self.fetcher.not_modified, 1)
+
+    def test_expired_description_is_revalidated(self):
+        self.fetch(max_age=0)
+        self.fetch(max_age=0)
+
+        self.assertEqual(self.server.requests, [None, '"a"'])
+
+    def test_new_config_downloads_description(self):
+        self.fetch(configid="1")
+        self.server.device = {"name": "Device A v2", "uuid": "AAAA-1", "etag": '"a2"'}
+
+        self.assertEqual(self.fetch(configid="2"), "Device A v2")
+        # conditional request is not sent for the changed description
+        self.assertEqual(self.server.requests, [None, None])
+
+    def test_other_device_on_the_same_location(self):
+        self.assertEqual(self.fetch(uuid="aaaa-1"), "Device A")
+        # the device is replaced and the new one happens to send the same ETag
+        self.server.device = {"name": "Device B", "uuid": "BBBB-2", "etag": '"a"'}
+
+        self.assertEqual(self.fetch(uuid="BBBB-2"), "Device B")
+        self.assertEqual(self.server.requests, [None, None])
+        self.assertEqual(self.fetcher.cache.get(self.url).udn_uuid(), "bbbb-2")
+
+    def test_connection_is_kept_alive(self):
+        self.fetch(max_age=0)
+        self.fetch(max_age=0)
+        self.fetch(max_age=0)
+
+        self.assertEqual(self.server.requests, [None, '"a"', '"a"'])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_failed_download_is_not_cached(self):
+        self.fetch(max_age=0)
+        self.server.shutdown()
+        self.server.server_close()
+        self.fetcher.close_all()
+
+        self.assertIsNone(self.fetcher.fetch(self.url, max_age=0))
+        self.assertIsNone(self.fetcher.cache.get(self.url))
+
+
+class SlowDescriptionTest(unittest.TestCase):
+    """
+    Server sends the description byte by byte, each of them in less time than the socket timeout.
+    """
+
+    BYTE_INTERVAL_SEC = 0.3
+
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(1)
+        self.stopped = threading.Event()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+        self.url = f"http://127.0.0.1:{self.listener.getsockname()[1]}/desc.xml"
+        self.fetcher = DescriptionFetcher()
+        self.fetcher.FETCH_DEADLINE_SEC = 1
+
+    def tearDown(self):
+        self.stopped.set()
+        self.fetcher.close_all()
+        self.listener.close()
+
+    def serve(self):
+        connection, _ = self.listener.accept()
+        with connection:
+            connection.recv(4096)
+            body = DESCRIPTION.format(name="Slow", uuid="SSSS-1").encode()
+            connection.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body))
+            for i in range(len(body)):
+                if self.stopped.wait(self.BYTE_INTERVAL_SEC):
+                    return
+                try:
+                    connection.sendall(body[i:i + 1])
+                except OSError:
+                    return
+
+    def test_download_is_stopped_by_deadline(self):
+        start = time.monotonic()
+        self.assertIsNone(self.fetcher.fetch(self.url))
+        duration = time.monotonic() - start
+
+        self.assertGreaterEqual(duration, self.fetcher.FETCH_DEADLINE_SEC - 0.1)
+        self.assertLess(duration, self.fetcher.FETCH_DEADLINE_SEC + 0.5)
+
+
+class StreamingDescriptionParserTest(unittest.TestCase):
+
+    def test_parsing_stops_when_wanted_fields_are_captured(self):
+        parser = StreamingDescriptionParser()
+        fields = "".join(f"<{name}>{name} value</{name}>" for name in sorted(parser.WANTED_FIELDS))
+        description = (f"<root><specVersion><major>1</major></specVersion><device>{fields}"
+                       "<serviceList><service><serviceType>x</serviceType></service>").encode()
+
+        # description is fed in small parts as it is downloaded
+        complete = [parser.feed(description[i:i + 16]) for i in range(0, len(description), 16)]
+
+        self.assertTrue(parser.complete)
+        # the service list is not parsed
+        self.assertLess(complete.index(True), len(complete) - 1)
+        self.assertEqual(parser.xml_dict["friendlyName"], "friendlyName value")
+        self.assertEqual(parser.xml_dict["specVersion"], None)
+        self.assertNotIn("serviceType", parser.xml_dict)
+        # the rest of the description is ignored even if it is malformed
+        self.assertTrue(parser.feed(b"</not-opened>"))
+        parser.close()
+
+    def test_incomplete_description(self):
+        parser = StreamingDescriptionParser()
+        parser.feed(DESCRIPTION.format(name="Device A", uuid="AAAA-1").encode())
+        parser.close()
+
+        self.assertFalse(parser.complete)
+        self.assertEqual(parser.xml_dict, {"device": None, "friendlyName": "Device A", "UDN": "uuid:AAAA-1"})
+
+
+class LargeDescriptionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fetcher = DescriptionFetcher()
+        self.fetcher.MAX_DESCRIPTION_BYTES = 1024
+        self.fetcher.CHUNK_SIZE = 64
+
+    def read(self, body):
+        response = http.client.HTTPResponse(FakeSocket(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s"
+                                                       % (len(body), body)))
+        response.begin()
+        return self.fetcher._read_description(response, None, time.monotonic() + 1)
+
+    def test_fields_captured_before_the_limit_are_used(self):
+        body = b"<root><device><friendlyName>Big</friendlyName>" + b"<x>padding</x>" * 1000 + b"</device></root>"
+
+        self.assertEqual(self.read(body)["friendlyName"], "Big")
+
+    def test_description_without_fields_before_the_limit(self):
+        body = b"<root>" + b" " * 2048 + b"<device><friendlyName>Big</friendlyName></device></root>"
+
+        with self.assertRaises(http.client.HTTPException):
+            self.read(body)
+
+
+class DescriptionCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = DescriptionCache(max_entries=2)
+        entries = [CachedDescription({}, 0, None, None, None, None) for _ in range(3)]
+
+        cache.put("a", entries[0])
+        cache.put("b", entries[1])
+        cache.get("a")
+        cache.put("c", entries[2])
+
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.get("a"), entries[0])
+        self.assertIsNone(cache.get("b"))
+
+    def test_udn_uuid(self):
+        def udn_uuid(xml_dict):
+            return CachedDescription(xml_dict, 0, None, None, None, None).udn_uuid()
+
+        self.assertEqual(udn_uuid({"UDN": "UUID:ABCD-1 "}), "abcd-1")
+        self.assertIsNone(udn_uuid({"UDN": "abcd-1"}))
+        self.assertIsNone(udn_uuid({}))
+
+
+class InFlightFetchesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fetches = InFlightFetches()
+
+    def test_answers_join_the_download_in_progress(self):
+        flight = self.fetches.join("http://a/desc.xml", "", "first")
+        self.assertIsNotNone(flight)
+
+        # known LOCATION with UUID - the UUID key is added to the download
+        self.assertIsNone(self.fetches.join("http://a/desc.xml", "uuid-1", "second"))
+        self.assertIsNone(self.fetches.join("http://b/desc.xml", "uuid-1", "third"))
+
+        self.assertEqual(self.fetches.finish(flight), ["first", "second", "third"])
+        self.assertEqual((self.fetches.started, self.fetches.saved), (1, 2))
+
+        # finished download doesn't take new answers
+        self.assertIsNotNone(self.fetches.join("http://a/desc.xml", "uuid-1", "fourth"))
+
+    def test_answers_without_uuid_join_by_location(self):
+        flight = self.fetches.join("http://a/desc.xml", "", "first")
+
+        self.assertIsNone(self.fetches.join("http://a/desc.xml", "", "second"))
+        self.assertIsNotNone(self.fetches.join("http://b/desc.xml", "", "third"))
+        self.assertEqual(self.fetches.finish(flight), ["first", "second"])
+
+    def test_download_takes_generation_of_the_latest_answer(self):
+        flight = self.fetches.join("http://a/desc.xml", "uuid-1", "first", generation=1)
+        self.assertIsNone(self.fetches.join("http://a/desc.xml", "uuid-1", "second", generation=2))
+
+        self.assertEqual(flight.generation, 2)
+        # the download is still needed by the search 2
+        self.assertFalse(self.fetches.drop_stale(flight, 2))
+
+    def test_stale_download_is_dropped(self):
+        flight = self.fetches.join("http://a/desc.xml", "uuid-1", "first", generation=1)
+
+        self.assertFalse(self.fetches.drop_stale(flight, 1))
+        self.assertTrue(self.fetches.drop_stale(flight, 2))
+        self.assertEqual(flight.waiters, [])
+        self.assertEqual(self.fetches.stale, 1)
+        self.assertIsNotNone(self.fetches.join("http://a/desc.xml", "uuid-1", "second", generation=2))
+
+        self.fetches.reset_counters()
+        self.assertEqual((self.fetches.started, self.fetches.saved, self.fetches.stale), (0, 0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
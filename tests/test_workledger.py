@@ -0,0 +1,66 @@
+"""
+Tests of the accounting of the search work.
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from workledger import WorkLedger  # noqa: E402
+
+
+class WorkLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ledger = WorkLedger()
+        self.ledger.reset(1)
+
+    def test_ledger_drains(self):
+        for _ in range(3):
+            self.ledger.packet_received(1)
+            self.ledger.fetch_queued(1)
+        self.assertEqual(self.ledger.pending(), 3)
+        self.assertIsNone(self.ledger.progress().eta)
+
+        self.ledger.fetch_started(1)
+        self.ledger.fetch_finished(1)
+        self.ledger.fetch_started(1)
+        progress = self.ledger.progress()
+        self.assertEqual((progress.queued, progress.in_flight, progress.done), (3, 1, 1))
+        self.assertEqual(progress.pending, 2)
+        self.assertIsNotNone(progress.eta)
+
+        self.ledger.fetch_finished(1, ok=False)
+        # rejected by the queue - never started
+        self.ledger.fetch_finished(1, ok=False, started=False)
+
+        progress = self.ledger.progress()
+        self.assertEqual(self.ledger.pending(), 0)
+        self.assertEqual((progress.packets, progress.in_flight, progress.done, progress.failed), (3, 0, 1, 2))
+        self.assertEqual(progress.eta, 0.0)
+        self.assertEqual(progress.fraction(), 1.0)
+
+    def test_work_of_other_generation_is_ignored(self):
+        self.ledger.fetch_queued(1)
+        self.ledger.fetch_started(1)
+        self.ledger.reset(2)
+
+        # late work of the first search
+        self.ledger.packet_received(1)
+        self.ledger.fetch_queued(1)
+        self.ledger.fetch_finished(1)
+
+        progress = self.ledger.progress()
+        self.assertEqual((progress.packets, progress.queued, progress.in_flight, progress.finished), (0, 0, 0, 0))
+        self.assertEqual(progress.fraction(), 0.0)
+
+    def test_rendered_rows(self):
+        self.ledger.set_rendered(5)
+
+        self.assertEqual(self.ledger.progress().rendered, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,269 +2,281 @@
 File to start application.
 """
 
+import logging as log
+import socket
 import time
-from queue import Queue
+import traceback
+from concurrent.futures import Future
+from contextlib import contextmanager
+from queue import Queue, Empty, Full
 import threading
 
 
-class ProcessThread(threading.Thread):
+def shutdown_socket(sock) -> None:
     """
-    Base class for threads to perform tasks.
-    """
-
-    def __init__(self) -> None:
-        super().__init__()
-        self._running: bool = True
-        self._task_in_process: threading.Event = threading.Event()
-        self._task_queue: Queue = Queue()
-
-    def add_task(self, task_func, *args, **kwargs) -> None:
-        self._task_queue.put(lambda: task_func(*args, **kwargs))
-
-    def run(self) -> None:
-        while self._running:
-            self._task_in_process.set()
-            if self._task_queue.empty():
-                self._task_in_process.clear()
-                time.sleep(0.005)
-                continue
-            task = self._task_queue.get()
-            if not self._running:
-                self._task_in_process.clear()
-                return
-            task()
-            self._task_in_process.clear()
+    Shut down and close the socket from any thread. Unlike close() alone shutdown() wakes up the thread blocked in
+    recv/recvfrom on this socket at once.
 
-    def empty(self):
-        return self._task_queue.empty()
-
-    def task_in_process(self):
-        return self._task_in_process.is_set()
-
-    def stop_thread(self) -> None:
-        self._running = False
-
-
-class AddDeviceThread(ProcessThread):
+    :param sock: socket.socket or None
+    :return:
     """
-    Base class for adding a task for parsing new device found.
 
-    """
+    if sock is None:
+        return
 
-    def run(self) -> None:
-        while self._running:
-            self._task_in_process.set()
-            if self._task_queue.empty():
-                self._task_in_process.clear()
-                time.sleep(0.005)
-                continue
-            task = self._task_queue.get()
-            if not self._running:
-                self._task_in_process.clear()
-                return
-            task()
-            self._task_in_process.clear()
-            self.stop_thread()  # it is one time thread
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        # not connected sockets may refuse shutdown, but the receiving threads are woken up anyway
+        pass
+    sock.close()
 
 
-class ParseDevicesThread:
+class CancellationToken:
     """
-    Base class for adding threads for parsing task for the devices found.
+    Class of the flag which tells tasks to stop as soon as possible.
 
+    Tasks check the token between their steps and register callbacks releasing whatever they are blocked on (sockets,
+    connections, selector loops) while they wait, so cancel() doesn't have to wait for any timeout.
     """
 
     def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_handle = 0
 
-        self._threads = []
-        self._running = False
-
-    def add_task(self, task_func, *args, **kwargs):
+    def cancel(self) -> None:
+        """
+        Set the token and call all registered callbacks once.
 
-        t = AddDeviceThread()
-        t.start()
-        t.add_task(task_func, *args, **kwargs)
+        :return:
+        """
 
-        self._threads.append(t)
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
 
-    def run(self):
-        self._running = True
-        pass
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                log.error(f"Error in cancellation callback {callback}:\n{traceback.format_exc()}")
 
-    def start(self):
-        self._running = True
-        pass
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
 
-    def empty(self):
-        return not self.task_in_process()
+    def wait(self, timeout=None) -> bool:
+        """
+        Wait till the token is cancelled.
 
-    def task_in_process(self):
-        result = False
-        for thr in self._threads:
-            result &= thr.task_in_process()
-        return result
+        :return: True if the token is cancelled.
+        """
 
-    def stop_thread(self) -> None:
-        self._running = False
+        return self._event.wait(timeout)
 
-        for thr in self._threads:
-            thr.stop_thread()
+    def register(self, callback):
+        """
+        Register callback to be called on cancel(). If the token is already cancelled callback is called at once.
 
+        :param callback: callable without arguments
+        :return: handle for unregister() or None if callback has been already called.
+        """
 
-class ProcessSSDPThread(threading.Thread):
-    """
-    Base class for threads to perform tasks.
-    """
+        with self._lock:
+            if not self._event.is_set():
+                handle = self._next_handle
+                self._next_handle += 1
+                self._callbacks[handle] = callback
+                return handle
 
-    # time for listening for SSDP answers
-    # we send M-SEARCH request with MX = 2 sec so all devices should answer in 2 sec, but we add a little additional
-    # timeout for program parsing
-    SSDP_TIMEOUT_SEC = 2.2
+        callback()
+        return None
 
-    def __init__(self) -> None:
-        super().__init__()
-        self._running: bool = True
-        self._task_in_process: threading.Event = threading.Event()
-        self._task_queue: Queue = Queue()
+    def unregister(self, handle) -> None:
+        if handle is None:
+            return
 
-        self.stop_flag: threading.Event = threading.Event()
-        self.stop_flag.set()
+        with self._lock:
+            self._callbacks.pop(handle, None)
 
-    def ssdp_timer_task(self):
+    @contextmanager
+    def on_cancel(self, callback):
         """
-        Thread task for timer for ssdp search. Search will be stopped when this time sleep will be done.
-        :return:
+        Context manager calling callback if the token is cancelled while the block is executed.
         """
-        # ssdp timer is divided in two parts for more fast closing
-        if self._running:
-            time.sleep(self.SSDP_TIMEOUT_SEC / 2)
-        if self._running:
-            time.sleep(self.SSDP_TIMEOUT_SEC / 2)
-        self.stop_flag.set()
-
-    def add_task(self, task_func, *args, **kwargs) -> None:
-        self._task_queue.put(lambda: task_func(*args, **kwargs))
-
-    def run(self) -> None:
-        while self._running:
-            if self._task_queue.empty():
-                self._task_in_process.clear()
-                time.sleep(0.005)
-                continue
-            self._task_in_process.set()
-            task = self._task_queue.get()
-            if not self._running:
-                self._task_in_process.clear()
-                return
-            timer = threading.Thread(target=self.ssdp_timer_task)
-            timer.start()
-            # create
-            task()
-            self._task_in_process.clear()
-            self.stop_thread()  # it is one time thread
 
-    def empty(self):
-        return self._task_queue.empty()
+        handle = self.register(callback)
+        try:
+            yield self
+        finally:
+            self.unregister(handle)
 
-    def task_in_process(self):
-        return self._task_in_process.is_set() or not self.stop_flag.is_set()
 
-    def stop_thread(self) -> None:
-        self._running = False
-
-
-class SSDPSearchThread:
+class TaskExecutor:
     """
-    Class of the list of the threads for SSDP search on all interfaces.
+    Class of the fixed number of threads performing tasks from one queue.
 
+    Threads block on the queue while there are no tasks, so idle executor doesn't use CPU. Every queued task gets a
+    Future: it can be cancelled while it waits in the queue, waited for with timeout and it calls completion callbacks
+    (see concurrent.futures.Future).
     """
 
-    def __init__(self):
-
-        self._threads = []
-        self._notify_flag = False
-
-    def add_adapters(self, adapters):
+    def __init__(self, workers=1, queue_size=0, name="TaskExecutor"):
         """
-        Add raw thread for each ip in adapter.
-
-        :param adapters:
-        :return:
+        :param workers: int
+            Number of threads.
+        :param queue_size: int
+            Maximum number of tasks waiting in the queue, 0 for unbounded queue.
+        :param name: str
+            Name of the threads for logging.
         """
 
-        for adapter in adapters:
-            for ip in adapter.ips:
-                self._threads.append(ProcessSSDPThread())
+        self.name = name
+
+        self._task_queue = Queue(maxsize=queue_size)
+        # threads are daemons so the application can exit even if some task doesn't stop in time
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(workers)]
+        self._running = False
 
-    def __len__(self):
-        return len(self._threads)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # number of tasks rejected since the queue was full
+        self.dropped = 0
 
-    def __getitem__(self, item):
-        return self._threads[item]
+    def start(self):
+        self._running = True
+        for thr in self._threads:
+            thr.start()
 
-    def stop_all(self):
+    def submit(self, task_func, *args, **kwargs):
         """
-        Stop all threads and wait till they really stop.
+        Put task to the queue if it is not full.
 
-        :return:
+        :return: Future of the task or None if the task was not queued.
         """
 
-        for thread in self._threads:
-            thread.stop_thread()
+        future = Future()
+        with self._lock:
+            # checked under the lock so no task is queued after stop_thread() has cancelled the queued ones
+            if not self._running:
+                return None
+            try:
+                self._task_queue.put_nowait((future, task_func, args, kwargs))
+            except Full:
+                self.dropped += 1
+                log.debug(f"Task queue is full ({self._task_queue.maxsize} tasks). Task is dropped.")
+                return None
 
-        self.wait_all_to_end()
+        return future
 
-    def delete_all(self):
+    def add_task(self, task_func, *args, **kwargs) -> bool:
         """
-        Stop and delete all threads from the list.
+        Put task to the queue if it is not full.
 
-        :return:
+        :return: True if task was queued.
         """
 
-        self.stop_all()
+        return self.submit(task_func, *args, **kwargs) is not None
 
-        self._threads = []
+    def _run(self):
+        while True:
+            item = self._task_queue.get()
+            if item is None:
+                self._task_queue.task_done()
+                return
 
-    def wait_all_to_end(self):
-        """
-        Wait all threads to end.
+            future, task_func, args, kwargs = item
+            # cancelled tasks are skipped
+            if not future.set_running_or_notify_cancel():
+                self._task_queue.task_done()
+                continue
 
-        :return:
+            with self._lock:
+                self._in_flight += 1
+            try:
+                future.set_result(task_func(*args, **kwargs))
+            except BaseException as err:
+                log.error(f"Error in task {task_func}:\n{traceback.format_exc()}")
+                future.set_exception(err)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                # the task is counted by the queue from put() till here, so the executor is never seen empty while
+                # some task is taken from the queue but has not been started yet
+                self._task_queue.task_done()
+
+    def queue_depth(self):
+        return self._task_queue.qsize()
+
+    def in_flight(self):
+        return self._in_flight
+
+    def empty(self):
+        """
+        :return: True if there are no queued tasks and no tasks in progress.
         """
 
-        for thread in self._threads:
-            while thread.task_in_process():
-                pass
+        with self._task_queue.mutex:
+            return self._task_queue.unfinished_tasks == 0
 
-    def start_notify(self):
+    def task_in_process(self):
+        return self._in_flight > 0
+
+    def cancel_pending(self) -> int:
         """
-        Set notify flag to indicate that we have started some searching process.
+        Cancel all tasks waiting in the queue.
 
-        :return:
+        :return: number of cancelled tasks.
         """
-        self._notify_flag = True
 
-    def stop_notify(self):
+        cancelled = 0
+        try:
+            while True:
+                item = self._task_queue.get_nowait()
+                if item is not None and item[0].cancel():
+                    cancelled += 1
+                self._task_queue.task_done()
+        except Empty:
+            pass
+
+        return cancelled
+
+    def stop_thread(self) -> None:
         """
-        Reset notify flag to indicate that notify listening has stopped or its presence is not now important since
-        the real search has started and we now know that we are in the process of searching.
+        Stop accepting tasks, cancel the queued ones and let the threads exit after their current tasks.
 
         :return:
         """
-        self._notify_flag = False
 
-    def in_process(self):
-        """
-        Checks if the search is now in process.
+        with self._lock:
+            self._running = False
 
-        :return:
+        self.cancel_pending()
+
+        # wake up all workers
+        for _ in self._threads:
+            try:
+                self._task_queue.put_nowait(None)
+            except Full:
+                break
+
+    def join(self, timeout=None) -> bool:
         """
-        in_process = False
+        Wait for the threads to exit after stop_thread().
 
-        for thread in self._threads:
-            if thread.task_in_process():
-                in_process = True
+        :param timeout: float or None
+            Maximum time to wait in seconds for all threads together.
+        :return: True if all threads have exited.
+        """
 
-        if self._notify_flag:
-            in_process = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thr in self._threads:
+            if not thr.is_alive():
+                continue
+            thr.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
 
-        return in_process
+        return not any(thr.is_alive() for thr in self._threads)
@@ -0,0 +1,653 @@
+"""
+Downloading and parsing of UPnP device descriptions.
+"""
+
+from collections import OrderedDict
+import http.client
+import logging as log
+import socket
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+from xml.parsers import expat
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class StreamingDescriptionParser:
+    """
+    Incremental parser of the device description XML. It flattens two levels of the XML into a dict with tag names
+    without namespaces as keys and tag texts as values and stops as soon as all the fields revealer shows are
+    captured, so the rest of the description (service and icon lists) is not even downloaded.
+    """
+
+    # fields of the device description shown in the device properties
+    WANTED_FIELDS = frozenset(("friendlyName", "manufacturer", "manufacturerURL", "modelDescription", "modelName",
+                               "modelNumber", "modelURL", "serialNumber", "UDN", "presentationURL"))
+
+    def __init__(self):
+        self.xml_dict = {}
+        # flag to indicate that all wanted fields are captured
+        self.complete = False
+
+        self._parser = expat.ParserCreate(namespace_separator="}")
+        self._parser.StartElementHandler = self._start_element
+        self._parser.EndElementHandler = self._end_element
+        self._parser.CharacterDataHandler = self._character_data
+
+        # number of elements opened (root element is on the level 1)
+        self._level = 0
+        # tag and text parts of the element on the second or third level which text is being read
+        self._text_tag = None
+        self._text_parts = None
+
+        self._fields_left = set(self.WANTED_FIELDS)
+
+    def feed(self, data) -> bool:
+        """
+        Parse next part of the description.
+
+        :param data: bytes
+        :return: True if all wanted fields are captured and the rest of the description is not needed.
+        """
+
+        if self.complete:
+            return True
+
+        try:
+            self._parser.Parse(data, False)
+        except _StopParsing:
+            pass
+
+        return self.complete
+
+    def close(self) -> None:
+        """
+        Finish parsing of the whole description. Raises ExpatError if the description is not well-formed.
+        """
+
+        if not self.complete:
+            try:
+                self._parser.Parse(b"", True)
+            except _StopParsing:
+                pass
+
+    def _store_text(self) -> None:
+        # text of the element is the text before its first child as in ElementTree
+        if self._text_parts is None:
+            self.xml_dict[self._text_tag] = None
+        else:
+            self.xml_dict[self._text_tag] = "".join(self._text_parts)
+
+        self._fields_left.discard(self._text_tag)
+        self._text_tag = None
+        self._text_parts = None
+
+        if not self._fields_left:
+            self.complete = True
+            raise _StopParsing()
+
+    def _start_element(self, name, attrs) -> None:
+        if self._text_tag is not None:
+            self._store_text()
+
+        self._level += 1
+        if self._level in (2, 3):
+            self._text_tag = name[name.rfind("}") + 1:]
+
+    def _end_element(self, name) -> None:
+        if self._text_tag is not None:
+            self._store_text()
+
+        self._level -= 1
+
+    def _character_data(self, data) -> None:
+        if self._text_tag is not None:
+            if self._text_parts is None:
+                self._text_parts = []
+            self._text_parts.append(data)
+
+
+class CachedDescription:
+    """
+    Class of the parsed device description in the cache.
+    """
+
+    def __init__(self, xml_dict, expires, bootid, configid, etag, last_modified):
+        self.xml_dict = xml_dict
+        self.expires = expires
+        self.bootid = bootid
+        self.configid = configid
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def udn_uuid(self):
+        """
+        :return: UUID of the device from the UDN of the description (without "uuid:" prefix, lower case) or None.
+        """
+
+        udn = self.xml_dict.get("UDN")
+        if not isinstance(udn, str) or not udn.lower().startswith("uuid:"):
+            return None
+        return udn[5:].strip().lower()
+
+
+class DescriptionCache:
+    """
+    LRU cache of the parsed device descriptions keyed by LOCATION.
+    """
+
+    MAX_ENTRIES = 1024
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, location):
+        with self._lock:
+            entry = self._entries.get(location)
+            if entry is not None:
+                self._entries.move_to_end(location)
+            return entry
+
+    def put(self, location, entry: CachedDescription) -> None:
+        with self._lock:
+            self._entries[location] = entry
+            self._entries.move_to_end(location)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def remove(self, location) -> None:
+        with self._lock:
+            self._entries.pop(location, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DescriptionFetcher:
+    """
+    Class for downloading device descriptions over persistent HTTP/1.1 connections. Idle connections are kept for
+    every host and are reused by all threads and searches.
+
+    Parsed descriptions are cached for the CACHE-CONTROL max-age of the SSDP answer. After that or after the device
+    has rebooted (BOOTID.UPNP.ORG changed) description is revalidated with conditional GET. If CONFIGID.UPNP.ORG has
+    changed description is downloaded again.
+    """
+
+    TIMEOUT_SEC = 1
+    # maximum time for downloading one description and maximum description size to read
+    FETCH_DEADLINE_SEC = 3
+    MAX_DESCRIPTION_BYTES = 128 * 1024
+    CHUNK_SIZE = 4096
+    # UPnP devices must send CACHE-CONTROL, but if some device doesn't - use the minimum max-age from the standard
+    DEFAULT_MAX_AGE_SEC = 1800
+    MAX_REDIRECTS = 3
+    # maximum number of idle connections kept (to different hosts)
+    MAX_IDLE_CONNECTIONS = 256
+
+    # errors which mean that the server has closed the idle connection and the request should be repeated on a new one
+    STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+                               ConnectionAbortedError, BrokenPipeError)
+
+    def __init__(self, timeout=TIMEOUT_SEC):
+        self.timeout = timeout
+
+        self._idle = OrderedDict()
+        # sockets of the connections used by the downloads in progress (connection drops its socket as soon as the
+        # response with "Connection: close" is received, but the response is still read from it)
+        self._active = {}
+        self._aborted = False
+        self._lock = threading.Lock()
+
+        self.cache = DescriptionCache()
+
+        # number of descriptions taken from the cache, revalidated and downloaded since the last reset
+        self.hits = 0
+        self.not_modified = 0
+        self.downloads = 0
+
+    def _take_connection(self, scheme, host, port):
+        key = (scheme, host, port)
+
+        with self._lock:
+            if self._aborted:
+                raise ConnectionAbortedError("Description downloads are aborted")
+
+            connection = self._idle.pop(key, None)
+            reused = connection is not None
+            if not reused:
+                if scheme == "https":
+                    connection = http.client.HTTPSConnection(host, port, timeout=self.timeout)
+                else:
+                    connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+            self._active[connection] = connection.sock
+
+        return connection, reused
+
+    def _connect(self, connection) -> None:
+        connection.connect()
+
+        with self._lock:
+            aborted = self._aborted
+            if not aborted:
+                self._active[connection] = connection.sock
+
+        # abort_all() can't shut down the socket which is being connected, so check it again
+        if aborted:
+            raise ConnectionAbortedError("Description downloads are aborted")
+
+    def _release_connection(self, connection) -> None:
+        with self._lock:
+            self._active.pop(connection, None)
+
+    def _put_connection(self, scheme, host, port, connection) -> None:
+        key = (scheme, host, port)
+
+        oldest = None
+        with self._lock:
+            if self._aborted:
+                # connections are not kept after abort_all()
+                old = connection
+            else:
+                old = self._idle.pop(key, None)
+                self._idle[key] = connection
+                if len(self._idle) > self.MAX_IDLE_CONNECTIONS:
+                    _, oldest = self._idle.popitem(last=False)
+
+        for extra in (old, oldest):
+            if extra is not None:
+                extra.close()
+
+    def close_all(self) -> None:
+        """
+        Close all idle connections.
+
+        :return:
+        """
+
+        with self._lock:
+            connections = list(self._idle.values())
+            self._idle.clear()
+
+        for connection in connections:
+            connection.close()
+
+    def abort_all(self) -> None:
+        """
+        Abort the downloads in progress and close all idle connections. Nothing is downloaded after that.
+
+        Sockets of the active connections are only shut down - that wakes up the threads reading them at once and
+        these threads close their connections themselves.
+
+        :return:
+        """
+
+        with self._lock:
+            self._aborted = True
+            active = list(self._active.values())
+            idle = list(self._idle.values())
+            self._idle.clear()
+
+        for sock in active:
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+        for connection in idle:
+            connection.close()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.not_modified = 0
+            self.downloads = 0
+
+    def _count(self, counter) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def cache_summary(self):
+        return f"Descriptions: {self.hits} from cache, {self.not_modified} not modified, {self.downloads} " \
+               f"downloaded, {len(self.cache)} cached."
+
+    def _read_chunk(self, response, sock, deadline):
+        """
+        Read the part of the response body received till now, but no more than CHUNK_SIZE. Socket timeout is set to
+        the time left before every read, so the server sending the body byte by byte can't keep the download going
+        after the deadline.
+
+        :return: bytes, empty at the end of the body.
+        """
+
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise socket.timeout(f"Description is not downloaded in {self.FETCH_DEADLINE_SEC} s")
+        if sock is not None:
+            sock.settimeout(left)
+
+        # read() waits for the whole chunk, read1() returns what one receive has got
+        chunk = response.read1(self.CHUNK_SIZE)
+        if not chunk:
+            # read1() doesn't mark the response with Content-Length as finished, read() does
+            response.read()
+        return chunk
+
+    def _read_description(self, response, sock, deadline):
+        """
+        Read and parse description from the response till all wanted fields are captured, maximum size is read or
+        the deadline is over.
+
+        :return: dict with description fields.
+        """
+
+        parser = StreamingDescriptionParser()
+        received = 0
+
+        while not parser.complete:
+            chunk = self._read_chunk(response, sock, deadline)
+            if not chunk:
+                parser.close()
+                break
+
+            received += len(chunk)
+            if received > self.MAX_DESCRIPTION_BYTES:
+                if not parser.xml_dict:
+                    raise http.client.HTTPException(f"Description is larger than {self.MAX_DESCRIPTION_BYTES} bytes")
+                # use fields captured till now
+                break
+
+            parser.feed(chunk)
+
+        return parser.xml_dict
+
+    def _read_response(self, response, sock, deadline):
+        """
+        Read the whole response, so the connection can be used again.
+
+        :return: description dict for 200 OK response, None for the others.
+        """
+
+        if response.status == 200:
+            return self._read_description(response, sock, deadline)
+
+        received = 0
+        while received <= self.MAX_DESCRIPTION_BYTES:
+            chunk = self._read_chunk(response, sock, deadline)
+            if not chunk:
+                break
+            received += len(chunk)
+        return None
+
+    def _request(self, url, headers=None, deadline=None):
+        """
+        Perform GET request on the persistent connection. Description is parsed while it is being downloaded.
+
+        :return: response status, headers and description dict (for 200 OK response only).
+        """
+
+        if deadline is None:
+            deadline = time.monotonic() + self.FETCH_DEADLINE_SEC
+
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = parts.hostname
+        port = parts.port
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        # one more attempt if idle connection was closed by the server
+        for _ in range(2):
+            connection, reused = self._take_connection(scheme, host, port)
+            try:
+                try:
+                    if not reused:
+                        self._connect(connection)
+                    # connection drops the socket after the response with "Connection: close", keep it for reading
+                    sock = connection.sock
+                    # timeout could be shortened by the previous download on this connection
+                    sock.settimeout(self.timeout)
+                    request_headers = {"Connection": "keep-alive"}
+                    if headers is not None:
+                        request_headers.update(headers)
+                    connection.request("GET", path, headers=request_headers)
+                    response = connection.getresponse()
+                except self.STALE_CONNECTION_ERRORS:
+                    connection.close()
+                    if reused:
+                        continue
+                    raise
+                except Exception:
+                    connection.close()
+                    raise
+
+                try:
+                    xml_dict = self._read_response(response, sock, deadline)
+                except Exception:
+                    connection.close()
+                    raise
+
+                # connection can be used again only if the whole response is read
+                if response.will_close or not response.isclosed():
+                    connection.close()
+                else:
+                    self._put_connection(scheme, host, port, connection)
+
+                return response.status, response.headers, xml_dict
+            finally:
+                self._release_connection(connection)
+
+        raise http.client.RemoteDisconnected(f"Connection to {host} is closed")
+
+    def _cached_entry(self, url, configid, uuid):
+        """
+        :return: cached description of the LOCATION if it can be used or revalidated for the SSDP answer, else None.
+        """
+
+        entry = self.cache.get(url)
+        if entry is None or entry.configid != configid:
+            # description has changed
+            return None
+        if uuid is not None and entry.udn_uuid() not in (None, uuid.lower()):
+            # other device has taken this LOCATION (address reused by DHCP or device replaced) and it may send the
+            # same BOOTID and CONFIGID, so the description of the old device is not used even for revalidation
+            self.cache.remove(url)
+            return None
+        return entry
+
+    def fetch(self, url, max_age=None, bootid=None, configid=None, uuid=None):
+        """
+        Get device description from the cache or download it.
+
+        :param url: str
+            LOCATION of the device description.
+        :param max_age: int
+            CACHE-CONTROL max-age of the SSDP answer or None if unknown.
+        :param bootid: str
+            BOOTID.UPNP.ORG of the SSDP answer or None if unknown.
+        :param configid: str
+            CONFIGID.UPNP.ORG of the SSDP answer or None if unknown.
+        :param uuid: str
+            UUID from USN of the SSDP answer or None if unknown.
+        :return: dict with description fields or None if description can't be downloaded.
+        """
+
+        if max_age is None:
+            max_age = self.DEFAULT_MAX_AGE_SEC
+
+        entry = self._cached_entry(url, configid, uuid)
+
+        now = time.monotonic()
+        if entry is not None and entry.bootid == bootid and now < entry.expires:
+            self._count("hits")
+            return dict(entry.xml_dict)
+
+        headers = {}
+        if entry is not None:
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        location = url
+        deadline = now + self.FETCH_DEADLINE_SEC
+        try:
+            for _ in range(self.MAX_REDIRECTS + 1):
+                status, response_headers, xml_dict = self._request(url, headers, deadline)
+                if status == 304 and entry is not None:
+                    self._count("not_modified")
+                    entry.expires = now + max_age
+                    entry.bootid = bootid
+                    return dict(entry.xml_dict)
+                if status in (301, 302, 303, 307, 308) and response_headers.get("Location"):
+                    url = urljoin(url, response_headers["Location"])
+                    continue
+                if status != 200:
+                    raise http.client.HTTPException(f"HTTP status {status}")
+
+                self._count("downloads")
+                self.cache.put(location, CachedDescription(xml_dict, now + max_age, bootid, configid,
+                                                           response_headers.get("ETag"),
+                                                           response_headers.get("Last-Modified")))
+
+                return dict(xml_dict)
+
+            raise http.client.HTTPException("Too many redirects")
+
+        except Exception as err:
+            if self._aborted:
+                return None
+            self.cache.remove(location)
+            log.warning(f"Can't get the description of the device from {url}: {err}")
+            return None
+
+
+class DescriptionFlight:
+    """
+    Class of one description download in progress with all the answers waiting for it.
+    """
+
+    def __init__(self, location, keys, ssdp_record=None, generation=None):
+        self.location = location
+        self.keys = keys
+        self.waiters = []
+        # SSDP record of the first answer with cache headers
+        self.ssdp_record = ssdp_record
+        # generation of the search the latest waiter was found by
+        self.generation = generation
+
+
+class InFlightFetches:
+    """
+    Registry of description downloads in progress keyed by LOCATION and USN UUID. Duplicate answers within one search
+    are merged before they get here (see DeviceIdentityIndex), so answers are attached to the download in progress
+    when it was started by the previous search and is not finished yet.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+        # number of downloads started, saved by joining the download of the previous search and dropped as stale
+        # since the last reset
+        self.started = 0
+        self.saved = 0
+        self.stale = 0
+
+    @staticmethod
+    def make_keys(location, uuid):
+        keys = [("location", location)]
+        if uuid:
+            keys.append(("uuid", uuid))
+        return keys
+
+    def join(self, location, uuid, waiter, ssdp_record=None, generation=None):
+        """
+        Attach answer to the download of this device description.
+
+        :param location: str
+            LOCATION of the description.
+        :param uuid: str
+            UUID from the USN or "" if unknown.
+        :param waiter:
+            Anything to be returned by finish() for this answer.
+        :param ssdp_record: SSDPRecord
+            SSDP data of the answer to keep in the new download.
+        :param generation: int
+            Generation of the search the answer was found by.
+        :return: new DescriptionFlight if download should be started by the caller or None if the answer was attached
+        to the download in progress.
+        """
+
+        keys = self.make_keys(location, uuid)
+
+        with self._lock:
+            for key in keys:
+                flight = self._flights.get(key)
+                if flight is not None:
+                    flight.waiters.append(waiter)
+                    if generation is not None:
+                        flight.generation = generation
+                    # remember other keys of this device too
+                    for other_key in keys:
+                        if other_key not in self._flights:
+                            self._flights[other_key] = flight
+                            flight.keys.append(other_key)
+                    self.saved += 1
+                    return None
+
+            flight = DescriptionFlight(location, keys, ssdp_record, generation)
+            flight.waiters.append(waiter)
+            for key in keys:
+                self._flights[key] = flight
+            self.started += 1
+
+            return flight
+
+    def finish(self, flight):
+        """
+        Remove download from the registry.
+
+        :return: list of waiters of this download.
+        """
+
+        with self._lock:
+            for key in flight.keys:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            waiters = flight.waiters
+            flight.waiters = []
+
+        return waiters
+
+    def drop_stale(self, flight, generation) -> bool:
+        """
+        Remove download from the registry with all its waiters if nobody from the given search generation waits for it.
+
+        :return: True if the download is dropped and should not be started.
+        """
+
+        with self._lock:
+            if flight.generation is None or flight.generation == generation:
+                return False
+
+            for key in flight.keys:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.waiters = []
+            self.stale += 1
+
+        return True
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.started = 0
+            self.saved = 0
+            self.stale = 0
@@ -0,0 +1,157 @@
+"""
+Accounting of the work done by the search: packets received, description downloads and rows shown in the table.
+"""
+
+import threading
+import time
+
+
+class WorkProgress:
+    """
+    Class of the consistent copy of the ledger counters taken at one moment.
+    """
+
+    __slots__ = ("packets", "queued", "in_flight", "done", "failed", "rendered", "elapsed", "eta")
+
+    def __init__(self, packets, queued, in_flight, done, failed, rendered, elapsed, eta):
+        self.packets = packets
+        self.queued = queued
+        self.in_flight = in_flight
+        self.done = done
+        self.failed = failed
+        self.rendered = rendered
+        # time since the search has started and estimated time to finish all queued downloads (None if unknown)
+        self.elapsed = elapsed
+        self.eta = eta
+
+    @property
+    def finished(self):
+        return self.done + self.failed
+
+    @property
+    def pending(self):
+        """
+        Number of downloads queued or in progress.
+        """
+
+        return self.queued - self.finished
+
+    def fraction(self) -> float:
+        """
+        :return: part of the queued downloads finished from 0 to 1.
+        """
+
+        if self.queued == 0:
+            return 0.0
+        return self.finished / self.queued
+
+
+class WorkLedger:
+    """
+    Class counting the work of one search generation. Counters are changed by the worker threads and read by GUI.
+    Calls with other generation than the current one (late work of the previous searches) are ignored, so the counters
+    of the new search are not broken by them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset(None)
+
+    def reset(self, generation) -> None:
+        """
+        Start counting the work of the new search.
+
+        :param generation: int
+            Generation of the search.
+        :return:
+        """
+
+        with self._lock:
+            self.generation = generation
+            self._start_time = time.monotonic()
+            # time the first download was queued at - download rate is counted from it
+            self._first_queued_time = None
+
+            self._packets = 0
+            self._queued = 0
+            self._in_flight = 0
+            self._done = 0
+            self._failed = 0
+            self._rendered = 0
+
+    def packet_received(self, generation) -> None:
+        with self._lock:
+            if generation == self.generation:
+                self._packets += 1
+
+    def fetch_queued(self, generation) -> None:
+        with self._lock:
+            if generation == self.generation:
+                if self._first_queued_time is None:
+                    self._first_queued_time = time.monotonic()
+                self._queued += 1
+
+    def fetch_started(self, generation) -> None:
+        with self._lock:
+            if generation == self.generation:
+                self._in_flight += 1
+
+    def fetch_finished(self, generation, ok=True, started=True) -> None:
+        """
+        Count the end of the download.
+
+        :param ok: bool
+            False if the description was not downloaded or the task was rejected.
+        :param started: bool
+            False if the download was finished without fetch_started() (rejected by the queue or dropped).
+        :return:
+        """
+
+        with self._lock:
+            if generation != self.generation:
+                return
+            if started:
+                self._in_flight -= 1
+            if ok:
+                self._done += 1
+            else:
+                self._failed += 1
+
+    def set_rendered(self, rows) -> None:
+        """
+        Remember the number of rows shown in the table. Called from the GUI thread.
+        """
+
+        with self._lock:
+            self._rendered = rows
+
+    def pending(self) -> int:
+        """
+        :return: number of downloads queued or in progress.
+        """
+
+        with self._lock:
+            return self._queued - self._done - self._failed
+
+    def progress(self) -> WorkProgress:
+        """
+        Take consistent copy of the counters with ETA estimated from the download rate since the first download was
+        queued.
+
+        :return:
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            finished = self._done + self._failed
+            pending = self._queued - finished
+
+            eta = None
+            if pending == 0:
+                eta = 0.0
+            elif finished > 0 and self._first_queued_time is not None:
+                rate = finished / max(now - self._first_queued_time, 1e-3)
+                eta = pending / rate
+
+            return WorkProgress(self._packets, self._queued, self._in_flight, self._done, self._failed,
+                                self._rendered, now - self._start_time, eta)